@@ -1,18 +1,27 @@
 import cmath
+import threading
 import random_seed
 
 from typing import Tuple, Optional, Set, List, Union, TYPE_CHECKING
 import uuid
 
-from chatbot import Chatbot
-from consts import UP, RIGHT, DOWN, LEFT, AGENT, EMPTY, BALL, HOLE, FILLED_HOLE, LOCK, GONE, VISITED
+from backends import query_llm
+from consts import UP, RIGHT, DOWN, LEFT, AGENT, EMPTY, BALL, HOLE, FILLED_HOLE, GONE, VISITED
+from exploration import Frontier, RANDOM, NEAREST, GAIN
+from indexed_set import IndexedSet
+from memory_map import MemoryMap
 from utils import get_new_position
 
 if TYPE_CHECKING:
+    from state_hash import StateHash
     from playground import Playground
+    from team import Team
 
 random = random_seed.RandomSeed().get_random_module()
 
+# agents may write to the same log file from the threads of the decision phase
+_log_lock = threading.Lock()
+
 
 class Agent:
     directions = (UP, RIGHT, DOWN, LEFT)
@@ -26,7 +35,12 @@ class Agent:
                  random_seed: Optional[int] = None,
                  battery: int = 30,
                  log_file: str = None,
-                 chatbot: bool = True):
+                 chatbot: bool = True,
+                 exploration: str = RANDOM):
+        # the hash of the game state, told when the position, direction, battery or ball of the agent changes; set
+        # when the agent is put on the board (see StateHash.add_agent)
+        self.state_hash: Optional['StateHash'] = None
+        self.state_index = 0
         self.agent_id = agent_id if agent_id is not None \
             else str(uuid.uuid4())  # Assign a random UUID if no ID is provided
         self.type = agent_type
@@ -38,12 +52,22 @@ class Agent:
         self.visibility[field_of_view // 2][field_of_view // 2] = self.get_label()
         self.gone_cells = {self.position}
         self.visited_cells = {self.position}
-
-        self.friends = list()
+        # how the agent picks a cell to explore when it knows no target: RANDOM, NEAREST or GAIN (see Frontier)
+        self.exploration = exploration
+        self.frontier = Frontier()
+        self.frontier.update(self.visited_cells, self.visited_cells)
+        # the cells of the board the agent hasn't visited, and hasn't gone to, for the RANDOM exploration; built the
+        # first time it explores, since the agent doesn't know the size of the board before
+        self.unvisited_index: Optional[IndexedSet[Tuple[int, int]]] = None
+        self.not_gone_index: Optional[IndexedSet[Tuple[int, int]]] = None
+
+        # the team holds the members and the communication channel (see Team)
+        self.team: Optional['Team'] = None
 
         # initial direction, battery, has_ball
         self.direction = 'up'  # Initial direction (up, down, left, right)
         self.battery = battery
+        self.initial_battery = battery
         self.has_ball = False
 
         # saved list positions
@@ -51,20 +75,74 @@ class Agent:
         self.ball_positions: list[Tuple[int, int]] = list()
         self.filled_hole_positions: Set[Tuple[int, int]] = set()
         self.filled_by_me_hole_positions: Set[Tuple[int, int]] = set()
+        # the map of the board as the agent remembers it, built the first time it is asked for and then patched with
+        # the cells whose knowledge changes (see sync_memory_map)
+        self.memory_map: Optional[MemoryMap] = None
 
         self.target_position: Optional[Tuple[int, int]] = None
+        # target suggested by the chatbot, or nearest target, planned in the decision phase of the current round
+        self.planned_target: Optional[Tuple[int, int]] = None
+        # set by the task allocator of the controller; such an agent doesn't pick its own balls and holes
+        self.follows_allocation: bool = False
+        self.assigned_target: Optional[Tuple[int, int]] = None
         self.is_a_random_target: bool = False
         self.is_new_road: bool = False
+        # path around the obstacles to path_target (see update_direction_towards_target)
+        self.path: List[Tuple[int, int]] = []
+        self.path_target: Optional[Tuple[int, int]] = None
+        # targets that turned out to be walled in by obstacles
+        self.unreachable_cells: Set[Tuple[int, int]] = set()
 
-        # We use a common list for balls and holes locked target positions (don't lock random target position)
-        # I think this is enough and there will be no need to have two different lists
-        self.locked_positions: list[Tuple[int, int]] = list()
+        # balls and holes locked as target positions are kept in the lock table of the team (don't lock random target
+        # position)
 
         self.log_file = log_file
         self.useLLM = chatbot
+        # number of queries sent to the chatbot
+        self.llm_calls = 0
         if random_seed:
             random.seed = random_seed
 
+    @property
+    def position(self) -> Tuple[int, int]:
+        return self._position
+
+    @position.setter
+    def position(self, position: Tuple[int, int]) -> None:
+        self._position = position
+        if self.state_hash is not None:
+            self.state_hash.touch_agent(self)
+
+    @property
+    def direction(self) -> str:
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction: str) -> None:
+        self._direction = direction
+        if self.state_hash is not None:
+            self.state_hash.touch_agent(self)
+
+    @property
+    def battery(self) -> int:
+        return self._battery
+
+    @battery.setter
+    def battery(self, battery: int) -> None:
+        self._battery = battery
+        if self.state_hash is not None:
+            self.state_hash.touch_agent(self)
+
+    @property
+    def has_ball(self) -> bool:
+        return self._has_ball
+
+    @has_ball.setter
+    def has_ball(self, has_ball: bool) -> None:
+        self._has_ball = has_ball
+        if self.state_hash is not None:
+            self.state_hash.touch_agent(self)
+
     def turn_clockwise(self) -> str:
         """
         Turns the agent clockwise.
@@ -96,7 +174,7 @@ class Agent:
             return False
 
         self.position = new_position
-        self.gone_cells.add(new_position)
+        self.mark_gone([new_position])
         self.inform_friends_v2(GONE, 1, [new_position])
         self.battery -= 1
 
@@ -119,6 +197,7 @@ class Agent:
         if environment.pick_ball(self.position):
             self.has_ball = True
             self.ball_positions.remove(self.position)
+            self.touch_memory_map([self.position])
             self.inform_friends_v2(BALL, -1, [self.position])
             return True
         return False
@@ -140,13 +219,14 @@ class Agent:
 
         filler_agent_id = environment.holes[self.position]
         # check if the hole is filled by the agent's team friends then don't steal the ball
-        if filler_agent_id == self.agent_id or filler_agent_id in [friend.agent_id for friend in self.friends]:
+        if filler_agent_id == self.agent_id or (self.team is not None and filler_agent_id in self.team.member_ids):
             return False
         if not environment.throw_ball_from_hole(self.position):
             return False
 
         self.filled_hole_positions.remove(self.position)
         self.hole_positions.append(self.position)
+        self.touch_memory_map([self.position])
         self.inform_friends_v2(HOLE, 1, [self.position])
         self.inform_friends_v2(FILLED_HOLE, -1, [self.position])
         return True
@@ -169,6 +249,7 @@ class Agent:
             self.has_ball = False
             self.hole_positions.remove(self.position)
             self.filled_by_me_hole_positions.add(self.position)
+            self.touch_memory_map([self.position])
             self.inform_friends_v2(FILLED_HOLE, -1, [self.position])
             return True
         return False
@@ -183,6 +264,44 @@ class Agent:
         self.visibility = visibility
         return self
 
+    def mark_visited(self, cells: List[Tuple[int, int]]) -> None:
+        """
+        Adds cells to the visited cells of the agent and updates its exploration frontier.
+
+        Args:
+            cells: The cells that the agent or its friends have seen.
+        """
+        new_cells = [cell for cell in cells if cell not in self.visited_cells]
+        if new_cells:
+            self.visited_cells.update(new_cells)
+            self.frontier.update(new_cells, self.visited_cells)
+            self.touch_memory_map(new_cells)
+            if self.unvisited_index is not None:
+                for cell in new_cells:
+                    self.unvisited_index.discard(cell)
+
+    def mark_gone(self, cells: List[Tuple[int, int]]) -> None:
+        """
+        Adds cells to the cells that the agent or its friends have gone to.
+
+        Args:
+            cells: The cells that the agent or its friends have entered.
+        """
+        self.gone_cells.update(cells)
+        if self.not_gone_index is not None:
+            for cell in cells:
+                self.not_gone_index.discard(cell)
+
+    def touch_memory_map(self, cells: List[Tuple[int, int]]) -> None:
+        """
+        Marks cells whose knowledge changed, so they are relabelled in the memory map the next time it is read.
+
+        Args:
+            cells: The changed cells.
+        """
+        if self.memory_map is not None:
+            self.memory_map.touch(cells)
+
     def update_item_positions(self) -> None:
         """
         Updates the positions of the items (balls and holes) that the agent can see.
@@ -194,11 +313,12 @@ class Agent:
         top_left_y = self.position[1] - self.field_of_view // 2
 
         # Iterate over each cell in the visibility grid
+        seen_cells = []
         for i in range(len(self.visibility)):
             for j in range(len(self.visibility[i])):
                 # Calculate the actual position of the cell in the playground
                 env_x, env_y = top_left_x + j, top_left_y + i
-                self.visited_cells.add((env_x, env_y))
+                seen_cells.append((env_x, env_y))
                 if BALL in self.visibility[i][j] and (env_x, env_y) not in self.ball_positions:
                     self.ball_positions.append((env_x, env_y))
                 if HOLE in self.visibility[i][j] and (env_x, env_y) not in self.hole_positions:
@@ -209,35 +329,29 @@ class Agent:
                     if (env_x, env_y) in self.hole_positions:
                         self.hole_positions.remove((env_x, env_y))
 
+        self.mark_visited(seen_cells)
+        self.touch_memory_map(seen_cells)
+
         # we can send all data (ball, hole and filled hole) to friends here, is it a good idea? or just send new items ...
         self.inform_friends_v2(VISITED, 1, list(self.visited_cells))
         self.inform_friends_v2(BALL, 1, self.ball_positions)
         self.inform_friends_v2(HOLE, 1, self.hole_positions)
         self.inform_friends_v2(FILLED_HOLE, 1, list(self.filled_hole_positions))
 
-    def add_friends(self, friends: Union['Agent', List['Agent']]) -> List['Agent']:
+    @property
+    def friends(self) -> List['Agent']:
         """
-        Adds friends to the agent's list of friends.
-
-        Args:
-            friends: An Agent instance or a list of Agent instances to be added to the friends list.
+        Returns the other members of the agent's team.
 
         Returns:
-            The updated list of friends.
+            The list of the agent's friends.
         """
-        if isinstance(friends, Agent):
-            friends = [friends]
-
-        # Filter the incoming friends based on the current friends
-        current_friend_ids = {friend.agent_id for friend in self.friends}
-        new_friends = [friend for friend in friends if
-                       friend.agent_id != self.agent_id and friend.agent_id not in current_friend_ids]
-
-        self.friends.extend(new_friends)
-        return self.friends
+        if self.team is None:
+            return []
+        return [member for member in self.team.members if member is not self]
 
     def receive_friends_info_v2(self,
-                                info_type: [BALL, HOLE, FILLED_HOLE, LOCK, GONE, VISITED],
+                                info_type: [BALL, HOLE, FILLED_HOLE, GONE, VISITED],
                                 status: [-1, 1],
                                 positions: List[Tuple[int, int]]) -> 'Agent':
         """
@@ -245,7 +359,7 @@ class Agent:
 
         Args:
             info_type: A string representing the type of information to be received.
-                    types: BALL, HOLE, FILLED_HOLE, LOCK, GONE, VISITED
+                    types: BALL, HOLE, FILLED_HOLE, GONE, VISITED
             status: A integer representing the status of the information
                     1: add the information to the friend's knowledge
                     -1: remove the information from the friend's knowledge
@@ -256,9 +370,9 @@ class Agent:
         """
         if status == 1:
             if info_type == GONE:
-                self.gone_cells.update(positions)
+                self.mark_gone(positions)
             if info_type == VISITED:
-                self.visited_cells.update(positions)
+                self.mark_visited(positions)
             elif info_type == BALL:
                 self.ball_positions += [pos for pos in positions if pos not in self.ball_positions]
             elif info_type == HOLE:
@@ -267,34 +381,72 @@ class Agent:
                 # remove the filled hole from the hole_positions list
                 self.hole_positions = [pos for pos in self.hole_positions if pos not in positions]
                 self.filled_hole_positions.update(positions)
-            elif info_type == LOCK:
-                self.locked_positions += positions
         elif status == -1:
             if info_type == BALL:
                 self.ball_positions = [pos for pos in self.ball_positions if pos not in positions]
-            elif info_type == LOCK:
-                self.locked_positions = [pos for pos in self.locked_positions if pos not in positions]
             # we don't have visited, hole and filled hole cell functionality
+        if info_type in (BALL, HOLE, FILLED_HOLE):
+            self.touch_memory_map(positions)
 
         return self
 
-    def lock_cell(self, position: Tuple[int, int]) -> 'Agent':
+    def receive_friends_info_bulk(self,
+                                  info_type: [BALL, HOLE, FILLED_HOLE, GONE, VISITED],
+                                  added: List[Tuple[int, int]],
+                                  removed: List[Tuple[int, int]]) -> 'Agent':
         """
-        Locks a cell to prevent other agents from interacting with it.
+        Receives a batch of information from friends (see `MessageBus`) and updates the agent's knowledge with set
+        unions and differences, like `receive_friends_info_v2` does for a single message.
 
         Args:
-            position: A tuple representing the position of the cell to be locked.
+            info_type: A string representing the type of information to be received.
+                    types: BALL, HOLE, FILLED_HOLE, GONE, VISITED
+            added: The positions to add to the agent's knowledge.
+            removed: The positions to remove from the agent's knowledge.
 
         Returns:
             The agent object itself.
         """
-        self.locked_positions.append(position)
-        self.inform_friends_v2(LOCK, 1, [position])
+        if info_type == GONE:
+            self.mark_gone(added)
+        elif info_type == VISITED:
+            self.mark_visited(added)
+        elif info_type == BALL:
+            removed_set = set(removed)
+            known = set(self.ball_positions)
+            self.ball_positions = [pos for pos in self.ball_positions if pos not in removed_set] + \
+                                  [pos for pos in added if pos not in known]
+        elif info_type == HOLE:
+            known = set(self.hole_positions)
+            self.hole_positions += [pos for pos in added if pos not in known]
+        elif info_type == FILLED_HOLE:
+            added_set = set(added)
+            self.hole_positions = [pos for pos in self.hole_positions if pos not in added_set]
+            self.filled_hole_positions.update(added)
+        # we don't have removal of visited, hole and filled hole cells
+        if info_type in (BALL, HOLE, FILLED_HOLE):
+            self.touch_memory_map(added)
+            self.touch_memory_map(removed)
+
         return self
 
+    def lock_cell(self, position: Tuple[int, int]) -> bool:
+        """
+        Locks a cell in the lock table of the team to prevent other agents from interacting with it.
+
+        Args:
+            position: A tuple representing the position of the cell to be locked.
+
+        Returns:
+            True if the agent holds the lock, False if the cell is locked by another agent.
+        """
+        if self.team is None:
+            return True
+        return self.team.locks.acquire(position, self)
+
     def unlock_cell(self, position: Tuple[int, int] | None) -> 'Agent':
         """
-        Unlocks a cell to allow other agents to interact with it.
+        Unlocks a cell locked by the agent to allow other agents to interact with it.
 
         Args:
             position: A tuple representing the position of the cell to be unlocked.
@@ -302,21 +454,32 @@ class Agent:
         Returns:
             The agent object itself.
         """
-        if position in self.locked_positions:
-            self.locked_positions.remove(position)
-            self.inform_friends_v2(LOCK, -1, [position])
+        if self.team is not None and position is not None:
+            self.team.locks.release(position, self)
         return self
 
+    def is_locked(self, position: Tuple[int, int]) -> bool:
+        """
+        Checks if a cell is locked by the agent or one of its friends.
+
+        Args:
+            position: A tuple representing the position of the cell.
+
+        Returns:
+            True if the cell is locked.
+        """
+        return self.team is not None and self.team.locks.is_locked(position)
+
     def inform_friends_v2(self,
                           info_type: [BALL, HOLE, FILLED_HOLE, GONE, VISITED],
                           status: [-1, 1],
                           positions: List[Tuple[int, int]]) -> 'Agent':
         """
-        Informs friends about the agent's knowledge.
+        Informs friends about the agent's knowledge, through the channel of the agent's team.
 
         Args:
             info_type: A string representing the type of information to be sent
-                    types: BALL, HOLE, FILLED_HOLE, LOCK, GONE, VISITED
+                    types: BALL, HOLE, FILLED_HOLE, GONE, VISITED
             status: A integer representing the status of the information
                     1: add the information to the friend's knowledge
                     -1: remove the information from the friend's knowledge
@@ -325,50 +488,149 @@ class Agent:
         Returns:
             The agent object itself.
         """
-        for friend in self.friends:
-            friend.receive_friends_info_v2(info_type, status, positions)
+        if self.team is not None:
+            self.team.publish(self, info_type, status, positions)
 
         return self
 
-    def get_memory_based_map(self, environment: 'Playground') -> list[list[str]]:
+    def sync_memory_map(self, environment: 'Playground') -> MemoryMap:
         """
-        Generates a map based on the agent's memory and current knowledge of the environment.
+        Returns the agent's memory map, with the cells that changed since it was last read relabelled. The map is
+        created the first time; afterward, the cost depends on the changes, not on the size of the board.
+
+        The agents are not part of the memory map; lay them over it with `get_memory_overlay`. The map must not be
+        changed by the caller.
 
         Args:
             environment: The Playground object representing the environment.
 
         Returns:
-            A list of lists representing the map from the agent's perspective.
+            The MemoryMap object of the agent.
         """
-        map_ = [[(EMPTY if (j, i) in self.visited_cells else '-') for j in range(environment.xAxis)] for i in
-                range(environment.yAxis)]
-
-        # Mark balls, holes, and filled holes
-        for ball_pos in self.ball_positions:
-            self.mark_position(map_, ball_pos, BALL)
-        for hole_pos in self.hole_positions:
-            self.mark_position(map_, hole_pos, HOLE)
-        for filled_hole_pos in self.filled_hole_positions:
-            self.mark_position(map_, filled_hole_pos, FILLED_HOLE)
-
-        # Mark the agent's position
-        self.mark_position(map_, self.position, AGENT, combine=True)
+        if self.memory_map is None or (self.memory_map.x_axis, self.memory_map.y_axis) != (environment.xAxis,
+                                                                                           environment.yAxis):
+            self.memory_map = MemoryMap(environment.xAxis, environment.yAxis)
+        return self.memory_map.sync(self.visited_cells, self.ball_positions, self.hole_positions,
+                                    self.filled_hole_positions, environment.obstacles)
 
-        # Mark the positions of friends
-        for friend in self.friends:
-            if (friend.position[1] < environment.yAxis) and (friend.position[0] < environment.xAxis):
-                self.mark_position(map_, friend.position, friend.get_label(), combine=True)
-
-        return map_
+    def get_memory_overlay(self, memory_map: MemoryMap) -> dict:
+        """
+        Returns the labels of the cells of the agent and its friends on its memory map (see `MemoryMap.overlay`).
+        """
+        return memory_map.overlay([(self.position, AGENT)] +
+                                  [(friend.position, friend.get_label()) for friend in self.friends])
 
     def update_target(self, environment: 'Playground') -> None:
         """
         Updates the agent's target position.
 
-        The agent sets the target to the nearest hole if the agent has a ball, or the nearest ball if the agent does not have a ball.
+        If the agent uses the LLM, the target is the cell that the chatbot suggested (planned in advance by the
+        decision phase, or asked for now).
+        Otherwise, the agent sets the target to the nearest hole if the agent has a ball, or the nearest ball if the agent does not have a ball.
+        A nearest target planned by the decision phase (see `plan_nearest_target`) is used while it is still free.
         If there are no available targets, it sets a random position in the playground as the target.
         """
+        planned_target = self.planned_target
+        self.planned_target = None
+        if self.useLLM:
+            self.target_position = planned_target if planned_target is not None else self.plan_target(environment)
+            return
+
+        # if the agent has a ball, the target is the nearest hole; otherwise, it is the nearest ball
+        target_list = self.hole_positions if self.has_ball else self.ball_positions
+
+        # if item in target position was removed by other agent, we must select new target
+        if self.target_position not in target_list and self.is_a_random_target is False:
+            self.reset_target_position()
+
+        # the frontier moves as the agent explores, so a cell picked from it is useless once it has been seen
+        if self.is_a_random_target and self.exploration != RANDOM and self.target_position in self.visited_cells:
+            self.reset_target_position()
+
+        if self.follows_allocation:
+            # the target was assigned (and locked) by the task allocator; without one, the agent explores
+            if self.target_position is None:
+                self.target_position = self.find_random_position(environment)
+                self.is_a_random_target = True
+            return
 
+        if planned_target is not None and self.is_free_target(planned_target, target_list):
+            nearest_target = planned_target
+        else:
+            nearest_target = self.plan_nearest_target()
+
+        if nearest_target is not None:
+            # If the agent doesn't have a specific target or the new target is closer than the current target, update the target
+            if (self.target_position is None or self.is_a_random_target or
+                    Agent.manhattan_distance(self.position, nearest_target) <
+                    Agent.manhattan_distance(self.position, self.target_position)):
+                self.reset_target_position()
+                # acquiring the lock is atomic, so two agents can never chase the same target
+                if self.lock_cell(position=nearest_target):
+                    self.target_position = nearest_target
+        elif self.is_a_random_target is False and self.target_position is None:
+            self.target_position = self.find_random_position(environment)
+            self.is_a_random_target = True
+
+    def plan_nearest_target(self) -> Optional[Tuple[int, int]]:
+        """
+        Finds the nearest known target of the agent that is neither locked nor unreachable, for the decision phase of
+        the round (see `DecisionExecutor`). The target is only taken in `update_target`, if it is still free then.
+
+        This method only reads the memory of the agent and the lock table of its team, so it can be called for
+        several agents at the same time.
+
+        Returns:
+            The nearest free hole if the agent has a ball, or the nearest free ball otherwise, or None if there is none.
+        """
+        target_list = self.hole_positions if self.has_ball else self.ball_positions
+        # remove locked and unreachable positions from the target list
+        target_list = [pos for pos in target_list if not self.is_locked(pos) and pos not in self.unreachable_cells]
+        return self.find_nearest_target(target_list) if len(target_list) > 0 else None
+
+    def is_free_target(self, position: Tuple[int, int], target_list: List[Tuple[int, int]]) -> bool:
+        """
+        Checks if a position is still a known target of the agent that is neither locked nor unreachable.
+        """
+        return position in target_list and not self.is_locked(position) and position not in self.unreachable_cells
+
+    def follow_assigned_target(self, target: Optional[Tuple[int, int]]) -> 'Agent':
+        """
+        Sets the target assigned by the task allocator. An agent without an assigned target keeps exploring its random
+        target. The lock of the previous target must already be released (see `Controller.allocate_targets`).
+
+        Args:
+            target: The assigned ball or hole, or None if no target was assigned to the agent.
+
+        Returns:
+            The agent object itself.
+        """
+        self.follows_allocation = True
+        self.assigned_target = target
+        if target is None or target == self.target_position:
+            return self
+        if self.lock_cell(position=target):
+            self.target_position = target
+            self.is_a_random_target = False
+        return self
+
+    def plan_target(self, environment: 'Playground') -> Optional[Tuple[int, int]]:
+        """
+        Asks the chatbot for the next cell the agent should move to.
+
+        This method only reads the environment and the memory of the agent (it only updates the agent's own memory
+        map), so it can be called for several agents at the same time (see `DecisionExecutor`).
+
+        Args:
+            environment: The Playground object that the agent is in.
+
+        Returns:
+            The suggested position, or None if the agent does not use the LLM.
+        """
+        if not self.useLLM:
+            return None
+
+        memory_map = self.sync_memory_map(environment)
         prompt = f"""
 I am an agent in a game where the objective is to find balls, pick them up, and place them into holes. My field of view is limited to the 8 cells surrounding me. I can only carry one ball at a time.
 In order to pick up a ball, I have to enter the cell (house) where the ball is located. And also, to put the ball in a hole, I have to enter the hole house.
@@ -377,27 +639,28 @@ Here are the possible states for each cell in the game:
     2. `hole`: The cell contains a hole.
     3. `ball`: The cell contains a ball.
     4. `filled_hole`: The cell contains a filled hole.
-    5. `agent-[id]`: The cell contains an agent with the specified ID.
-    6. `-`: There is no information about the cell.
+    5. `obstacle`: The cell contains an obstacle. No agent can enter it.
+    6. `agent-[id]`: The cell contains an agent with the specified ID.
+    7. `-`: There is no information about the cell.
 
 This is the current state of the game map (size {environment.yAxis}*{environment.xAxis}) as I remember it:
-{'\n'.join(' '.join('[' + format(str(item)).ljust(6, ' ') + ']' for item in row) for row in self.get_memory_based_map(environment))}
+{memory_map.text(self.get_memory_overlay(memory_map))}
 
 I can perform 4 actions: [UP, LEFT, DOWN, RIGHT].
 Given that my flag in above map is <agent>, what is the best action for me to take to find the nearest {"hole" if self.has_ball else "ball"}?
 
-Please note: If your previous answer did not affect the map, please provide a different answer.
 Please provide your answer in the following format:
 Answer: <action>
 Reason: <reason>
         """
 
         error_counter = 0
-        while self.useLLM:
+        while True:
             error_counter += 1
 
             try:
-                answer = str(Chatbot().query(prompt, web_search=False))
+                self.llm_calls += 1
+                answer = query_llm(prompt)
             except KeyboardInterrupt:
                 raise ValueError("Program interrupted by user.")
             except Exception as e:
@@ -423,37 +686,13 @@ Reason: <reason>
                 new_position = (current_x + 1, current_y)
 
             if self.log_file:
-                with open(self.log_file, 'a') as f:
+                with _log_lock, open(self.log_file, 'a') as f:
                     print(prompt, file=f)
                     print(f'answer: {answer} new position: {new_position}', file=f)
                     print('='*70, file=f)
 
             if environment.is_valid_position(new_position):
-                self.target_position = new_position
-                return
-
-        # if the agent has a ball, the target is the nearest hole; otherwise, it is the nearest ball
-        target_list = self.hole_positions if self.has_ball else self.ball_positions
-
-        # if item in target position was removed by other agent, we must select new target
-        if self.target_position not in target_list and self.is_a_random_target is False:
-            self.reset_target_position()
-
-        # remove locked positions from the target list
-        target_list = [pos for pos in target_list if pos not in self.locked_positions]
-
-        if len(target_list) > 0:
-            nearest_target = self.find_nearest_target(target_list)
-            # If the agent doesn't have a specific target or the new target is closer than the current target, update the target
-            if (self.target_position is None or self.is_a_random_target or
-                    Agent.manhattan_distance(self.position, nearest_target) <
-                    Agent.manhattan_distance(self.position, self.target_position)):
-                self.reset_target_position()
-                self.target_position = nearest_target
-                self.lock_cell(position=self.target_position)
-        elif self.is_a_random_target is False and self.target_position is None:
-            self.target_position = self.find_random_position(environment)
-            self.is_a_random_target = True
+                return new_position
 
     def find_nearest_target(self, target_list: list[Tuple[int, int]]) -> Tuple[int, int]:
         """
@@ -470,7 +709,8 @@ Reason: <reason>
 
     def find_random_position(self, environment: 'Playground') -> Tuple[int, int]:
         """
-        Finds a random position in the playground that the agent has not visited yet.
+        Finds a random position in the playground that the agent has not visited yet. With the NEAREST or GAIN
+        exploration, the position is taken from the frontier of the agent instead (see `Frontier`).
 
         Args:
             environment: The Playground object that the agent is in.
@@ -478,16 +718,29 @@ Reason: <reason>
         Returns:
             A tuple containing two integers representing the row and column indices of the random position.
         """
-        all_cell = set([(i, j) for i in range(environment.xAxis) for j in range(environment.yAxis)])
-        reminded_cell = all_cell - self.visited_cells
-        if len(reminded_cell) == 0:
-            reminded_cell = all_cell - self.gone_cells
+        if self.exploration == NEAREST:
+            target = self.frontier.nearest(self.position, environment.xAxis, environment.yAxis)
+        elif self.exploration == GAIN:
+            target = self.frontier.best_gain(self.position, self.visited_cells, self.field_of_view,
+                                             environment.xAxis, environment.yAxis)
+        else:
+            target = None
+        if target is not None:
+            return target
+
+        if self.unvisited_index is None:
+            all_cells = [(i, j) for i in range(environment.xAxis) for j in range(environment.yAxis)]
+            self.unvisited_index = IndexedSet(cell for cell in all_cells if cell not in self.visited_cells)
+            self.not_gone_index = IndexedSet(cell for cell in all_cells if cell not in self.gone_cells)
+        # both indexes are kept up to date by mark_visited and mark_gone, so a cell is picked in O(1)
+        reminded_cell = self.unvisited_index if len(self.unvisited_index) > 0 else self.not_gone_index
 
         if len(reminded_cell) > 0:
-            return random.choice(list(reminded_cell))
+            return random.choice(reminded_cell)
         else:
             # it now can happen! because we have two agents, and they can visit all cells
-            return random.choice(list(self.gone_cells))
+            # (sorted, so the choice does not depend on the layout of the set, which a restored checkpoint doesn't keep)
+            return random.choice(sorted(self.gone_cells))
 
     def reset_target_position(self) -> None:
         """
@@ -518,6 +771,7 @@ Reason: <reason>
         self.steal_ball_from_hole(environment)
         if self.position in self.ball_positions and not environment.is_a_ball_cell(self.position):
             self.ball_positions.remove(self.position)
+            self.touch_memory_map([self.position])
             self.inform_friends_v2(BALL, -1, [self.position])
 
         if self.has_ball and environment.is_a_hole_cell(self.position):
@@ -561,6 +815,10 @@ Reason: <reason>
         if self.battery <= 0:
             if self.battery == 0:
                 self.battery -= 1
+                environment.agent_ran_out_of_battery(self)
+                # the agent can't reach its targets anymore, so its locks expire
+                if self.team is not None:
+                    self.team.locks.release_all(self)
             return self
 
         self.update_target(environment)
@@ -568,7 +826,8 @@ Reason: <reason>
             self.take_step_forward(environment)
             return self
 
-        self.update_direction_towards_target()
+        if not self.update_direction_towards_target(environment):
+            return self
 
         if opposite_agent:
             if not self.handle_opposite_agent(opposite_agent, environment):
@@ -577,11 +836,27 @@ Reason: <reason>
         self.take_step_forward(environment)
         return self
 
-    def update_direction_towards_target(self) -> None:
+    def update_direction_towards_target(self, environment: Optional['Playground'] = None) -> bool:
         """
-        Updates the agent's direction to move towards the target position.
+        Updates the agent's direction to move towards the target position. If the playground has obstacles, the agent
+        follows a shortest path around them (see `Playground.find_path`); the path is kept until the target changes or
+        the agent leaves it.
+
+        Args:
+            environment: The Playground object that the agent is in.
+
+        Returns:
+            False if the target can't be reached; the target is then dropped, and True otherwise.
         """
         target_x, target_y = self.target_position
+        if environment is not None and environment.obstacles:
+            next_cell = self.find_next_cell_on_path(environment)
+            if next_cell is None:
+                self.unreachable_cells.add(self.target_position)
+                self.mark_visited([self.target_position])
+                self.reset_target_position()
+                return False
+            target_x, target_y = next_cell
         if self.position[0] < target_x:
             self.turn_to_direction(RIGHT)
         elif self.position[0] > target_x:
@@ -591,6 +866,24 @@ Reason: <reason>
         elif self.position[1] > target_y:
             self.turn_to_direction(UP)
 
+        return True
+
+    def find_next_cell_on_path(self, environment: 'Playground') -> Optional[Tuple[int, int]]:
+        """
+        Returns the next cell of the path to the target, or None if the target can't be reached.
+
+        Args:
+            environment: The Playground object that the agent is in.
+        """
+        if self.path_target != self.target_position or self.position not in self.path:
+            self.path = environment.find_path(self.position, self.target_position) or []
+            self.path_target = self.target_position
+        else:
+            self.path = self.path[self.path.index(self.position):]
+        if not self.path:
+            return None
+        return self.path[1] if len(self.path) > 1 else self.path[0]
+
     def turn_to_direction(self, direction: str) -> None:
         """
         Turns the agent to the given direction.
@@ -661,7 +954,10 @@ Reason: <reason>
 
         Returns:
             A boolean value indicating whether the target position is in the current direction of the agent.
+            An agent without a target (for example, one that has just taken a ball) has no such direction.
         """
+        if self.target_position is None:
+            return False
         if self.direction in [UP, DOWN]:
             return self.position[0] == self.target_position[0]
         else:
@@ -684,6 +980,9 @@ Reason: <reason>
             if not environment.is_valid_position(new_position):
                 distances.append(cmath.inf)
                 continue
+            if self.target_position is None:
+                distances.append(0)
+                continue
             distance = self.manhattan_distance(new_position, self.target_position)
             distances.append(distance)
 
@@ -769,11 +1068,3 @@ Reason: <reason>
             The Manhattan distance between the two positions.
         """
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
-
-    @staticmethod
-    def mark_position(map_, position, label, combine=False):
-        x, y = position
-        if combine and map_[y][x] != EMPTY:
-            map_[y][x] += ',' + label
-        else:
-            map_[y][x] = label
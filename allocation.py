@@ -0,0 +1,268 @@
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from agent import Agent
+
+Position = Tuple[int, int]
+
+GREEDY = 'greedy'
+AUCTION = 'auction'
+HUNGARIAN = 'hungarian'
+
+
+def manhattan_cost(agent_position: Position, target: Position) -> int:
+    """
+    Returns the Manhattan distance between an agent and a target.
+    """
+    return abs(agent_position[0] - target[0]) + abs(agent_position[1] - target[1])
+
+
+def assign_greedy(costs: List[List[float]]) -> List[int]:
+    """
+    Assigns rows to columns by taking the cheapest remaining pair first.
+
+    Args:
+        costs: The cost matrix, one row per agent and one column per target.
+
+    Returns:
+        The column assigned to each row, or -1 for a row without a column.
+    """
+    pairs = sorted((cost, row, column) for row, costs_row in enumerate(costs) for column, cost in enumerate(costs_row))
+    assignment = [-1] * len(costs)
+    taken = set()
+    for _, row, column in pairs:
+        if assignment[row] == -1 and column not in taken:
+            assignment[row] = column
+            taken.add(column)
+    return assignment
+
+
+def assign_auction(costs: List[List[float]], epsilon: Optional[float] = None) -> List[int]:
+    """
+    Assigns rows to columns with the auction algorithm: unassigned rows bid for their best column, raising its price
+    by the difference to their second-best column plus epsilon, until every row is assigned. With integer costs and
+    epsilon < 1 / number of columns, the result is an optimal assignment.
+
+    The auction starts with a large epsilon, which is divided by 4 after each complete auction while the prices are
+    kept (epsilon scaling), so few bids are needed at the final epsilon.
+
+    Args:
+        costs: The cost matrix, one row per agent and one column per target. It must not have more rows than columns.
+        epsilon: The final minimum raise of a bid. By default, small enough for an optimal result with integer costs.
+
+    Returns:
+        The column assigned to each row.
+    """
+    num_rows = len(costs)
+    if num_rows == 0:
+        return []
+    num_columns = len(costs[0])
+    if epsilon is None:
+        epsilon = 1 / (num_columns + 1)
+
+    # the columns left over go to dummy rows without a cost: epsilon scaling is only optimal for square problems
+    square_costs = costs + [[0] * num_columns for _ in range(num_columns - num_rows)]
+    prices = [0.0] * num_columns
+    current_epsilon = max(epsilon, max(max(row) for row in costs) / 4)
+    while True:
+        assignment = _auction_round(square_costs, prices, current_epsilon)
+        if current_epsilon <= epsilon:
+            return assignment[:num_rows]
+        current_epsilon = max(epsilon, current_epsilon / 4)
+
+
+def _auction_round(costs: List[List[float]], prices: List[float], epsilon: float) -> List[int]:
+    num_rows, num_columns = len(costs), len(costs[0])
+    owner = [-1] * num_columns
+    assignment = [-1] * num_rows
+    unassigned = list(range(num_rows))
+    while unassigned:
+        row = unassigned.pop()
+        # value of a column for the row: -(cost + price)
+        best_column, best_value, second_value = -1, float('-inf'), float('-inf')
+        costs_row = costs[row]
+        for column in range(num_columns):
+            value = -(costs_row[column] + prices[column])
+            if value > best_value:
+                best_column, best_value, second_value = column, value, best_value
+            elif value > second_value:
+                second_value = value
+        if second_value == float('-inf'):
+            second_value = best_value
+        prices[best_column] += best_value - second_value + epsilon
+
+        previous_owner = owner[best_column]
+        if previous_owner != -1:
+            assignment[previous_owner] = -1
+            unassigned.append(previous_owner)
+        owner[best_column] = row
+        assignment[row] = best_column
+    return assignment
+
+
+def assign_hungarian(costs: List[List[float]]) -> List[int]:
+    """
+    Assigns rows to columns with the Hungarian algorithm (Kuhn-Munkres with potentials), which minimizes the total
+    cost in O(rows^2 * columns).
+
+    Args:
+        costs: The cost matrix, one row per agent and one column per target. It must not have more rows than columns.
+
+    Returns:
+        The column assigned to each row.
+    """
+    num_rows = len(costs)
+    if num_rows == 0:
+        return []
+    num_columns = len(costs[0])
+    infinity = float('inf')
+
+    # 1-based arrays; column 0 is a virtual column used to start the search of each row
+    row_potential = [0.0] * (num_rows + 1)
+    column_potential = [0.0] * (num_columns + 1)
+    column_row = [0] * (num_columns + 1)
+    way = [0] * (num_columns + 1)
+    for row in range(1, num_rows + 1):
+        column_row[0] = row
+        column = 0
+        min_slack = [infinity] * (num_columns + 1)
+        used = [False] * (num_columns + 1)
+        while True:
+            used[column] = True
+            current_row = column_row[column]
+            delta, next_column = infinity, 0
+            for candidate in range(1, num_columns + 1):
+                if used[candidate]:
+                    continue
+                slack = costs[current_row - 1][candidate - 1] - row_potential[current_row] - column_potential[candidate]
+                if slack < min_slack[candidate]:
+                    min_slack[candidate] = slack
+                    way[candidate] = column
+                if min_slack[candidate] < delta:
+                    delta, next_column = min_slack[candidate], candidate
+            for candidate in range(num_columns + 1):
+                if used[candidate]:
+                    row_potential[column_row[candidate]] += delta
+                    column_potential[candidate] -= delta
+                else:
+                    min_slack[candidate] -= delta
+            column = next_column
+            if column_row[column] == 0:
+                break
+        # flip the augmenting path
+        while column:
+            previous_column = way[column]
+            column_row[column] = column_row[previous_column]
+            column = previous_column
+
+    assignment = [-1] * num_rows
+    for column in range(1, num_columns + 1):
+        if column_row[column]:
+            assignment[column_row[column] - 1] = column - 1
+    return assignment
+
+
+STRATEGIES: Dict[str, Callable[[List[List[float]]], List[int]]] = {
+    GREEDY: assign_greedy,
+    AUCTION: assign_auction,
+    HUNGARIAN: assign_hungarian,
+}
+
+
+def solve(costs: List[List[float]], strategy: str) -> List[int]:
+    """
+    Solves an assignment problem with the given strategy. The auction and Hungarian algorithms need at least as many
+    columns as rows, so a problem with more rows is solved transposed; the rows left over get no column.
+
+    Args:
+        costs: The cost matrix, one row per agent and one column per target.
+        strategy: GREEDY, AUCTION or HUNGARIAN.
+
+    Returns:
+        The column assigned to each row, or -1 for a row without a column.
+    """
+    if not costs or not costs[0]:
+        return [-1] * len(costs)
+    assign = STRATEGIES[strategy]
+    if strategy == GREEDY or len(costs) <= len(costs[0]):
+        return assign(costs)
+
+    transposed = [list(column) for column in zip(*costs)]
+    assignment = [-1] * len(costs)
+    for column, row in enumerate(assign(transposed)):
+        assignment[row] = column
+    return assignment
+
+
+class TaskAllocator:
+    """
+    Assigns the agents of a team to the balls and holes they know about, once per round for the whole team, instead of
+    letting every agent pick its nearest target in turn.
+
+    Agents without a ball are assigned to balls and agents with a ball to holes. An assignment is kept until the set of
+    agents or the set of targets of its problem changes, so a problem is only solved again when needed.
+    """
+
+    def __init__(self, strategy: str = HUNGARIAN, cost: Callable[[Position, Position], float] = manhattan_cost):
+        """
+        Args:
+            strategy: GREEDY, AUCTION or HUNGARIAN.
+            cost: The cost of sending an agent at a position to a target.
+
+        Raises:
+            ValueError: If the strategy is unknown.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown allocation strategy: {strategy}")
+        self.strategy = strategy
+        self.cost = cost
+        # (team, has ball) -> (agents and targets of the problem, the solved assignment)
+        self._cache: Dict[Tuple[int, bool], Tuple[tuple, Dict[str, Position]]] = {}
+        self.solved = 0
+
+    def allocate(self, team_id: int, agents: List['Agent']) -> Dict[str, Optional[Position]]:
+        """
+        Assigns targets to the agents of a team.
+
+        Args:
+            team_id: The ID of the team.
+            agents: The agents of the team that take part in the allocation.
+
+        Returns:
+            A dictionary of agent ID -> assigned target, or None for an agent without a target.
+        """
+        assignment: Dict[str, Optional[Position]] = {}
+        for has_ball in (False, True):
+            group = [agent for agent in agents if agent.has_ball == has_ball]
+            if not group:
+                self._cache.pop((team_id, has_ball), None)
+                continue
+            targets = self._known_targets(group, has_ball)
+            assignment.update(self._allocate_group((team_id, has_ball), group, targets))
+        return assignment
+
+    def _allocate_group(self,
+                        key: Tuple[int, bool],
+                        agents: List['Agent'],
+                        targets: List[Position]) -> Dict[str, Optional[Position]]:
+        problem = (tuple(agent.agent_id for agent in agents), tuple(targets))
+        cached = self._cache.get(key)
+        if cached is None or cached[0] != problem:
+            costs = [[self.cost(agent.position, target) for target in targets] for agent in agents]
+            columns = solve(costs, self.strategy)
+            solution = {agent.agent_id: targets[column] for agent, column in zip(agents, columns) if column != -1}
+            self._cache[key] = (problem, solution)
+            self.solved += 1
+        solution = self._cache[key][1]
+        return {agent.agent_id: solution.get(agent.agent_id) for agent in agents}
+
+    @staticmethod
+    def _known_targets(agents: List['Agent'], has_ball: bool) -> List[Position]:
+        # the union of what the agents know, in the order they learned it, without the cells walled in by obstacles
+        targets = {}
+        unreachable = set()
+        for agent in agents:
+            unreachable.update(agent.unreachable_cells)
+            for position in (agent.hole_positions if has_ball else agent.ball_positions):
+                targets[position] = None
+        return [position for position in targets if position not in unreachable]
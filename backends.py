@@ -0,0 +1,87 @@
+import importlib
+import threading
+from typing import Any, Dict
+
+LLM = 'llm'
+TERMINAL = 'terminal'
+
+DEFAULT_LLM_BACKEND = 'hugchat'
+
+# kind -> name -> '<module>' or '<module>:<attribute>'
+# The backends are only imported the first time they are used, so a run without the chatbot or without the
+# interactive viewer never imports hugchat or curses.
+_registry: Dict[str, Dict[str, str]] = {
+    LLM: {
+        'hugchat': 'chatbot:Chatbot',
+    },
+    TERMINAL: {
+        'nt': 'msvcrt',
+        'posix': 'curses',
+    },
+}
+_loaded: Dict[tuple[str, str], Any] = {}
+# the session of each thread with each LLM backend (see `query_llm`)
+_sessions = threading.local()
+
+
+def register_backend(kind: str, name: str, path: str) -> None:
+    """
+    Registers a backend without importing it.
+
+    Args:
+        kind: The kind of the backend (LLM or TERMINAL).
+        name: The name of the backend.
+        path: The module of the backend, optionally followed by ':' and the name of an attribute of the module.
+    """
+    _registry.setdefault(kind, {})[name] = path
+    _loaded.pop((kind, name), None)
+
+
+def load_backend(kind: str, name: str) -> Any:
+    """
+    Returns a backend, importing it the first time it is used.
+
+    Args:
+        kind: The kind of the backend (LLM or TERMINAL).
+        name: The name of the backend.
+
+    Returns:
+        The module of the backend, or its attribute if the path of the backend names one.
+
+    Raises:
+        ValueError: If no backend with the given kind and name is registered.
+    """
+    key = (kind, name)
+    if key not in _loaded:
+        path = _registry.get(kind, {}).get(name)
+        if path is None:
+            raise ValueError(f"Unknown {kind} backend: {name}")
+        module_name, _, attribute = path.partition(':')
+        backend = importlib.import_module(module_name)
+        _loaded[key] = getattr(backend, attribute) if attribute else backend
+    return _loaded[key]
+
+
+def query_llm(prompt: str, name: str = DEFAULT_LLM_BACKEND) -> str:
+    """
+    Sends a prompt to an LLM backend and returns its answer.
+
+    Every thread queries through a session of its own (see `Chatbot.new_session`), and a session answers every prompt
+    in a new conversation. The queries of several threads (see `DecisionExecutor`) therefore run at the same time,
+    and an answer doesn't depend on the prompts that were sent before it.
+
+    Args:
+        prompt: The prompt to send.
+        name: The name of the LLM backend.
+
+    Returns:
+        The answer of the backend.
+    """
+    backend = load_backend(LLM, name)
+    sessions = getattr(_sessions, 'by_name', None)
+    if sessions is None:
+        sessions = _sessions.by_name = {}
+    # a backend registered again under the same name gets new sessions
+    if name not in sessions or sessions[name][0] is not backend:
+        sessions[name] = (backend, backend().new_session())
+    return str(sessions[name][1].query(prompt, web_search=False))
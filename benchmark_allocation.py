@@ -0,0 +1,49 @@
+"""
+Measures the time to assign a team of agents to targets with each allocation strategy, against the size of the team,
+and the total distance of the resulting assignments.
+
+Usage: python benchmark_allocation.py [team size ...]
+"""
+import random
+import sys
+import time
+
+from allocation import STRATEGIES, manhattan_cost, solve
+
+DEFAULT_TEAM_SIZES = [10, 25, 50, 100, 200]
+BOARD_SIZE = 1000
+
+
+def make_problem(team_size: int, seed: int = 0) -> list[list[int]]:
+    """
+    Places a team and as many targets at random positions on the board.
+
+    Args:
+        team_size: The number of agents (and targets).
+        seed: The seed of the positions.
+
+    Returns:
+        The cost matrix of the problem, one row per agent.
+    """
+    generator = random.Random(seed)
+    agents = [(generator.randrange(BOARD_SIZE), generator.randrange(BOARD_SIZE)) for _ in range(team_size)]
+    targets = [(generator.randrange(BOARD_SIZE), generator.randrange(BOARD_SIZE)) for _ in range(team_size)]
+    return [[manhattan_cost(agent, target) for target in targets] for agent in agents]
+
+
+def main(team_sizes: list[int]) -> None:
+    print('team size'.ljust(10) + ''.join(f'{strategy:>24}' for strategy in STRATEGIES))
+    for team_size in team_sizes:
+        costs = make_problem(team_size)
+        row = f'{team_size:<10}'
+        for strategy in STRATEGIES:
+            start = time.perf_counter()
+            assignment = solve(costs, strategy)
+            elapsed = time.perf_counter() - start
+            total = sum(costs[agent][target] for agent, target in enumerate(assignment) if target != -1)
+            row += f'{elapsed * 1000:>12.1f} ms{total:>9}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_TEAM_SIZES)
@@ -0,0 +1,64 @@
+"""
+Measures the rounds and the battery that each deadlock policy saves: the same seeded games are played with the
+detector only counting the stuck agents, then with each policy, and the means are compared.
+
+Usage: python benchmark_deadlock.py [number of games] [number of obstacles]
+"""
+import sys
+
+from controller import Controller
+from deadlock import DeadlockDetector, POLICIES
+from playground import Playground
+from random_seed import RandomSeed
+from results import game_result
+
+DIMENSIONS = (8, 8)
+NUM_AGENTS = 4
+NUM_ITEMS = 6
+BATTERY = 60
+# agents that wait for each other forever don't spend their battery, so a game is cut after this many rounds
+MAX_ROUNDS = 500
+
+
+def play(seed: int, policy, num_obstacles: int) -> dict:
+    """
+    Plays one game without chatbot and returns its outcome (see `results.game_result`) and the stats of the detector.
+    """
+    RandomSeed().set_seed(seed)
+    playground = Playground(dimensions=DIMENSIONS, num_holes=NUM_ITEMS, num_balls=NUM_ITEMS,
+                            num_obstacles=num_obstacles)
+    detector = DeadlockDetector(policy=policy)
+    controller = Controller(playground=playground, deadlock_detector=detector)
+    controller.create_agents(None, NUM_AGENTS, chatbot=False, battery=BATTERY)
+    controller.start()
+    for _ in controller.run(max_rounds=MAX_ROUNDS):
+        pass
+    controller.stop()
+    result = game_result(controller, BATTERY)
+    result['cut'] = not controller.game_over()
+    result.update(detector.stats)
+    return result
+
+
+def main(num_games: int, num_obstacles: int) -> None:
+    print(f'{num_games} games, {DIMENSIONS[0]}x{DIMENSIONS[1]}, {NUM_AGENTS} agents, {num_obstacles} obstacles')
+    columns = ('success', 'filled', 'rounds', 'battery used', 'stuck', 'cut games', 'rounds saved', 'battery saved')
+    print('policy'.ljust(10) + ''.join(f'{column:>14}' for column in columns))
+    baseline = None
+    for policy in (None,) + POLICIES:
+        results = [play(seed, policy, num_obstacles) for seed in range(num_games)]
+        rounds = sum(result['rounds'] for result in results) / num_games
+        battery_used = sum(result['battery_used'] for result in results) / num_games
+        if baseline is None:
+            baseline = rounds, battery_used
+        print(f'{policy or "none":<10}'
+              f'{sum(result["success"] for result in results) / num_games:>14.0%}'
+              f'{sum(result["filled"] for result in results) / num_games:>14.2f}'
+              f'{rounds:>14.1f}{battery_used:>14.1f}'
+              f'{sum(result["deadlocks"] + result["livelocks"] for result in results) / num_games:>14.1f}'
+              f'{sum(result["cut"] for result in results):>14}'
+              f'{baseline[0] - rounds:>14.1f}{baseline[1] - battery_used:>14.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100, int(sys.argv[2]) if len(sys.argv) > 2 else 0)
@@ -0,0 +1,40 @@
+"""
+Measures the throughput of the vectorized environment (agent-steps per second) with random actions, against the
+number of games.
+
+Usage: python benchmark_env.py [number of games ...]
+"""
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("benchmark_env.py requires NumPy, which is not installed: pip install numpy") from error
+
+from vector_env import NUM_ACTIONS, VectorEnv
+
+DEFAULT_NUM_ENVS = [1, 16, 64, 256]
+AGENTS_PER_ENV = 4
+STEPS = 200
+
+
+def main(num_envs_list: list[int]) -> None:
+    generator = np.random.default_rng(0)
+    print('games'.ljust(10) + f'{"agent-steps/s":>16}{"games ended":>14}')
+    for num_envs in num_envs_list:
+        env = VectorEnv(num_envs=num_envs, agents_per_env=AGENTS_PER_ENV, dimensions=(20, 20), num_holes=10,
+                        num_balls=10, battery=100)
+        env.reset(seed=0)
+        actions = generator.integers(0, NUM_ACTIONS, size=(STEPS, num_envs, AGENTS_PER_ENV))
+        ended = 0
+        start = time.perf_counter()
+        for step_actions in actions:
+            _, _, terminated, truncated, _ = env.step(step_actions)
+            ended += int(terminated.sum() + truncated.sum())
+        elapsed = time.perf_counter() - start
+        print(f'{num_envs:<10}{STEPS * num_envs * AGENTS_PER_ENV / elapsed:>16,.0f}{ended:>14}')
+
+
+if __name__ == '__main__':
+    main([int(num_envs) for num_envs in sys.argv[1:]] or DEFAULT_NUM_ENVS)
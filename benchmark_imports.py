@@ -0,0 +1,59 @@
+"""
+Measures the import time of the headless path (`python -X importtime`) and checks that it stays lean: importing the
+game without the chatbot, the interactive viewer, the results database and the live viewer must not load the LLM
+backend, the terminal UI, sqlite3 or http.server.
+
+Usage: python benchmark_imports.py [module ...]
+"""
+import subprocess
+import sys
+
+HEADLESS_MODULES = ['main', 'controller', 'playground', 'agent', 'replay', 'checkpoint', 'decision', 'team',
+                    'allocation', 'exploration', 'message_bus', 'memory_map', 'scenario', 'state_hash', 'deadlock',
+                    'feasibility']
+# modules that must only be loaded when they are needed: the backends of the registry, and the modules of optional
+# features (-db, -live)
+LAZY_MODULES = ['hugchat', 'chatbot', 'curses', 'msvcrt', 'asyncio', 'results', 'sqlite3', 'viewer', 'http.server']
+
+
+def is_lazy(name: str) -> bool:
+    """
+    Checks whether an imported module is one of LAZY_MODULES or a submodule of one.
+    """
+    return any(name == lazy or name.startswith(lazy + '.') for lazy in LAZY_MODULES)
+
+
+def measure_imports(module: str) -> dict[str, int]:
+    """
+    Imports a module in a new interpreter with `-X importtime`.
+
+    Args:
+        module: The name of the module to import.
+
+    Returns:
+        A dictionary of every imported module -> its cumulative import time in microseconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def main(modules: list[str]) -> int:
+    failed = False
+    for module in modules:
+        imports = measure_imports(module)
+        loaded = sorted(name for name in imports if is_lazy(name))
+        status = 'OK' if not loaded else 'FAIL (loads ' + ', '.join(loaded) + ')'
+        print(f'{module.ljust(12)} {imports.get(module, 0) / 1000:8.1f} ms  {status}')
+        failed = failed or bool(loaded)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:] or HEADLESS_MODULES))
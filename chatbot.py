@@ -5,6 +5,8 @@ from hugchat.login import Login
 # noinspection PyMissingConstructor
 class Chatbot(hugchat.ChatBot):
     _instance = None
+    _cookies = None
+    _model = 6
 
     def __new__(cls):
         if cls._instance is None:
@@ -19,8 +21,39 @@ class Chatbot(hugchat.ChatBot):
         cookies = sign.login(cookie_dir_path='./cookies/', save_cookies=True)
         hugchat.ChatBot.__init__(Chatbot._instance, cookies=cookies.get_dict())
         Chatbot._instance.switch_llm(model)
+        Chatbot._cookies = cookies.get_dict()
+        Chatbot._model = model
 
     def __init__(self):
         # Avoid reinitialization if instance already exists
         if not hasattr(self, '_initialized'):
             self._initialized = True
+
+    def new_session(self) -> 'ChatbotSession':
+        """
+        Returns a new connection to the chatbot with the account of the configured instance, for a thread of its own.
+        """
+        if Chatbot._cookies is None:
+            raise Exception("Chatbot is not configured yet.")
+        return ChatbotSession(Chatbot._cookies, Chatbot._model)
+
+
+class ChatbotSession:
+    """
+    A connection to the chatbot that answers every prompt in a new conversation, so an answer doesn't depend on the
+    prompts that were sent before it. Each session has its own HTTP session, so several sessions can be queried at the
+    same time.
+    """
+
+    def __init__(self, cookies, model):
+        self._chatbot = hugchat.ChatBot(cookies=cookies)
+        self._chatbot.switch_llm(model)
+
+    def query(self, prompt, web_search=False):
+        conversation = self._chatbot.new_conversation(switch_to=True)
+        try:
+            # the answer is read in full before its conversation is deleted
+            return str(self._chatbot.query(prompt, web_search=web_search))
+        finally:
+            # the conversation is of no use after its only answer
+            self._chatbot.delete_conversation(conversation)
@@ -0,0 +1,91 @@
+import gzip
+import os
+import pickle
+from typing import TYPE_CHECKING
+
+from random_seed import RandomSeed
+
+if TYPE_CHECKING:
+    from controller import Controller
+
+VERSION = 6
+
+
+class Checkpointer:
+    """
+    Saves the whole game (playground, agents with their memories, locks and friends, the current round and the state
+    of the random number generator) every few rounds, so a game can be resumed after a crash and continue exactly as
+    an uninterrupted run.
+    """
+
+    def __init__(self, path: str, interval: int = 10):
+        """
+        Args:
+            path: The path of the checkpoint file. It is replaced by every new checkpoint.
+            interval: Number of rounds between two checkpoints.
+        """
+        self.path = path
+        self.interval = max(1, interval)
+
+    def save(self, controller: 'Controller') -> None:
+        """
+        Writes a checkpoint of the game.
+
+        The checkpoint is first written to a temporary file and flushed to the disk, which then replaces the previous
+        checkpoint, so a crash while writing never leaves a broken checkpoint behind.
+
+        Args:
+            controller: The Controller object of the game.
+        """
+        state = {
+            'version': VERSION,
+            'random_seed': RandomSeed().get_state(),
+            'controller': controller,
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as raw_file:
+            with gzip.GzipFile(fileobj=raw_file, mode='wb') as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+        # the directory entries of the temporary file and of the replaced checkpoint must reach the disk too
+        directory = os.path.dirname(os.path.abspath(self.path))
+        _fsync_directory(directory)
+        os.replace(temp_path, self.path)
+        _fsync_directory(directory)
+
+    @staticmethod
+    def load(path: str) -> 'Controller':
+        """
+        Restores a game from a checkpoint, including the state of the random number generator.
+
+        The decision executor, the replay writer and the checkpointer of the game are not saved; they have to be set
+        again on the returned controller before calling `Controller.resume`.
+
+        Args:
+            path: The path of the checkpoint file.
+
+        Returns:
+            The Controller object of the restored game.
+
+        Raises:
+            ValueError: If the checkpoint has an unsupported version.
+        """
+        with gzip.open(path, 'rb') as file:
+            state = pickle.load(file)
+        if state.get('version') != VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {state.get('version')}")
+
+        RandomSeed().set_state(state['random_seed'])
+        return state['controller']
+
+
+def _fsync_directory(path: str) -> None:
+    # a directory can't be opened (and synced) on Windows, so its entries are left to the file system there
+    if os.name == 'nt':
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
@@ -35,6 +35,9 @@ RIGHT = 'right'
 DOWN = 'down'
 LEFT = 'left'
 
+# probability that a ball moves to a neighbour cell when a hole is filled
+BALL_DRIFT_PROBABILITY = 0.1
+
 CELL_COLORS = {
     BALL: BALL_CELL,
     HOLE: HOLE_CELL,
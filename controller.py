@@ -1,17 +1,29 @@
 import random_seed
 import random
 from copy import deepcopy
-from typing import List, Tuple, Optional, TYPE_CHECKING
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Tuple, Optional, TYPE_CHECKING
 
 import bcolors
 from consts import UUID_LEN, HAVING_BALL, BALL_CELL, HOLE_CELL, FILLED_HOLE_CELL, EMPTY, OBSTACLE, ICONS, AGENT, \
     CELL_COLORS, ARROWS, HOLE, BALL, FILLED_HOLE, UP
 
 from agent import Agent
+from decision import DecisionExecutor
+from exploration import RANDOM
+from feasibility import COMPLETED, NO_BATTERY
+from team import TeamRegistry
 from utils import clear_screen
 
 if TYPE_CHECKING:
+    from deadlock import DeadlockDetector
+    from feasibility import FeasibilityChecker
     from playground import Playground
+    from allocation import TaskAllocator
+    from checkpoint import Checkpointer
+    from message_bus import MessageBus
+    from replay import ReplayWriter
+    from state_hash import HashLog
+    from viewer import LiveViewer
 
 
 class DrawableAgent:
@@ -183,13 +195,76 @@ class Draw:
             return ICONS[factor] + str(agent.type).ljust(2)[0:2]
 
 
+class RoundState:
+    """
+    A lightweight summary of a round, yielded by `Controller.run` and `Controller.arun`.
+
+    It holds the state of every agent and the cells that changed in the round (position -> new label of the cell),
+    instead of a copy of the whole playground.
+    """
+
+    def __init__(self,
+                 iteration: int,
+                 agents: List[DrawableAgent],
+                 changed_cells: Dict[Tuple[int, int], str],
+                 balls_remaining: int,
+                 filled_holes: int,
+                 game_over: bool):
+        self.iteration = iteration
+        self.agents = agents
+        self.changed_cells = changed_cells
+        self.balls_remaining = balls_remaining
+        self.filled_holes = filled_holes
+        self.game_over = game_over
+
+
 class Controller:
-    def __init__(self, playground: 'Playground', log_file: str = None):
+    def __init__(self,
+                 playground: 'Playground',
+                 log_file: str = None,
+                 decision_executor: Optional['DecisionExecutor'] = None,
+                 replay_writer: Optional['ReplayWriter'] = None,
+                 checkpointer: Optional['Checkpointer'] = None,
+                 radio_range: Optional[int] = None,
+                 message_bus: Optional['MessageBus'] = None,
+                 allocator: Optional['TaskAllocator'] = None,
+                 exploration: str = RANDOM,
+                 viewer: Optional['LiveViewer'] = None,
+                 hash_log: Optional['HashLog'] = None,
+                 deadlock_detector: Optional['DeadlockDetector'] = None,
+                 feasibility_checker: Optional['FeasibilityChecker'] = None):
         self.playground = playground
         self.agents: List[Agent] = []  # List to store all agents
         self.draws: list[Draw] = []
         self.draw_index = 0
+        # number of the current round; it is not the number of draws for a game restored from a checkpoint
+        self.round = 0
+        # cells changed in the latest round
+        self.changed_cells: set[Tuple[int, int]] = set()
         self.log_file = log_file
+        # runs the decision phase of the LLM agents at the start of each round; without one, they plan serially
+        self.decision_executor = decision_executor
+        # if set, every round is also written to a replay file
+        self.replay_writer = replay_writer
+        # if set, the whole game is saved every few rounds, so it can be resumed after a crash
+        self.checkpointer = checkpointer
+        # membership and communication channels of the teams
+        self.teams = TeamRegistry(radio_range=radio_range, bus=message_bus)
+        # if set, the targets of the agents that don't use the LLM are assigned for the whole team at once
+        self.allocator = allocator
+        # how the agents pick a cell to explore when they know no target (see exploration.py)
+        self.exploration = exploration
+        # if set, the changes of every round are streamed to the browsers watching the game
+        self.viewer = viewer
+        # if set, the hash of the game state at the end of every round is written to a file (see state_hash.py)
+        self.hash_log = hash_log
+        # if set, agents that wait for each other or move in a loop are detected at the end of every round and sent on
+        # another way
+        self.deadlock_detector = deadlock_detector
+        # if set, the game ends as soon as the remaining holes provably can't be filled anymore
+        self.feasibility_checker = feasibility_checker
+        # why the game can't be won anymore (see feasibility.py), or None
+        self.hopeless_reason: Optional[str] = None
 
     def create_agent(self,
                      chatbot: bool,
@@ -197,7 +272,8 @@ class Controller:
                      agent_type: int = 1,
                      position: Optional[Tuple[int, int]] = None,
                      field_of_view: Optional[int] = 3,
-                     battery=30, ) -> Optional['Agent']:
+                     battery=30,
+                     exploration: Optional[str] = None) -> Optional['Agent']:
         """
         Creates a new agent and adds it to the playground.
 
@@ -209,6 +285,7 @@ class Controller:
                       If not provided, the agent will be placed at a random position.
             field_of_view: An integer representing the field of view. If not provided, the default field of view will be used.
             battery: An integer representing the initial battery level. If not provided, the default battery level will be used.
+            exploration: How the agent explores (see exploration.py). If not provided, the exploration of the controller will be used.
 
         Returns:
             A boolean value indicating whether the operation was successful. Returns True if the agent was created and added successfully,
@@ -223,7 +300,8 @@ class Controller:
                       field_of_view=field_of_view,
                       battery=battery,
                       log_file=self.log_file,
-                      chatbot=chatbot)
+                      chatbot=chatbot,
+                      exploration=exploration if exploration is not None else self.exploration)
         if self.playground.add_agent(agent):
             self.agents.append(agent)  # Add the new agent to the list of agents
             return agent
@@ -234,7 +312,9 @@ class Controller:
                       agents_str: Optional[str],
                       min_agent: int,
                       chatbot: bool = True,
-                      team_ids: Optional[List[int]] = None) -> 'Controller':
+                      team_ids: Optional[List[int]] = None,
+                      field_of_view: int = 3,
+                      battery: int = 30) -> 'Controller':
         """
         Creates agents based on the provided string.
 
@@ -244,6 +324,8 @@ class Controller:
             min_agent: An integer representing the minimum number of agents to create for each team.
             chatbot: A boolean value indicating whether to use the chatbot. Default is True.
             team_ids: A list of integers representing the team IDs.
+            field_of_view: The field of view of the agents. Default is 3.
+            battery: The initial battery level of the agents. Default is 30.
 
         Raises:
             ValueError: If the number of agents created is less than the minimum number specified.
@@ -260,29 +342,68 @@ class Controller:
             team_ids = [1]
 
         if agents_str:
-            agents = agents_str.split(';')
-            for agent in agents:
-                agent_info = agent.split(',')
-                if len(agent_info) == 3:
-                    x, y, agent_type = map(int, agent_info)
-                else:
-                    x, y = map(int, agent_info)
-                    agent_type = 1  # default agent type
-                agent = self.create_agent(agent_type=agent_type, position=(x, y), chatbot=chatbot)
-                if not agent:
-                    raise ValueError(f"Agent at position ({x}, {y}) was not created")
+            self.add_agents(Controller.parse_agents(agents_str), chatbot=chatbot, field_of_view=field_of_view,
+                            battery=battery)
 
         for team_id in team_ids:
             agent_counts = len(self.get_agents_by_type(team_id))
             if agent_counts < min_agent:
                 # Create at least min_agent agents of each team type if no agents are specified
                 for i in range(min_agent - agent_counts):
-                    agent = self.create_agent(agent_type=team_id, chatbot=chatbot)
+                    agent = self.create_agent(agent_type=team_id, chatbot=chatbot, field_of_view=field_of_view,
+                                              battery=battery)
                     if not agent:
                         raise ValueError(f"Agent {agent_counts + i + 1} from team {team_id} was not created")
 
         return self
 
+    @staticmethod
+    def parse_agents(agents_str: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Parses a string of agents in the format "x,y,type;x,y,type;...". The type may be left out (default: 1).
+
+        Args:
+            agents_str: The string of agents.
+
+        Returns:
+            An iterator of (x, y, type) tuples.
+        """
+        for agent in agents_str.split(';'):
+            agent_info = agent.split(',')
+            if len(agent_info) == 3:
+                x, y, agent_type = map(int, agent_info)
+            else:
+                x, y = map(int, agent_info)
+                agent_type = 1  # default agent type
+            yield x, y, agent_type
+
+    def add_agents(self,
+                   agents: Iterable[Tuple[int, int, int]],
+                   chatbot: bool = True,
+                   field_of_view: Optional[int] = 3,
+                   battery: int = 30) -> 'Controller':
+        """
+        Creates agents at given positions. The agents are taken from the iterable one by one, so it can be a generator
+        that streams a large fleet (see `Scenario`).
+
+        Args:
+            agents: An iterable of (x, y, type) tuples.
+            chatbot: A boolean value indicating whether to use the chatbot. Default is True.
+            field_of_view: The field of view of the agents.
+            battery: The initial battery level of the agents.
+
+        Raises:
+            ValueError: If an agent can't be created at its position.
+
+        Returns: self
+        """
+        for x, y, agent_type in agents:
+            agent = self.create_agent(agent_type=agent_type, position=(x, y), chatbot=chatbot,
+                                      field_of_view=field_of_view, battery=battery)
+            if not agent:
+                raise ValueError(f"Agent at position ({x}, {y}) was not created")
+        return self
+
     def get_agent_by_id(self, agent_id: str) -> Optional[Agent]:
         """
         Returns the agent with the specified ID.
@@ -329,13 +450,13 @@ class Controller:
 
     def introduce_friends(self) -> 'Controller':
         """
-        Introduce friends to each agent
+        Introduce friends to each agent by registering it in the team of its type.
 
         Returns:
             self: Returns the Controller instance.
         """
         for agent in self.agents:
-            agent.add_friends(self.get_agents_by_type(agent.type))
+            self.teams.register(agent)
 
         return self
 
@@ -349,14 +470,40 @@ class Controller:
 
         self.playground.place_holes_and_balls()
         self.introduce_friends()
+        if self.replay_writer is not None:
+            self.replay_writer.start(self.playground, self.agents, random_seed.RandomSeed().get_seed())
+        if self.viewer is not None:
+            self.viewer.start(self.playground, self.agents)
+        if self.hash_log is not None:
+            self.hash_log.start(self.playground)
+        self.playground.changed_cells.clear()
+        self.check_feasibility()
 
         self.draws.append(
             Draw(playground=self.playground,
                  agents=[DrawableAgent(agent=agent) for agent in self.agents],
-                 iteration=len(self.draws),
+                 iteration=self.round,
                  ))
         return self
 
+    def resume(self) -> 'Controller':
+        """
+        Continues a game restored from a checkpoint. The playground and the agents are already set up, so only the
+        replay file (if any) is started, from the current round.
+
+        Returns:
+            self: Returns the Controller instance.
+        """
+        if self.replay_writer is not None:
+            self.replay_writer.start(self.playground, self.agents, random_seed.RandomSeed().get_seed(), self.round)
+        if self.viewer is not None:
+            self.viewer.start(self.playground, self.agents, iteration=self.round)
+        if self.hash_log is not None:
+            self.hash_log.start(self.playground, iteration=self.round)
+        self.playground.changed_cells.clear()
+
+        return self
+
     # deprecated
     def perceive_agent(self, agent: Agent) -> None:
         """
@@ -382,13 +529,21 @@ class Controller:
 
         return self
 
-    def next_round(self) -> 'Controller':
+    def next_round(self, draw: bool = True) -> 'Controller':
         """
         Advances the game by one round, allowing each agent to take an action.
 
+        Args:
+            draw (bool, optional): If False, no draw object is created for the round and the progress bar is not printed.
+                                   Default is True.
+
         Returns:
             self: Returns the Controller instance.
         """
+        self.round += 1
+        self.plan_targets()
+        self.allocate_targets()
+
         for agent in self.agents:
             if agent.battery < 0:
                 continue
@@ -408,15 +563,223 @@ class Controller:
 
             agent.see(surrounding_cells).action(self.playground, opposite_agent)
 
-        print(
-            f'\r[{('==' * min(20, len(self.draws))).ljust(40, ' ')} Loading! ({str(self.agents[0].battery).rjust(2, '0')}) {('==' * max(0, len(self.draws) - 20)).ljust(40, ' ')}]',
-            end='\r')
-        # Create a new draw object
-        self.draws.append(
-            Draw(playground=self.playground,
-                 agents=[DrawableAgent(agent=agent) for agent in self.agents],
-                 iteration=len(self.draws),
-                 ))
+        if self.deadlock_detector is not None:
+            self.deadlock_detector.check(self.playground, self.agents)
+        self.check_feasibility()
+
+        # the information the agents sent to their friends in this round
+        if self.teams.bus is not None:
+            self.teams.bus.deliver(self.round)
+
+        if self.replay_writer is not None:
+            self.replay_writer.write_round(self.playground, self.agents, self.round)
+        if self.viewer is not None:
+            self.viewer.write_round(self.playground, self.agents, self.round)
+        if self.hash_log is not None:
+            self.hash_log.write_round(self.playground, self.round)
+        self.changed_cells = self.playground.changed_cells
+        self.playground.changed_cells = set()
+
+        if draw:
+            print(
+                f'\r[{('==' * min(20, self.round)).ljust(40, ' ')} Loading! ({str(self.agents[0].battery).rjust(2, '0')}) {('==' * max(0, self.round - 20)).ljust(40, ' ')}]',
+                end='\r')
+            # Create a new draw object
+            self.draws.append(
+                Draw(playground=self.playground,
+                     agents=[DrawableAgent(agent=agent) for agent in self.agents],
+                     iteration=self.round,
+                     ))
+        if self.checkpointer is not None and self.round % self.checkpointer.interval == 0:
+            self.checkpointer.save(self)
+        return self
+
+    def run(self, max_rounds: Optional[int] = None, draw: bool = False) -> Iterator[RoundState]:
+        """
+        Plays the game round by round and yields the state of each round as soon as it is played.
+
+        A round is only played when the consumer asks for it, so a consumer that stops early doesn't pay for the rounds
+        it never reads. The game is stopped (see `stop`) once it is over or when a round raises an error; a game that
+        is not over yet can be continued with another call, and must be stopped by the caller if it isn't.
+
+        Args:
+            max_rounds: The maximum number of rounds to play. If None, the game is played until it is over.
+            draw (bool, optional): If True, a draw object is also created for each round, like in the console game.
+                                   Default is False.
+
+        Yields:
+            The RoundState of each round.
+        """
+        try:
+            played = 0
+            while not self.game_over() and (max_rounds is None or played < max_rounds):
+                self.next_round(draw=draw)
+                played += 1
+                yield self.get_round_state()
+        except GeneratorExit:
+            # the consumer stopped reading; the game may be continued later
+            raise
+        except BaseException:
+            self.stop()
+            raise
+        if self.game_over():
+            self.stop()
+
+    async def arun(self, max_rounds: Optional[int] = None, draw: bool = False) -> AsyncIterator[RoundState]:
+        """
+        The asynchronous version of `run`. Each round is played in a worker thread, so the event loop keeps running
+        other tasks (for example, queries of the chatbot) while a round is being played.
+        The game is stopped like in `run`.
+
+        A thread can't be interrupted, so a round is never cancelled halfway: if the consumer is cancelled while a
+        round is being played, the round is played to the end before the game is stopped and the CancelledError is
+        raised again. The game is then in the state after that round, and the replay and the hash log record it.
+
+        Args:
+            max_rounds: The maximum number of rounds to play. If None, the game is played until it is over.
+            draw (bool, optional): If True, a draw object is also created for each round. Default is False.
+
+        Yields:
+            The RoundState of each round.
+        """
+        # imported here, because asyncio is only needed by the consumers of the asynchronous API
+        import asyncio
+
+        try:
+            played = 0
+            while not self.game_over() and (max_rounds is None or played < max_rounds):
+                round_task = asyncio.ensure_future(asyncio.to_thread(self.next_round, draw))
+                try:
+                    await asyncio.shield(round_task)
+                except asyncio.CancelledError:
+                    # the round goes on in its thread; wait for it, so the game isn't stopped in the middle of a round
+                    while not round_task.done():
+                        try:
+                            await asyncio.wait([round_task])
+                        except asyncio.CancelledError:
+                            pass
+                    if not round_task.cancelled():
+                        # an error of the round is dropped for the cancellation, and marked as retrieved
+                        round_task.exception()
+                    raise
+                played += 1
+                yield self.get_round_state()
+        except GeneratorExit:
+            # the consumer stopped reading; the game may be continued later
+            raise
+        except BaseException:
+            self.stop()
+            raise
+        if self.game_over():
+            self.stop()
+
+    def get_round_state(self) -> RoundState:
+        """
+        Returns the state of the latest round.
+
+        Returns:
+            The RoundState of the latest round.
+        """
+        return RoundState(iteration=self.round,
+                          agents=[DrawableAgent(agent=agent) for agent in self.agents],
+                          changed_cells={position: self.playground.get_cell_state(position)
+                                         for position in self.changed_cells},
+                          balls_remaining=self.playground.balls_remaining,
+                          filled_holes=self.playground.filled_holes,
+                          game_over=self.game_over())
+
+    def stop(self) -> 'Controller':
+        """
+        Ends the game: closes the replay file and the hash log, tells the live viewers that the game is over and stops
+        the workers of the decision executor.
+
+        Returns:
+            self: Returns the Controller instance.
+        """
+        if self.replay_writer is not None:
+            self.replay_writer.close()
+        if self.viewer is not None:
+            self.viewer.close()
+        if self.hash_log is not None:
+            self.hash_log.close()
+        if self.decision_executor is not None:
+            self.decision_executor.shutdown()
+
+        return self
+
+    def __getstate__(self) -> dict:
+        # the executor and the replay file belong to the process; only the latest draw is kept to keep checkpoints small
+        state = self.__dict__.copy()
+        state['decision_executor'] = None
+        state['replay_writer'] = None
+        state['viewer'] = None
+        state['hash_log'] = None
+        state['checkpointer'] = None
+        state['draws'] = self.draws[-1:]
+        state['draw_index'] = 0
+        return state
+
+    def check_feasibility(self) -> 'Controller':
+        """
+        Checks with the feasibility checker whether the game can still be won, and records the reason if it can't;
+        the game is then over (see `game_over`).
+
+        Returns:
+            self: Returns the Controller instance.
+        """
+        if self.feasibility_checker is not None and self.hopeless_reason is None:
+            self.hopeless_reason = self.feasibility_checker.check(self.playground, self.agents, self.get_max_score())
+
+        return self
+
+    def plan_targets(self) -> 'Controller':
+        """
+        Runs the decision phase of the round: every LLM agent that can still move plans its next target from the
+        state of the game at the start of the round, before any agent moves, and so does every other agent that picks
+        its own targets if the executor is greedy (see `DecisionExecutor`). The decisions are made through the
+        decision executor, so they can run in parallel; without one, a serial executor is created once and kept, so
+        the game is the same whatever the number of workers.
+
+        Returns:
+            self: Returns the Controller instance.
+        """
+        if self.decision_executor is None:
+            self.decision_executor = DecisionExecutor()
+        executor = self.decision_executor
+        planners = [agent for agent in self.agents if agent.battery > 0 and
+                    (agent.useLLM or (executor.greedy and not agent.follows_allocation))]
+        if not planners:
+            return self
+        for agent, target in zip(planners, executor.decide(planners, self.playground)):
+            agent.planned_target = target
+
+        return self
+
+    def allocate_targets(self) -> 'Controller':
+        """
+        Assigns the targets of the agents that don't use the LLM, team by team, through the task allocator of the team
+        or, if it has none, of the controller. Teams without an allocator are skipped.
+
+        The locks of the targets that changed are released before the new ones are taken, so a target can move from
+        one agent to another in the same round.
+
+        Returns:
+            self: Returns the Controller instance.
+        """
+        for team in self.teams.teams.values():
+            allocator = team.allocator if team.allocator is not None else self.allocator
+            if allocator is None:
+                continue
+            agents = [agent for agent in team.members if not agent.useLLM and agent.battery > 0]
+            assignment = allocator.allocate(team.team_id, agents)
+            for agent in agents:
+                target = assignment[agent.agent_id]
+                # a random target is kept until the agent gets a real one
+                if agent.target_position != target and (target is not None or not agent.is_a_random_target):
+                    agent.reset_target_position()
+            for agent in agents:
+                agent.follow_assigned_target(assignment[agent.agent_id])
+
         return self
 
     def draw_current(self, cls=True, legends=False, info=False) -> 'Controller':
@@ -511,27 +874,58 @@ class Controller:
         """
         return self.draw_index == len(self.draws) - 1
 
-    def agents_reached_max_score(self, agent_type: int = 1) -> bool:
+    def agents_reached_max_score(self) -> bool:
         """
-        Checks if all agents of the specified type have reached the maximum score.
+        Checks if the agents of all teams together have filled as many holes as possible.
 
-        Args:
-            agent_type: An integer representing the agent type.
+        The number of filled holes is taken from the playground, which keeps it up to date on every change of the board.
 
         Returns:
-            bool: True if all agents of the specified type have reached the maximum score, False otherwise.
+            bool: True if the maximum score has been reached, False otherwise.
         """
-        return self.get_agents_by_type(agent_type)[0].get_all_agents_score() == self.get_max_score()
+        return self.playground.filled_holes == self.get_max_score()
 
-    def game_over(self, agent_type: int = 1) -> bool:
+    def game_over(self, agent_type: Optional[int] = None) -> bool:
         """
-        Checks if the game is over for the specified agent type.
+        Checks if the game is over: all holes are filled, no agent can move anymore, or the feasibility checker proved
+        that the remaining holes can't be filled.
 
         Args:
-            agent_type: An integer representing the agent type.
+            agent_type: If given, the game is over as soon as the agents of this type can't move anymore, instead of
+                        the agents of every team.
 
         Returns:
-            bool: True if the game is over for the specified agent type, False otherwise.
+            bool: True if the game is over, False otherwise.
+        """
+        if self.agents_reached_max_score() or self.hopeless_reason is not None:
+            return True
+        if agent_type is None:
+            return not any(self.playground.agents_alive.values())
+        return self.playground.agents_alive.get(agent_type, 0) == 0
+
+    def end_reason(self) -> Optional[str]:
+        """
+        Returns why the game ended: COMPLETED, NO_BATTERY or the reason of the feasibility checker (see
+        feasibility.py), or None if the game is not over.
+        """
+        if self.agents_reached_max_score():
+            return COMPLETED
+        if self.hopeless_reason is not None:
+            return self.hopeless_reason
+        if not any(self.playground.agents_alive.values()):
+            return NO_BATTERY
+        return None
+
+    def get_scores(self) -> Dict[int, int]:
+        """
+        Returns the score (number of filled holes) of every team, including the teams that haven't scored.
+        """
+        return {team_id: self.playground.get_team_score(team_id) for team_id in sorted(self.teams.teams)}
+
+    def get_winners(self) -> List[int]:
+        """
+        Returns the teams with the highest score; more than one team if the game is a tie.
         """
-        return self.agents_reached_max_score() or all(
-            agent.battery < 0 for agent in self.get_agents_by_type(agent_type))
+        scores = self.get_scores()
+        best = max(scores.values(), default=0)
+        return [team_id for team_id, score in scores.items() if score == best]
@@ -0,0 +1,304 @@
+"""
+Detection of agents that are stuck, either waiting for each other forever (a deadlock, see
+`Agent.handle_opposite_agent`) or moving back and forth between the same cells (a livelock), and policies to get them
+moving again.
+"""
+import pickle
+import random_seed
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+from consts import AGENT, UP, RIGHT, DOWN, LEFT
+from state_hash import AGENT_MOTION, mix
+from utils import get_new_position
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from controller import Controller
+    from playground import Playground
+
+random = random_seed.RandomSeed().get_random_module()
+
+# resolution policies
+DETOUR = 'detour'
+YIELD = 'yield'
+REASSIGN = 'reassign'
+
+POLICIES = (DETOUR, YIELD, REASSIGN)
+
+_DIRECTIONS = (UP, RIGHT, DOWN, LEFT)
+
+# agents that wait for each other forever don't spend their battery, so a game played without the policy (see
+# `DeadlockDetector.measure_savings`) is cut after this many rounds, or four times the rounds of the game if more
+BASELINE_ROUNDS = 500
+
+
+def motion_key(agent: 'Agent') -> int:
+    """
+    Returns the key of the position, direction and ball of an agent. The battery is left out, so an agent that
+    oscillates between two cells repeats its keys although it spends its battery.
+    """
+    x, y = agent.position
+    return mix(AGENT_MOTION | agent.state_index << 4 | (x & 0xFFFF) << 28 | (y & 0xFFFF) << 44) ^ \
+        (_DIRECTIONS.index(agent.direction) << 1 | int(agent.has_ball))
+
+
+def cycle_period(history: Sequence[int], max_period: int) -> int:
+    """
+    Returns the shortest period of a history of keys, or 0 if it has none up to `max_period`. A period p means that
+    every key equals the key p entries before it, so a history of a single repeated key has period 1.
+    """
+    length = len(history)
+    for period in range(1, min(max_period, length - 1) + 1):
+        if all(history[index] == history[index - period] for index in range(period, length)):
+            return period
+    return 0
+
+
+class DeadlockDetector:
+    """
+    Keeps the keys of the latest `window` rounds of every agent (see `motion_key`) and of the whole game (the items of
+    the grid and the keys of the agents), and finds the agents whose history repeats with a period of at most half the
+    window: a period of 1 is an agent that doesn't move (a deadlock), a longer one an agent that moves in a loop (a
+    livelock). Only agents that can still move are checked, and the cost of a round is O(agents * window^2).
+
+    Each stuck agent is then handled by the policy:
+        DETOUR: the agent steps to a random free cell next to it.
+        YIELD: among the stuck agents next to each other, the one with the most battery keeps its way and the others
+            step aside, to the free cell on their side that is nearest their target; a lone stuck agent steps aside.
+        REASSIGN: stuck agents carrying the same thing swap their targets; an agent without a partner gives up its
+            target, explores and takes a detour.
+
+    The history of a stuck agent starts over after it is detected, so an agent is detected at most once per window.
+    The rounds and the battery that the policy saved are measured by playing the game again without it (see
+    `measure_savings`).
+    """
+
+    def __init__(self, window: int = 8, policy: Optional[str] = REASSIGN):
+        """
+        Args:
+            window: The number of rounds of the histories. Cycles of up to `window // 2` rounds are detected, after
+                    `window` rounds.
+            policy: DETOUR, YIELD, REASSIGN, or None to only count the stuck agents.
+
+        Raises:
+            ValueError: If the window is shorter than 2 rounds or the policy is unknown.
+        """
+        if window < 2:
+            raise ValueError(f"The window must be at least 2 rounds, not {window}")
+        if policy is not None and policy not in POLICIES:
+            raise ValueError(f"Unknown deadlock policy: {policy}")
+        self.window = window
+        self.policy = policy
+        # agent ID -> keys of the latest rounds
+        self._histories: Dict[str, Deque[int]] = {}
+        self._game_history: Deque[int] = deque(maxlen=window)
+        self.stats = {
+            'deadlocks': 0,
+            'livelocks': 0,
+            'game_cycles': 0,
+            'resolved': 0,
+            'unresolved': 0,
+            # measured by measure_savings; None until then
+            'rounds_saved': None,
+            'battery_saved': None,
+            'baseline_cut': None,
+        }
+
+    def check(self, playground: 'Playground', agents: List['Agent']) -> List['Agent']:
+        """
+        Records the state at the end of a round and resolves the agents that are stuck.
+
+        Args:
+            playground: The Playground object of the game.
+            agents: All agents of the game.
+
+        Returns:
+            The stuck agents.
+        """
+        game_key = playground.state_hash.cells
+        stuck = []
+        for agent in agents:
+            history = self._histories.get(agent.agent_id)
+            if history is None:
+                history = self._histories[agent.agent_id] = deque(maxlen=self.window)
+            if agent.battery <= 0:
+                history.clear()
+                continue
+            key = motion_key(agent)
+            game_key ^= key
+            history.append(key)
+            if len(history) == self.window:
+                period = cycle_period(history, self.window // 2)
+                if period:
+                    stuck.append(agent)
+                    self.stats['deadlocks' if period == 1 else 'livelocks'] += 1
+                    history.clear()
+
+        self._game_history.append(game_key)
+        if len(self._game_history) == self.window and cycle_period(self._game_history, self.window // 2):
+            # no agent made progress anywhere
+            self.stats['game_cycles'] += 1
+            self._game_history.clear()
+
+        if stuck and self.policy is not None:
+            self.resolve(stuck, playground)
+        return stuck
+
+    def resolve(self, stuck: List['Agent'], playground: 'Playground') -> None:
+        """
+        Applies the policy to the stuck agents. An agent that is sent on a detour takes its first step in the next
+        round (see `Agent.is_new_road`).
+        """
+        if self.policy == REASSIGN:
+            stuck = self._swap_targets(stuck)
+        for agent in stuck:
+            if self.policy == YIELD:
+                neighbours = [other for other in stuck if other is not agent and
+                              abs(other.position[0] - agent.position[0]) +
+                              abs(other.position[1] - agent.position[1]) == 1]
+                if neighbours and all(_priority(agent) > _priority(other) for other in neighbours):
+                    self.stats['resolved'] += 1
+                    continue
+                direction = self._side_step(agent, playground)
+            else:
+                if self.policy == REASSIGN:
+                    agent.reset_target_position()
+                    agent.target_position = agent.find_random_position(playground)
+                    agent.is_a_random_target = True
+                directions = _free_directions(agent, playground)
+                direction = random.choice(directions) if directions else None
+
+            if direction is None:
+                self.stats['unresolved'] += 1
+                continue
+            agent.direction = direction
+            agent.is_new_road = True
+            self.stats['resolved'] += 1
+
+    def _swap_targets(self, stuck: List['Agent']) -> List['Agent']:
+        # pairs of agents with real targets of the same kind swap them; returns the agents left without a partner
+        left = []
+        waiting: Dict[bool, 'Agent'] = {}
+        for agent in stuck:
+            if agent.target_position is None or agent.is_a_random_target:
+                left.append(agent)
+                continue
+            partner = waiting.pop(agent.has_ball, None)
+            if partner is None:
+                waiting[agent.has_ball] = agent
+                continue
+            targets = agent.target_position, partner.target_position
+            agent.reset_target_position()
+            partner.reset_target_position()
+            for member, target in ((agent, targets[1]), (partner, targets[0])):
+                if member.lock_cell(position=target):
+                    member.target_position = target
+            self.stats['resolved'] += 2
+        return left + list(waiting.values())
+
+    @staticmethod
+    def _side_step(agent: 'Agent', playground: 'Playground') -> Optional[str]:
+        # the free cell across the current direction nearest the target, or any free cell
+        directions = _free_directions(agent, playground)
+        across = [direction for direction in directions
+                  if (direction in (UP, DOWN)) != (agent.direction in (UP, DOWN))]
+        candidates = across or directions
+        if not candidates:
+            return None
+        if agent.target_position is None:
+            return candidates[0]
+        return min(candidates, key=lambda direction: agent.manhattan_distance(
+            get_new_position(direction, agent.position), agent.target_position))
+
+    @staticmethod
+    def snapshot(controller: 'Controller') -> bytes:
+        """
+        Returns a copy of the game and of the state of the random number generator, to measure the savings of the
+        policy once the game is over (see `measure_savings`). Take it before the first round is played.
+        """
+        return pickle.dumps((random_seed.RandomSeed().get_state(), controller), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def measure_savings(self,
+                        snapshot: bytes,
+                        controller: 'Controller',
+                        max_rounds: Optional[int] = None,
+                        perceive: bool = False) -> 'DeadlockDetector':
+        """
+        Plays the game again from a snapshot, with the detector only counting the stuck agents, and records the rounds
+        and the battery that the policy saved compared to it (negative if the policy cost more). The state of the
+        random number generator is restored afterward.
+
+        The game is played again, so this is only meant for games without the chatbot.
+
+        Args:
+            snapshot: The game when it started (see `snapshot`).
+            controller: The controller of the game played with the policy, once it is over.
+            max_rounds: The rounds after which the game without the policy is cut. Default: BASELINE_ROUNDS, or four
+                        times the rounds of the game if more. A game with the policy that was cut before it was over
+                        is compared over the same rounds.
+            perceive: Whether the agents perceive their surroundings before each round, like in the phased game (see
+                      `Controller.perceive_agents`); the game must be played again the way it was played.
+
+        Returns:
+            self: Returns the DeadlockDetector instance.
+        """
+        random_state = random_seed.RandomSeed().get_state()
+        baseline_random_state, baseline = pickle.loads(snapshot)
+        random_seed.RandomSeed().set_state(baseline_random_state)
+        baseline.log_file = None
+        for agent in baseline.agents:
+            agent.log_file = None
+        if baseline.deadlock_detector is not None:
+            baseline.deadlock_detector.policy = None
+        if max_rounds is None:
+            max_rounds = max(BASELINE_ROUNDS, 4 * (controller.round - baseline.round))
+        if not controller.game_over():
+            # the game with the policy was cut too, so both are compared over the same rounds
+            max_rounds = min(max_rounds, controller.round - baseline.round)
+        played = 0
+        while not baseline.game_over() and played < max_rounds:
+            if perceive:
+                baseline.perceive_agents()
+            baseline.next_round(draw=False)
+            played += 1
+        baseline.stop()
+        random_seed.RandomSeed().set_state(random_state)
+
+        self.stats['rounds_saved'] = baseline.round - controller.round
+        self.stats['battery_saved'] = _battery_used(baseline) - _battery_used(controller)
+        self.stats['baseline_cut'] = controller.game_over() and not baseline.game_over()
+        return self
+
+    def report(self) -> str:
+        """
+        Returns a summary of the stuck agents and of their resolution, and the rounds and the battery saved if they
+        were measured (see `measure_savings`).
+        """
+        report = (f"deadlocks: {self.stats['deadlocks']}, livelocks: {self.stats['livelocks']}, "
+                  f"whole game stuck: {self.stats['game_cycles']}, "
+                  f"resolved: {self.stats['resolved']}, unresolved: {self.stats['unresolved']}")
+        if self.stats['rounds_saved'] is not None:
+            # a game that was cut would have lasted longer, so the savings are a lower bound
+            at_least = 'at least ' if self.stats['baseline_cut'] else ''
+            report += (f", rounds saved: {at_least}{self.stats['rounds_saved']}, "
+                       f"battery saved: {at_least}{self.stats['battery_saved']}")
+        return report
+
+
+def _battery_used(controller: 'Controller') -> int:
+    return sum(agent.initial_battery - max(agent.battery, 0) for agent in controller.agents)
+
+
+def _priority(agent: 'Agent') -> tuple:
+    # the agent with more battery keeps its way; ties go to the agent that was put on the board first
+    return agent.battery, -agent.state_index
+
+
+def _free_directions(agent: 'Agent', playground: 'Playground') -> List[str]:
+    directions = []
+    for direction in _DIRECTIONS:
+        position = get_new_position(direction, agent.position)
+        if playground.is_valid_position(position) and AGENT not in playground.get_cell_state(position):
+            directions.append(direction)
+    return directions
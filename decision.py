@@ -0,0 +1,249 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from backends import query_llm
+from consts import UP, RIGHT, DOWN, LEFT
+from memory_map import MemoryMap
+from utils import get_new_position
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from playground import Playground
+
+# the teams may write to the same log file from the threads of the decision phase
+_log_lock = threading.Lock()
+
+_ACTIONS = {'UP': UP, 'RIGHT': RIGHT, 'DOWN': DOWN, 'LEFT': LEFT}
+
+
+def team_label(index: int) -> str:
+    """
+    Returns the short label of the index-th member of a team in a joint prompt (A1, A2, ...).
+    """
+    return f'A{index + 1}'
+
+
+def team_memory_map(agents: List['Agent'], environment: 'Playground') -> MemoryMap:
+    """
+    Returns what the members of a team know together, as a memory map.
+
+    The members share what they learn (see `Team.publish`), but with a radio range or a message bus that delays or
+    drops messages their memories differ, so the map merges them: a cell is known if any member knows it. An item
+    that a member still remembers is shown even if another one saw it go. The map of a single member is its own
+    memory map; a merged map is built from scratch, which costs one pass over the board.
+
+    Args:
+        agents: The members of the team.
+        environment: The Playground object that the agents are in.
+    """
+    if len(agents) == 1:
+        return agents[0].sync_memory_map(environment)
+    return MemoryMap(environment.xAxis, environment.yAxis).sync(
+        set().union(*(agent.visited_cells for agent in agents)),
+        set().union(*(agent.ball_positions for agent in agents)),
+        set().union(*(agent.hole_positions for agent in agents)),
+        set().union(*(agent.filled_hole_positions for agent in agents)),
+        environment.obstacles)
+
+
+def team_prompt(agents: List['Agent'], environment: 'Playground') -> str:
+    """
+    Returns the prompt that asks for the next action of every agent of a team at once.
+
+    The map is what the members know together (see `team_memory_map`), with every member laid over it by its short
+    label (see `team_label`). It is sent once, instead of once per member.
+
+    Args:
+        agents: The members of the team that should decide.
+        environment: The Playground object that the agents are in.
+    """
+    memory_map = team_memory_map(agents, environment)
+    overlay = memory_map.overlay([(agent.position, team_label(index)) for index, agent in enumerate(agents)])
+    members = '\n'.join(f'    {team_label(index)}: position (x={agent.position[0]}, y={agent.position[1]}), '
+                        f'{"carries a ball, looking for a hole" if agent.has_ball else "looking for a ball"}'
+                        for index, agent in enumerate(agents))
+    example = ', '.join(f'"{team_label(index)}": "<action>"' for index in range(len(agents)))
+    return f"""
+We are a team of {len(agents)} agents in a game where the objective is to find balls, pick them up, and place them into holes. The field of view of each agent is limited to the cells surrounding it. An agent can only carry one ball at a time.
+In order to pick up a ball, an agent has to enter the cell (house) where the ball is located. And also, to put the ball in a hole, it has to enter the hole house.
+Here are the possible states for each cell in the game:
+    1. `empty`: The cell is empty.
+    2. `hole`: The cell contains a hole.
+    3. `ball`: The cell contains a ball.
+    4. `filled_hole`: The cell contains a filled hole.
+    5. `obstacle`: The cell contains an obstacle. No agent can enter it.
+    6. `A1`, `A2`, ...: The cell contains the agent of our team with this label.
+    7. `-`: There is no information about the cell.
+
+This is the current state of the game map (size {environment.yAxis}*{environment.xAxis}) as we remember it:
+{memory_map.text(overlay)}
+
+These are the agents of our team:
+{members}
+
+Each agent can perform 4 actions: [UP, LEFT, DOWN, RIGHT].
+What is the best action for each agent to take to find the nearest hole if it carries a ball, or the nearest ball otherwise? Two agents should not go after the same ball or hole.
+
+Please provide your answer as a single JSON object with one action per agent, and nothing else:
+{{{example}}}
+        """
+
+
+def parse_team_answer(answer: str, count: int) -> Dict[int, str]:
+    """
+    Reads the actions of a joint answer (see `team_prompt`).
+
+    Args:
+        answer: The answer of the chatbot. The JSON object may be surrounded by text.
+        count: The number of agents of the prompt.
+
+    Returns:
+        The index of each agent with a valid action -> its direction (UP, RIGHT, DOWN, LEFT). Agents with a missing or
+        invalid action are left out.
+    """
+    start, end = answer.find('{'), answer.rfind('}')
+    if start == -1 or end < start:
+        return {}
+    try:
+        actions = json.loads(answer[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(actions, dict):
+        return {}
+    directions = {}
+    for index in range(count):
+        action = actions.get(team_label(index))
+        if isinstance(action, str) and action.strip().upper() in _ACTIONS:
+            directions[index] = _ACTIONS[action.strip().upper()]
+    return directions
+
+
+def plan_team_targets(agents: List['Agent'], environment: 'Playground') -> List[Optional[Tuple[int, int]]]:
+    """
+    Asks the chatbot for the next cell of every agent of a team with a single query.
+
+    Like `Agent.plan_target`, this only reads the environment and the memory of the agents, so the teams can be
+    planned at the same time. The query is counted as a chatbot call of the first agent.
+
+    Args:
+        agents: The members of the team that should decide.
+        environment: The Playground object that the agents are in.
+
+    Returns:
+        The suggested position of each agent, in the same order as `agents`, or None for an agent whose action was
+        missing or invalid, or would leave the board.
+
+    Raises:
+        ValueError: If the chatbot failed more than 3 times in a row or the program was interrupted.
+    """
+    prompt = team_prompt(agents, environment)
+    error_counter = 0
+    while True:
+        error_counter += 1
+        try:
+            agents[0].llm_calls += 1
+            answer = query_llm(prompt)
+            break
+        except KeyboardInterrupt:
+            raise ValueError("Program interrupted by user.")
+        except Exception as e:
+            if error_counter > 3:
+                raise ValueError(e)
+
+    directions = parse_team_answer(answer, len(agents))
+    targets: List[Optional[Tuple[int, int]]] = []
+    for index, agent in enumerate(agents):
+        target = get_new_position(directions[index], agent.position) if index in directions else None
+        targets.append(target if target is not None and environment.is_valid_position(target) else None)
+
+    if agents[0].log_file:
+        with _log_lock, open(agents[0].log_file, 'a') as f:
+            print(prompt, file=f)
+            print(f'answer: {answer} new positions: {targets}', file=f)
+            print('=' * 70, file=f)
+    return targets
+
+
+class DecisionExecutor:
+    """
+    Runs the decision phase of a round for a group of agents.
+
+    Every agent plans its target from the same snapshot (the state at the start of the round), so the decisions
+    don't depend on each other and can be made in any order, and the results are always returned in the order of the
+    given agents. The chatbot is queried through a session of each worker that answers every prompt in a new
+    conversation (see `backends.query_llm`), so the queries run at the same time. With `greedy`, the agents that don't
+    use the LLM plan their nearest target in the same way (see `Agent.plan_nearest_target`), and take it in their
+    action if it is still free. A parallel round is therefore the same as a serial one (one worker, which is also
+    what the controller uses when it has no executor, see `Controller.plan_targets`). The threads of the workers only
+    run the greedy planning on several cores at once on a free-threaded build of Python; otherwise, they mainly overlap
+    the queries of the chatbot.
+
+    In joint mode, the members of a team decide together: one prompt holds the map and the state of all of them, and
+    the chatbot answers with the action of each (see `plan_team_targets`), so a team costs one query per round
+    instead of one per member. An agent whose action is missing or invalid falls back to a query of its own.
+    """
+
+    def __init__(self, workers: int = 1, joint: bool = False, greedy: bool = False):
+        """
+        Args:
+            workers: Number of threads used to plan the agents' targets. With 1 worker the decisions are computed serially.
+            joint: If True, the members of a team are planned together with a single query.
+            greedy: If True, the agents that don't use the LLM also plan their nearest target in the decision phase,
+                    instead of in their action.
+        """
+        self.workers = max(1, workers)
+        self.joint = joint
+        self.greedy = greedy
+        self._pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    def decide(self, agents: List['Agent'], environment: 'Playground') -> List[Optional[Tuple[int, int]]]:
+        """
+        Plans the target of each agent.
+
+        Args:
+            agents: The agents that should make a decision in this round.
+            environment: The Playground object that the agents are in. It must not be modified while deciding.
+
+        Returns:
+            A list with the planned target of each agent, in the same order as `agents`.
+        """
+        greedy = [agent for agent in agents if not agent.useLLM]
+        targets: Dict[str, Optional[Tuple[int, int]]] = dict(zip(
+            (agent.agent_id for agent in greedy), self._map(lambda agent: agent.plan_nearest_target(), greedy)))
+        planners = [agent for agent in agents if agent.useLLM]
+        if not self.joint:
+            for agent, target in zip(planners, self._map(lambda agent: agent.plan_target(environment), planners)):
+                targets[agent.agent_id] = target
+            return [targets[agent.agent_id] for agent in agents]
+
+        groups: Dict[int, List['Agent']] = {}
+        for agent in planners:
+            if agent.team is not None:
+                groups.setdefault(agent.team.team_id, []).append(agent)
+        for members, member_targets in zip(groups.values(),
+                                           self._map(lambda members: plan_team_targets(members, environment),
+                                                     list(groups.values()))):
+            for agent, target in zip(members, member_targets):
+                targets[agent.agent_id] = target
+
+        # agents without a team decide alone, like the members whose action was missing or invalid
+        fallback = [agent for agent in planners if targets.get(agent.agent_id) is None]
+        for agent, target in zip(fallback, self._map(lambda agent: agent.plan_target(environment), fallback)):
+            targets[agent.agent_id] = target
+        return [targets[agent.agent_id] for agent in agents]
+
+    def _map(self, function, items: list) -> list:
+        # the results in the order of the items, computed by the worker threads if there are any
+        if self._pool is None:
+            return [function(item) for item in items]
+        return list(self._pool.map(function, items))
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker threads.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
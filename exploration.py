@@ -0,0 +1,91 @@
+from typing import Iterable, Optional, Set, Tuple
+
+Position = Tuple[int, int]
+
+RANDOM = 'random'
+NEAREST = 'nearest'
+GAIN = 'gain'
+
+STRATEGIES = (RANDOM, NEAREST, GAIN)
+
+
+class Frontier:
+    """
+    Keeps the frontier of an agent's knowledge: the unvisited cells next to a visited cell. It is updated with each
+    batch of newly visited cells, so finding an exploration target doesn't scan the whole board.
+
+    Cells beyond the right and bottom edges may be in the frontier, because the agent doesn't know the size of the
+    board; the queries skip them.
+    """
+
+    def __init__(self):
+        self.cells: Set[Position] = set()
+
+    def update(self, new_cells: Iterable[Position], visited_cells: Set[Position]) -> None:
+        """
+        Updates the frontier with cells that were just added to the visited cells.
+
+        Args:
+            new_cells: The cells that were not visited before.
+            visited_cells: All visited cells, including the new ones.
+        """
+        for x, y in new_cells:
+            self.cells.discard((x, y))
+            for neighbour in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if neighbour[0] >= 0 and neighbour[1] >= 0 and neighbour not in visited_cells:
+                    self.cells.add(neighbour)
+
+    def nearest(self, position: Position, x_axis: int, y_axis: int) -> Optional[Position]:
+        """
+        Returns the frontier cell nearest to a position, or None if the frontier is empty.
+
+        Args:
+            position: The position of the agent.
+            x_axis: The width of the board.
+            y_axis: The height of the board.
+        """
+        best, best_key = None, None
+        for cell in self.cells:
+            if cell[0] >= x_axis or cell[1] >= y_axis:
+                continue
+            # ties are broken by the cell itself, so the choice doesn't depend on the layout of the set
+            key = (abs(cell[0] - position[0]) + abs(cell[1] - position[1]), cell)
+            if best_key is None or key < best_key:
+                best, best_key = cell, key
+        return best
+
+    def best_gain(self,
+                  position: Position,
+                  visited_cells: Set[Position],
+                  field_of_view: int,
+                  x_axis: int,
+                  y_axis: int) -> Optional[Position]:
+        """
+        Returns the frontier cell with the largest information gain per step: the number of unvisited cells the agent
+        would see from it, divided by one plus its distance. Returns None if the frontier is empty.
+
+        Args:
+            position: The position of the agent.
+            visited_cells: The cells the agent has visited.
+            field_of_view: The field of view of the agent.
+            x_axis: The width of the board.
+            y_axis: The height of the board.
+        """
+        half = field_of_view // 2
+        max_gain = field_of_view * field_of_view
+        candidates = sorted((abs(cell[0] - position[0]) + abs(cell[1] - position[1]), cell)
+                            for cell in self.cells if cell[0] < x_axis and cell[1] < y_axis)
+        best, best_key = None, None
+        for distance, cell in candidates:
+            # the candidates are sorted by distance, so no farther cell can beat the best one
+            if best_key is not None and -max_gain / (1 + distance) > best_key[0]:
+                break
+            x, y = cell
+            gain = sum(1
+                       for i in range(max(0, x - half), min(x_axis, x + half + 1))
+                       for j in range(max(0, y - half), min(y_axis, y + half + 1))
+                       if (i, j) not in visited_cells)
+            key = (-gain / (1 + distance), distance, cell)
+            if best_key is None or key < best_key:
+                best, best_key = cell, key
+        return best
@@ -0,0 +1,285 @@
+"""
+Early termination of games that can no longer be won: a game ends with success when as many holes as possible are
+filled (see `Controller.get_max_score`), and `FeasibilityChecker` proves, round by round, when that can't happen anymore.
+"""
+from collections import deque
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from consts import HOLE
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from playground import Playground
+
+Position = Tuple[int, int]
+
+# the reasons why a game ended
+COMPLETED = 'completed'
+NO_BATTERY = 'no_battery'
+NOT_ENOUGH_ITEMS = 'not_enough_items'
+UNREACHABLE_ITEMS = 'unreachable_items'
+NOT_ENOUGH_BATTERY = 'not_enough_battery'
+
+UNREACHABLE = -1
+
+
+class FeasibilityChecker:
+    """
+    Proves that the remaining holes can't be filled, with bounds that hold whatever the agents do:
+
+        NOT_ENOUGH_ITEMS: the filled holes plus the balls left (on the board or carried by an agent that can still
+            act) or the holes of the board are fewer than the max score. A stolen ball leaves a hole and comes back to
+            the board, so the sums never grow.
+        UNREACHABLE_ITEMS: the obstacles split the board into areas that neither agents nor balls can leave, and the
+            holes that can still be filled in each area (the fewer of its balls and of its empty holes) are too few.
+            This bound is only used while no agent can steal a ball, because a stolen ball is thrown anywhere.
+        NOT_ENOUGH_BATTERY: no agent has the battery to fill a hole (the steps to a ball and from it to the nearest
+            empty hole) or to steal a ball. Balls only move when a hole is filled or a ball is stolen, so nothing
+            will ever change again.
+
+    The distances are shortest paths around the obstacles and the agents that ran out of battery, which never move
+    again; agents that can still move are ignored, so every distance is a lower bound. On a board without obstacles
+    or blocked cells they are Manhattan distances, computed without a search. Everything that depends on the
+    items of the board is kept until they change (see `StateHash.cells`) or an agent runs out of battery, and the
+    distances to the nearest empty hole until a hole is filled or emptied. The agent that could reach a target is
+    checked first in the next round, so a game that is far from hopeless costs a few lookups per round.
+    """
+
+    def __init__(self):
+        # the items of the board and the number of agents out of battery that the cached values below are valid for
+        self._key: Optional[Tuple[int, int]] = None
+        self._blocked: FrozenSet[Position] = frozenset()
+        self._empty_holes: List[Position] = []
+        # whether nothing stands in the way of the agents, so that the distances are Manhattan distances
+        self._open = True
+        # the distance of every cell to the nearest empty hole, and the empty holes and blocked cells it is for
+        self._hole_distances: List[int] = []
+        self._hole_distances_key: Optional[Tuple[FrozenSet[Position], FrozenSet[Position]]] = None
+        # the fewest steps from every cell to a ball and from it to an empty hole, or on an open board the steps from
+        # every ball to the nearest empty hole
+        self._fill_costs: Optional[List[int]] = None
+        self._ball_costs: Optional[List[Tuple[int, int, int]]] = None
+        # the holes that the agents of a team (or an agent without a team) would steal the ball of, and the distance
+        # of every cell to the nearest of them
+        self._stealable: Dict[object, Set[Position]] = {}
+        self._steal_distances: Dict[object, List[int]] = {}
+        self._unreachable: Optional[bool] = None
+        # the passable neighbours and the area of every cell (see UNREACHABLE_ITEMS), computed once since the
+        # obstacles never change
+        self._adjacency: Optional[List[List[int]]] = None
+        self._areas: Optional[List[int]] = None
+        # the agent that could reach a target in the latest round
+        self._witness: Optional[str] = None
+
+    def check(self, playground: 'Playground', agents: List['Agent'], max_score: int) -> Optional[str]:
+        """
+        Checks whether the game can still be won.
+
+        Args:
+            playground: The Playground object of the game.
+            agents: All agents of the game.
+            max_score: The number of holes to fill.
+
+        Returns:
+            None if the game can still be won, or the reason why it can't: NOT_ENOUGH_ITEMS, UNREACHABLE_ITEMS or
+            NOT_ENOUGH_BATTERY.
+        """
+        if playground.filled_holes >= max_score:
+            return None
+        # an agent with no battery left still interacts with its cell once (see `Agent.action`)
+        active = [agent for agent in agents if agent.battery >= 0]
+        carried = sum(1 for agent in active if agent.has_ball)
+        if playground.filled_holes + playground.balls_remaining + carried < max_score or \
+                len(playground.holes) < max_score:
+            return NOT_ENOUGH_ITEMS
+
+        key = (playground.state_hash.cells, len(agents) - len(active))
+        if key != self._key:
+            self._update(playground, agents)
+            self._key = key
+
+        if playground.obstacles:
+            if self._unreachable is None:
+                self._unreachable = not any(self._stealable_holes(playground, agent) for agent in active) and \
+                    playground.filled_holes + self._fillable_holes(playground, active) < max_score
+            if self._unreachable:
+                return UNREACHABLE_ITEMS
+
+        # the agent that could act in the latest round is the most likely to still be able to
+        active.sort(key=lambda agent: agent.agent_id != self._witness)
+        for agent in active:
+            if self._can_fill(playground, agent) or self._can_steal(playground, agent):
+                self._witness = agent.agent_id
+                return None
+        return NOT_ENOUGH_BATTERY
+
+    def _update(self, playground: 'Playground', agents: List['Agent']) -> None:
+        # the items changed or an agent ran out of battery
+        self._blocked = frozenset(agent.position for agent in agents if agent.battery < 0)
+        self._empty_holes = [position for position in playground.holes
+                             if HOLE in playground.get_cell_state(position)]
+        self._open = not playground.obstacles and not self._blocked
+        self._fill_costs = None
+        self._ball_costs = None
+        self._stealable = {}
+        self._steal_distances = {}
+        self._unreachable = None
+        if self._open:
+            return
+        hole_distances_key = (frozenset(self._empty_holes), self._blocked)
+        if hole_distances_key != self._hole_distances_key:
+            self._hole_distances = self._distances(playground, {position: 0 for position in self._empty_holes})
+            self._hole_distances_key = hole_distances_key
+
+    def _can_fill(self, playground: 'Playground', agent: 'Agent') -> bool:
+        # whether the agent has the battery to bring a ball to an empty hole
+        x_axis = playground.xAxis
+        x, y = agent.position
+        battery = agent.battery
+        if self._open:
+            if agent.has_ball:
+                return any(abs(x - hole_x) + abs(y - hole_y) <= battery for hole_x, hole_y in self._empty_holes)
+            if self._ball_costs is None:
+                self._ball_costs = [(ball_x, ball_y, min(abs(ball_x - hole_x) + abs(ball_y - hole_y)
+                                                         for hole_x, hole_y in self._empty_holes))
+                                    for ball_x, ball_y in playground.ball_positions] if self._empty_holes else []
+            return any(abs(x - ball_x) + abs(y - ball_y) + to_hole <= battery
+                       for ball_x, ball_y, to_hole in self._ball_costs)
+
+        if agent.has_ball:
+            distance = self._hole_distances[y * x_axis + x]
+            return distance != UNREACHABLE and distance <= battery
+
+        if self._fill_costs is None:
+            sources = {}
+            for ball_x, ball_y in playground.ball_positions:
+                to_hole = self._hole_distances[ball_y * x_axis + ball_x]
+                if to_hole != UNREACHABLE:
+                    sources[(ball_x, ball_y)] = to_hole
+            self._fill_costs = self._distances(playground, sources)
+        cost = self._fill_costs[y * x_axis + x]
+        return cost != UNREACHABLE and cost <= battery
+
+    def _can_steal(self, playground: 'Playground', agent: 'Agent') -> bool:
+        # whether the agent has the battery to reach a hole filled by another team (see `Agent.steal_ball_from_hole`)
+        holes = self._stealable_holes(playground, agent)
+        if not holes:
+            return False
+        x, y = agent.position
+        if self._open:
+            return any(abs(x - hole_x) + abs(y - hole_y) <= agent.battery for hole_x, hole_y in holes)
+        team = _team(agent)
+        distances = self._steal_distances.get(team)
+        if distances is None:
+            distances = self._steal_distances[team] = self._distances(playground,
+                                                                      {position: 0 for position in holes})
+        distance = distances[y * playground.xAxis + x]
+        return distance != UNREACHABLE and distance <= agent.battery
+
+    def _stealable_holes(self, playground: 'Playground', agent: 'Agent') -> Set[Position]:
+        # the filled holes the agent would steal the ball of
+        team = _team(agent)
+        holes = self._stealable.get(team)
+        if holes is None:
+            friends = agent.team.member_ids if agent.team is not None else {agent.agent_id}
+            empty_holes = set(self._empty_holes)
+            holes = self._stealable[team] = {position for position, filler in playground.holes.items()
+                                             if filler not in friends and position not in empty_holes}
+        return holes
+
+    def _distances(self, playground: 'Playground', sources: Dict[Position, int]) -> List[int]:
+        # the fewest steps from every cell to a source plus the cost of the source, around the obstacles and the
+        # blocked cells (UNREACHABLE for the cells that reach no source); the costs are small integers, so the cells
+        # are visited level by level instead of through a heap
+        x_axis = playground.xAxis
+        if self._adjacency is None:
+            self._adjacency = _adjacency(playground)
+        adjacency = self._adjacency
+        blocked = {y * x_axis + x for x, y in self._blocked}
+        distances = [UNREACHABLE] * (x_axis * playground.yAxis)
+        # no agent can enter a blocked cell, so a ball or a hole in it is of no use
+        pending = sorted(((cost, y * x_axis + x) for (x, y), cost in sources.items() if (x, y) not in self._blocked),
+                         reverse=True)
+        level: List[int] = []
+        distance = pending[-1][0] if pending else 0
+        while level or pending:
+            if not level:
+                distance = pending[-1][0]
+            while pending and pending[-1][0] <= distance:
+                level.append(pending.pop()[1])
+            next_level = []
+            for index in level:
+                if distances[index] != UNREACHABLE:
+                    continue
+                distances[index] = distance
+                for neighbour in adjacency[index]:
+                    if distances[neighbour] == UNREACHABLE and neighbour not in blocked:
+                        next_level.append(neighbour)
+            level = next_level
+            distance += 1
+        return distances
+
+    def _fillable_holes(self, playground: 'Playground', agents: List['Agent']) -> int:
+        # the most holes that can still be filled, area by area
+        if self._areas is None:
+            self._areas = _areas(playground)
+        x_axis = playground.xAxis
+        balls: Dict[int, int] = {}
+        holes: Dict[int, int] = {}
+        for x, y in playground.ball_positions:
+            area = self._areas[y * x_axis + x]
+            balls[area] = balls.get(area, 0) + 1
+        for agent in agents:
+            if agent.has_ball:
+                area = self._areas[agent.position[1] * x_axis + agent.position[0]]
+                balls[area] = balls.get(area, 0) + 1
+        for x, y in self._empty_holes:
+            area = self._areas[y * x_axis + x]
+            holes[area] = holes.get(area, 0) + 1
+        return sum(min(count, holes.get(area, 0)) for area, count in balls.items())
+
+
+def _team(agent: 'Agent') -> object:
+    # agents of the same team steal the same balls
+    return agent.type if agent.team is not None else agent.agent_id
+
+
+def _neighbours(index: int, x_axis: int, y_axis: int):
+    x, y = index % x_axis, index // x_axis
+    if y > 0:
+        yield index - x_axis
+    if x < x_axis - 1:
+        yield index + 1
+    if y < y_axis - 1:
+        yield index + x_axis
+    if x > 0:
+        yield index - 1
+
+
+def _adjacency(playground: 'Playground') -> List[List[int]]:
+    # the passable neighbours of every cell
+    x_axis, y_axis = playground.xAxis, playground.yAxis
+    passable = playground.passable
+    return [[neighbour for neighbour in _neighbours(index, x_axis, y_axis) if passable[neighbour]]
+            for index in range(x_axis * y_axis)]
+
+
+def _areas(playground: 'Playground') -> List[int]:
+    # the connected area of every cell, separated by the obstacles (UNREACHABLE for an obstacle)
+    x_axis, y_axis = playground.xAxis, playground.yAxis
+    passable = playground.passable
+    areas = [UNREACHABLE] * (x_axis * y_axis)
+    area = 0
+    for start in range(x_axis * y_axis):
+        if areas[start] != UNREACHABLE or not passable[start]:
+            continue
+        areas[start] = area
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            for neighbour in _neighbours(index, x_axis, y_axis):
+                if areas[neighbour] == UNREACHABLE and passable[neighbour]:
+                    areas[neighbour] = area
+                    queue.append(neighbour)
+        area += 1
+    return areas
@@ -0,0 +1,82 @@
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+
+class IndexedSet(Generic[T]):
+    """
+    A set that also keeps its items in an array, so that an item can be picked by index (for example with
+    `random.choice`) in O(1).
+
+    Items are removed by moving the last item of the array into the freed slot (swap-remove), so adding, removing and
+    checking membership are all O(1). The order of the items depends only on the order of the operations, which keeps
+    random choices reproducible for a given seed.
+    """
+
+    def __init__(self, items: Iterable[T] = ()):
+        self._items: List[T] = []
+        self._index: Dict[T, int] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: T) -> bool:
+        """
+        Adds an item to the set.
+
+        Args:
+            item: The item to add.
+
+        Returns:
+            True if the item was added, False if it was already in the set.
+        """
+        if item in self._index:
+            return False
+        self._index[item] = len(self._items)
+        self._items.append(item)
+        return True
+
+    def remove(self, item: T) -> None:
+        """
+        Removes an item from the set.
+
+        Args:
+            item: The item to remove.
+
+        Raises:
+            KeyError: If the item is not in the set.
+        """
+        index = self._index.pop(item)
+        last_item = self._items.pop()
+        if index < len(self._items):
+            self._items[index] = last_item
+            self._index[last_item] = index
+
+    def discard(self, item: T) -> bool:
+        """
+        Removes an item from the set if it is present.
+
+        Args:
+            item: The item to remove.
+
+        Returns:
+            True if the item was removed, False if it was not in the set.
+        """
+        if item not in self._index:
+            return False
+        self.remove(item)
+        return True
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._index
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> T:
+        return self._items[index]
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def __repr__(self) -> str:
+        return f'IndexedSet({self._items!r})'
@@ -1,11 +1,22 @@
 import argparse
 import os
+import sys
 
 from random_seed import RandomSeed
-from chatbot import Chatbot
+from backends import LLM, DEFAULT_LLM_BACKEND, load_backend
 
+from allocation import TaskAllocator, STRATEGIES
+from checkpoint import Checkpointer
 from controller import Controller
+from deadlock import DeadlockDetector, POLICIES as DEADLOCK_POLICIES
+from decision import DecisionExecutor
+from feasibility import FeasibilityChecker
+from exploration import STRATEGIES as EXPLORATION_STRATEGIES, RANDOM as RANDOM_EXPLORATION
+from message_bus import MessageBus
 from playground import Playground
+from replay import ReplayWriter, ReplayReader
+from scenario import Scenario
+from state_hash import HashLog
 from utils import get_key_action
 from bcolors import GREEN_HIGHLIGHT, ENDC, RED_HIGHLIGHT
 
@@ -28,9 +39,11 @@ def v1(show_legends, show_info):
         input()
     while not controller.game_over():
         controller.perceive_agents().next_round().plot(legends=show_legends, info=show_info)
+        log_round()
         if not args.chatbot:
             print("\nPress [⏎]/[Enter] for next step")
             input()
+    controller.stop()
 
     success_message = GREEN_HIGHLIGHT + "Agent completed the task successfully" + ENDC
     failure_message = RED_HIGHLIGHT + "Agent failed the task successfully" + ENDC
@@ -38,11 +51,43 @@ def v1(show_legends, show_info):
         print(success_message)
     else:
         print(failure_message)
+    print_scores()
+
+
+def log_round():
+    # the metrics of the round, kept only if the game is recorded (see record_game)
+    if args.db:
+        from results import round_metrics
+        round_log.append(round_metrics(controller))
+
+
+def record_game(path: str):
+    # imported only when the game is recorded, so a run without -db doesn't load sqlite3
+    from results import ResultStore, game_result
+
+    # a scenario or a checkpoint sets its own battery
+    battery = controller.agents[0].initial_battery if controller.agents else args.battery
+    config = {'dim': args.dim, 'ball': args.ball, 'hole': args.hole, 'battery': battery, 'fov': args.fov,
+              'agents': len(controller.agents), 'teams': args.teams, 'chatbot': args.chatbot,
+              'exploration': args.exploration, 'allocation': args.allocation, 'obstacle': args.obstacle,
+              'scenario': args.scenario, 'deadlock': args.deadlock, 'early_stop': args.early_stop,
+              'joint_prompt': args.joint_prompt}
+    with ResultStore(path) as store:
+        store.add_run(config, RandomSeed().get_seed(), game_result(controller), round_log)
+
+
+def print_scores():
+    scores = controller.get_scores()
+    if len(scores) < 2:
+        return
+    winners = controller.get_winners()
+    print('\n'.join(f"Team {team_id}: {score}" + (' (winner)' if team_id in winners else '')
+                    for team_id, score in scores.items()))
 
 
 def v2(show_legends: bool, show_info: bool):
-    while not controller.game_over():
-        controller.next_round()
+    for _ in controller.run(draw=True):
+        log_round()
 
     # Display the results
     controller.draw_current(legends=show_legends, info=show_info)
@@ -57,6 +102,30 @@ def v2(show_legends: bool, show_info: bool):
         if action == 'previous':
             controller.draw_previous(legends=show_legends, info=show_info)
             print_guid(controller.is_last_draw_index())
+    print_scores()
+
+
+def view_replay(path: str, show_legends: bool, show_info: bool):
+    reader = ReplayReader(path)
+    if reader.seed:
+        RandomSeed().set_seed(int(reader.seed))
+
+    index = 0
+    reader.read_draw(index).plot(legends=show_legends, info=show_info)
+    print_guid(index == len(reader) - 1)
+    while True:
+        action = get_key_action()
+        if action == 'enter' and index == len(reader) - 1:
+            break
+        if action == 'next':
+            index = min(index + 1, len(reader) - 1)
+        elif action == 'previous':
+            index = max(index - 1, 0)
+        else:
+            continue
+        reader.read_draw(index).plot(legends=show_legends, info=show_info)
+        print_guid(index == len(reader) - 1)
+    reader.close()
 
 
 def parse_arguments():
@@ -64,8 +133,16 @@ def parse_arguments():
     parser.add_argument('-dim', type=str, default='5,5', help='Dimensions of the playground (default: 5,5)')
     parser.add_argument('-ball', type=int, default=3, help='Number of balls in the playground (default: 3)')
     parser.add_argument('-hole', type=int, default=3, help='Number of holes in the playground (default: 3)')
+    parser.add_argument('-obstacle', type=int, default=0, help='Number of obstacles in the playground (default: 0)')
+    parser.add_argument('-battery', type=int, default=30, help='Initial battery level of the agents (default: 30)')
+    parser.add_argument('-fov', type=int, default=3, help='Field of view of the agents, an odd number (default: 3)')
     parser.add_argument('-legends', action='store_true', help='Show legends (default: False)')
     parser.add_argument('-info', action='store_true', help='Show Agents\' info (default: False)')
+    parser.add_argument('-teams',
+                        type=int,
+                        default=1,
+                        help='Number of teams; each team gets at least one agent, and the team with the most filled holes '
+                             'wins (default: 1)')
     parser.add_argument('-agents',
                         type=str,
                         help='Agents\' positions and types (default: None). format:<x,y,type;x,y,type;...>.example: 0,0,1;6,4,2')
@@ -80,6 +157,114 @@ def parse_arguments():
     parser.add_argument('-password', type=str, default=None, help='Password for the chatbot (default: None)')
     parser.add_argument('-use-env-var', dest='envar', default=False, action='store_true',
                         help='Use environment variable for login(default: False)')
+    parser.add_argument('-workers',
+                        type=int,
+                        default=None,
+                        help='Number of threads that plan the agents\' targets in parallel. With this option, all agents '
+                             'decide from the state at the start of each round, so the game is the same whatever the '
+                             'number of workers (default: None)')
+    parser.add_argument('-joint-prompt',
+                        dest='joint_prompt',
+                        default=False,
+                        action='store_true',
+                        help='Ask the chatbot for the actions of all the agents of a team with a single query per round, '
+                             'instead of one query per agent (default: False)')
+    parser.add_argument('-fast-drift',
+                        dest='fast_drift',
+                        default=False,
+                        action='store_true',
+                        help='Draw only the balls that move after a hole is filled, instead of a random number per ball '
+                             '(default: False)')
+    parser.add_argument('-replay', type=str, default=None, help='Write the rounds to this replay file (default: None)')
+    parser.add_argument('-view-replay',
+                        dest='view_replay',
+                        type=str,
+                        default=None,
+                        help='Show the rounds of a replay file instead of running a game (default: None)')
+    parser.add_argument('-radio-range',
+                        dest='radio_range',
+                        type=int,
+                        default=None,
+                        help='Only friends within this Manhattan distance receive the information of an agent '
+                             '(default: None, no limit)')
+    parser.add_argument('-message-bus',
+                        dest='message_bus',
+                        default=False,
+                        action='store_true',
+                        help='Deliver the information agents send to their friends once per round, merged, instead of '
+                             'immediately (default: False)')
+    parser.add_argument('-message-delay',
+                        dest='message_delay',
+                        type=int,
+                        default=0,
+                        help='Number of rounds before a message of the message bus is delivered (default: 0)')
+    parser.add_argument('-message-drop',
+                        dest='message_drop',
+                        type=float,
+                        default=0.0,
+                        help='Probability that a message of the message bus is lost (default: 0.0)')
+    parser.add_argument('-allocation',
+                        type=str,
+                        default=None,
+                        choices=list(STRATEGIES),
+                        help='Assign the balls and holes to the agents of a team once per round with this strategy, '
+                             'instead of letting each agent pick its nearest target (default: None)')
+    parser.add_argument('-exploration',
+                        type=str,
+                        default=RANDOM_EXPLORATION,
+                        choices=list(EXPLORATION_STRATEGIES),
+                        help='How an agent without a target picks a cell to explore: a random unvisited cell, the '
+                             'nearest cell of its frontier, or the frontier cell with the largest information gain '
+                             '(default: random)')
+    parser.add_argument('-scenario',
+                        type=str,
+                        default=None,
+                        help='Read the board, the agents and the items from this JSON or TOML scenario file instead of '
+                             '-dim, -agents, -ball and -hole (default: None)')
+    parser.add_argument('-db',
+                        type=str,
+                        default=None,
+                        help='Record the outcome and the per-round metrics of the game in this results database '
+                             '(default: None)')
+    parser.add_argument('-live',
+                        type=int,
+                        default=None,
+                        help='Stream the game to a browser viewer served on this local port (default: None)')
+    parser.add_argument('-hash-log',
+                        dest='hash_log',
+                        type=str,
+                        default=None,
+                        help='Write the hash of the game state after every round to this file; compare two runs with '
+                             'python state_hash.py (default: None)')
+    parser.add_argument('-deadlock',
+                        type=str,
+                        default=None,
+                        choices=list(DEADLOCK_POLICIES),
+                        help='Detect the agents that wait for each other or move in a loop, and get them moving with '
+                             'this policy: a random detour, a yield to the agent with more battery, or swapped targets '
+                             '(default: None)')
+    parser.add_argument('-deadlock-window',
+                        dest='deadlock_window',
+                        type=int,
+                        default=8,
+                        help='Number of rounds an agent must repeat itself to be considered stuck (default: 8)')
+    parser.add_argument('-early-stop',
+                        dest='early_stop',
+                        default=False,
+                        action='store_true',
+                        help='End the game as soon as the remaining holes provably can\'t be filled anymore: too few '
+                             'balls or holes, out of reach, or not enough battery left (default: False)')
+    parser.add_argument('-checkpoint', type=str, default=None, help='Save the game to this checkpoint file (default: None)')
+    parser.add_argument('-checkpoint-every',
+                        dest='checkpoint_every',
+                        type=int,
+                        default=10,
+                        help='Number of rounds between two checkpoints (default: 10)')
+    parser.add_argument('-restore',
+                        type=str,
+                        default=None,
+                        help='Resume the game saved in this checkpoint file. The game parameters and the seed are taken '
+                             'from the checkpoint (default: None)')
     parser.add_argument('-seed',
                         type=int,
                         default=None,
@@ -88,12 +273,58 @@ def parse_arguments():
 
 
 def initialize_playground_and_controller(args):
-    RandomSeed().set_seed(args.seed)
+    decision_executor = DecisionExecutor(workers=args.workers or 1, joint=args.joint_prompt,
+                                         greedy=args.workers is not None) \
+        if args.workers is not None or args.joint_prompt else None
+    replay_writer = ReplayWriter(args.replay) if args.replay else None
+    checkpointer = Checkpointer(args.checkpoint, interval=args.checkpoint_every) if args.checkpoint else None
+    viewer = None
+    if args.live is not None:
+        # imported only for -live, so a headless run doesn't load http.server
+        from viewer import LiveViewer
+        viewer = LiveViewer(port=args.live)
+    hash_log = HashLog(args.hash_log) if args.hash_log else None
+
+    if args.restore:
+        controller = Checkpointer.load(args.restore)
+        controller.decision_executor = decision_executor
+        controller.replay_writer = replay_writer
+        controller.checkpointer = checkpointer
+        controller.viewer = viewer
+        controller.hash_log = hash_log
+        controller.resume()
+        return controller
 
-    dim_x, dim_y = map(int, args.dim.split(','))
-    playground = Playground(dimensions=(dim_x, dim_y), num_balls=args.ball, num_holes=args.hole)
-    controller = Controller(playground=playground, log_file=args.log)
-    controller.create_agents(args.agents, 1, chatbot=args.chatbot)
+    scenario = Scenario.load(args.scenario) if args.scenario else None
+    if scenario is not None:
+        RandomSeed().set_seed(args.seed if args.seed is not None else scenario.seed)
+        playground = scenario.create_playground(fast_drift=args.fast_drift)
+    else:
+        RandomSeed().set_seed(args.seed)
+        dim_x, dim_y = map(int, args.dim.split(','))
+        playground = Playground(dimensions=(dim_x, dim_y), num_balls=args.ball, num_holes=args.hole,
+                                field_of_view=args.fov, fast_drift=args.fast_drift, num_obstacles=args.obstacle)
+    message_bus = MessageBus(delay=args.message_delay, drop_rate=args.message_drop) if args.message_bus else None
+    allocator = TaskAllocator(strategy=args.allocation) if args.allocation else None
+    deadlock_detector = DeadlockDetector(window=args.deadlock_window, policy=args.deadlock) if args.deadlock else None
+    controller = Controller(playground=playground,
+                            log_file=args.log,
+                            decision_executor=decision_executor,
+                            replay_writer=replay_writer,
+                            checkpointer=checkpointer,
+                            radio_range=args.radio_range,
+                            message_bus=message_bus,
+                            allocator=allocator,
+                            exploration=args.exploration,
+                            viewer=viewer,
+                            hash_log=hash_log,
+                            deadlock_detector=deadlock_detector,
+                            feasibility_checker=FeasibilityChecker() if args.early_stop else None)
+    if scenario is not None:
+        scenario.populate(controller, chatbot=args.chatbot)
+    else:
+        controller.create_agents(args.agents, 1, chatbot=args.chatbot, team_ids=list(range(1, args.teams + 1)),
+                                 field_of_view=args.fov, battery=args.battery)
     controller.start()
     return controller
 
@@ -106,12 +337,23 @@ def configure_chatbot(args):
     if not (chatbot_username and chatbot_password):
         raise ValueError("Error: Chatbot username or password environment variables are not set.")
 
-    Chatbot().configure(username=chatbot_username, password=chatbot_password, model=args.model)
+    chatbot = load_backend(LLM, DEFAULT_LLM_BACKEND)
+    chatbot().configure(username=chatbot_username, password=chatbot_password, model=args.model)
 
 
 if __name__ == '__main__':
     args = parse_arguments()
+    if args.view_replay:
+        view_replay(args.view_replay, show_legends=args.legends, show_info=args.info)
+        sys.exit()
+
     controller = initialize_playground_and_controller(args)
+    round_log = []
+    # the game without the chatbot is played again without the deadlock policy at the end, to measure its savings
+    deadlock_snapshot = DeadlockDetector.snapshot(controller) \
+        if controller.deadlock_detector is not None and not args.chatbot else None
+    if controller.viewer is not None:
+        print(f"Live viewer: {controller.viewer.url}")
 
     configure_chatbot(args)
 
@@ -119,3 +361,14 @@ if __name__ == '__main__':
         v1(show_legends=args.legends, show_info=args.info)
     else:
         v2(show_legends=args.legends, show_info=args.info)
+
+    if controller.teams.bus is not None:
+        print(controller.teams.bus.report())
+    if controller.deadlock_detector is not None:
+        if deadlock_snapshot is not None:
+            controller.deadlock_detector.measure_savings(deadlock_snapshot, controller, perceive=args.phased)
+        print(controller.deadlock_detector.report())
+    if controller.hopeless_reason is not None:
+        print(f"The game was stopped at round {controller.round}: {controller.hopeless_reason.replace('_', ' ')}")
+    if args.db:
+        record_game(args.db)
@@ -0,0 +1,171 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from consts import EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE
+
+Position = Tuple[int, int]
+
+# the label of a cell the agent knows nothing about
+UNKNOWN = '-'
+
+
+def format_cell(label: str) -> str:
+    """
+    Returns the text of a cell in the map of a prompt.
+    """
+    return '[' + label.ljust(6, ' ') + ']'
+
+
+class MemoryMap:
+    """
+    The map of the board as an agent remembers it: the items it knows about, the cells it has visited and the
+    obstacles it has seen. It is built once and then patched in place: the agent marks the cells whose knowledge
+    changed (see `touch`), and only those cells are relabelled the next time the map is read.
+
+    The agents move every round, so they are not part of the map; they are laid over it when it is read (see
+    `overlay`). The text of each row is cached, so encoding the map in a prompt only formats the rows that changed or
+    have an agent on them.
+    """
+
+    def __init__(self, x_axis: int, y_axis: int):
+        """
+        Args:
+            x_axis: The width of the board.
+            y_axis: The height of the board.
+        """
+        self.x_axis = x_axis
+        self.y_axis = y_axis
+        self.grid: List[List[str]] = [[UNKNOWN] * x_axis for _ in range(y_axis)]
+        # the formatted cells and the text of each row, None if the row changed since it was formatted
+        self._row_cells: List[Optional[List[str]]] = [None] * y_axis
+        self._row_texts: List[Optional[str]] = [None] * y_axis
+        # None means that every cell must be relabelled
+        self._dirty: Optional[Set[Position]] = None
+
+    def touch(self, cells: Iterable[Position]) -> None:
+        """
+        Marks cells whose label may have changed.
+        """
+        if self._dirty is not None:
+            self._dirty.update(cells)
+
+    def sync(self,
+             visited_cells: Set[Position],
+             ball_positions: Iterable[Position],
+             hole_positions: Iterable[Position],
+             filled_hole_positions: Set[Position],
+             obstacles: Set[Position]) -> 'MemoryMap':
+        """
+        Relabels the touched cells from the agent's knowledge. The cost depends on the number of touched cells and
+        known items, not on the size of the board (except for the first call, which labels every cell).
+
+        Args:
+            visited_cells: The cells the agent has visited.
+            ball_positions: The balls the agent knows about.
+            hole_positions: The holes the agent knows about.
+            filled_hole_positions: The filled holes the agent knows about.
+            obstacles: The obstacles of the board; only the visited ones are shown.
+
+        Returns:
+            self: Returns the MemoryMap instance.
+        """
+        if self._dirty is None:
+            cells: Iterable[Position] = ((x, y) for y in range(self.y_axis) for x in range(self.x_axis))
+        elif self._dirty:
+            cells = self._dirty
+        else:
+            return self
+
+        balls = set(ball_positions)
+        holes = set(hole_positions)
+        for x, y in cells:
+            if not (0 <= x < self.x_axis and 0 <= y < self.y_axis):
+                continue
+            position = (x, y)
+            # the same precedence as painting the layers one over the other
+            if position in obstacles and position in visited_cells:
+                label = OBSTACLE
+            elif position in filled_hole_positions:
+                label = FILLED_HOLE
+            elif position in holes:
+                label = HOLE
+            elif position in balls:
+                label = BALL
+            elif position in visited_cells:
+                label = EMPTY
+            else:
+                label = UNKNOWN
+            if self.grid[y][x] != label:
+                self.grid[y][x] = label
+                self._row_texts[y] = None
+        self._dirty = set()
+        return self
+
+    def overlay(self, labels: Iterable[Tuple[Position, str]]) -> Dict[Position, str]:
+        """
+        Returns the labels of the cells with agents on them, each agent label combined with the label of its cell.
+
+        Args:
+            labels: (position, label) of each agent, in drawing order. Agents outside the board are skipped.
+        """
+        cells: Dict[Position, str] = {}
+        for (x, y), label in labels:
+            if not (0 <= x < self.x_axis and 0 <= y < self.y_axis):
+                continue
+            current = cells.get((x, y), self.grid[y][x])
+            cells[(x, y)] = current + ',' + label if current != EMPTY else label
+        return cells
+
+    def to_list(self, overlay: Dict[Position, str]) -> List[List[str]]:
+        """
+        Returns a copy of the map as a list of rows, with the agents laid over it.
+        """
+        map_ = [row[:] for row in self.grid]
+        for (x, y), label in overlay.items():
+            map_[y][x] = label
+        return map_
+
+    def crop(self,
+             left: int,
+             top: int,
+             right: int,
+             bottom: int,
+             overlay: Dict[Position, str]) -> List[List[str]]:
+        """
+        Returns a copy of a rectangle of the map (the bounds are inclusive and clipped to the board), with the agents
+        laid over it.
+        """
+        left, top = max(0, left), max(0, top)
+        right, bottom = min(self.x_axis - 1, right), min(self.y_axis - 1, bottom)
+        map_ = [self.grid[y][left:right + 1] for y in range(top, bottom + 1)]
+        for (x, y), label in overlay.items():
+            if left <= x <= right and top <= y <= bottom:
+                map_[y - top][x - left] = label
+        return map_
+
+    def text(self, overlay: Dict[Position, str], cell_format: Callable[[str], str] = format_cell) -> str:
+        """
+        Returns the map as text, one line per row, with the agents laid over it.
+
+        Args:
+            overlay: The labels of the cells with agents (see `overlay`).
+            cell_format: Formats a label. The cached rows are formatted with `format_cell`.
+        """
+        if cell_format is not format_cell:
+            return '\n'.join(' '.join(cell_format(label) for label in row) for row in self.to_list(overlay))
+
+        rows_with_agents: Dict[int, List[Tuple[int, str]]] = {}
+        for (x, y), label in overlay.items():
+            rows_with_agents.setdefault(y, []).append((x, label))
+        lines = []
+        for y, row in enumerate(self.grid):
+            if self._row_texts[y] is None:
+                self._row_cells[y] = [format_cell(label) for label in row]
+                self._row_texts[y] = ' '.join(self._row_cells[y])
+            if y in rows_with_agents:
+                cells = self._row_cells[y][:]
+                for x, label in rows_with_agents[y]:
+                    cells[x] = format_cell(label)
+                lines.append(' '.join(cells))
+            else:
+                lines.append(self._row_texts[y])
+        return '\n'.join(lines)
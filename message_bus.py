@@ -0,0 +1,113 @@
+import random_seed
+from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from agent import Agent
+
+random = random_seed.RandomSeed().get_random_module()
+
+
+class MessageBus:
+    """
+    Collects the information that agents send to their teammates during a round and delivers it once per round.
+
+    Messages are posted to a per-round outbox. When the round is delivered, the messages of each receiver are merged:
+    a position sent several times with the same type of information is delivered once, at the place of its latest
+    message, and if it was both added and removed, the latest status wins. The updates keep the order in which they
+    were sent, so an update of a cell (for example, a hole that is filled) is never applied before an older update
+    of another type for the same cell, just like with immediate delivery. Each receiver gets one batch per run of
+    updates of the same type (see `Agent.receive_friends_info_bulk`).
+
+    A message can be delayed by a number of rounds or dropped with a probability, to simulate an unreliable radio.
+    """
+
+    def __init__(self, delay: int = 0, drop_rate: float = 0.0):
+        """
+        Args:
+            delay: Number of rounds between sending a message and delivering it. With 0, a message is delivered at the
+                   end of the round in which it was sent.
+            drop_rate: Probability that a message is lost.
+        """
+        self.delay = max(0, delay)
+        self.drop_rate = drop_rate
+        # the round in which the messages are being sent; the first round of the controller is 1
+        self.round = 1
+        # round of delivery -> receiver -> (information type, position) -> status, in the order they were sent
+        self._outbox: Dict[int, Dict['Agent', Dict[Tuple[str, Tuple[int, int]], int]]] = {}
+        self.stats = {
+            'sent': 0,
+            'dropped': 0,
+            'positions_sent': 0,
+            'batches_delivered': 0,
+            'positions_delivered': 0,
+        }
+
+    def post(self, receivers: List['Agent'], info_type: str, status: int, positions: List[Tuple[int, int]]) -> None:
+        """
+        Puts a message in the outbox of its receivers.
+
+        Args:
+            receivers: The agents that should receive the message.
+            info_type: A string representing the type of information (BALL, HOLE, FILLED_HOLE, GONE, VISITED).
+            status: 1 to add the information to the receivers' knowledge, -1 to remove it.
+            positions: A list of tuples representing the positions of the items.
+        """
+        self.stats['sent'] += 1
+        self.stats['positions_sent'] += len(positions)
+        # no random number is drawn without a drop rate, so the bus does not change the course of the game
+        if self.drop_rate > 0 and random.random() < self.drop_rate:
+            self.stats['dropped'] += 1
+            return
+
+        outbox = self._outbox.setdefault(self.round + self.delay, {})
+        for receiver in receivers:
+            updates = outbox.setdefault(receiver, {})
+            for position in positions:
+                # re-insert, so the update takes the place of its latest message
+                updates.pop((info_type, position), None)
+                updates[(info_type, position)] = status
+
+    def deliver(self, round_number: int) -> int:
+        """
+        Delivers the messages due in the given round and moves the outbox to the next round.
+
+        Args:
+            round_number: The number of the round that has just been played.
+
+        Returns:
+            The number of batches delivered.
+        """
+        batches = 0
+        for due_round in sorted(due for due in self._outbox if due <= round_number):
+            for receiver, updates in self._outbox.pop(due_round).items():
+                for info_type, statuses in _runs(updates):
+                    added = [position for position, status in statuses if status == 1]
+                    removed = [position for position, status in statuses if status == -1]
+                    receiver.receive_friends_info_bulk(info_type, added, removed)
+                    batches += 1
+                    self.stats['positions_delivered'] += len(statuses)
+
+        self.stats['batches_delivered'] += batches
+        self.round = round_number + 1
+        return batches
+
+    def report(self) -> str:
+        """
+        Returns a summary of the message volume.
+        """
+        return (f"messages sent: {self.stats['sent']} ({self.stats['positions_sent']} positions), "
+                f"dropped: {self.stats['dropped']}, "
+                f"delivered: {self.stats['batches_delivered']} batches ({self.stats['positions_delivered']} positions)")
+
+
+def _runs(updates: Dict[Tuple[str, Tuple[int, int]], int]) -> Iterator[Tuple[str, List[Tuple[Tuple[int, int], int]]]]:
+    # the consecutive updates of the same type of information, as (type, [(position, status), ...])
+    info_type, run = None, []
+    for (update_type, position), status in updates.items():
+        if update_type != info_type and run:
+            yield info_type, run
+            run = []
+        info_type = update_type
+        run.append((position, status))
+    if run:
+        yield info_type, run
@@ -1,7 +1,11 @@
+import heapq
 import random_seed
-from typing import List, Tuple, Set, TYPE_CHECKING
+from typing import List, Optional, Tuple, Set, Dict, TYPE_CHECKING
 
-from consts import EMPTY, HOLE, BALL, FILLED_HOLE, UP, RIGHT, DOWN, LEFT, AGENT
+from consts import EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE, UP, RIGHT, DOWN, LEFT, AGENT, BALL_DRIFT_PROBABILITY
+from indexed_set import IndexedSet
+from memory_map import UNKNOWN
+from state_hash import StateHash
 from utils import get_new_position
 
 if TYPE_CHECKING:
@@ -16,18 +20,40 @@ class Playground:
                  dimensions: Tuple[int, int] = (5, 5),
                  num_holes: int = 5,
                  num_balls: int = 5,
-                 field_of_view: int = 3):
+                 field_of_view: int = 3,
+                 fast_drift: bool = False,
+                 num_obstacles: int = 0):
         self.dimensions = dimensions
         self.xAxis, self.yAxis = dimensions
         self.grid: list[list[str]] = [[EMPTY] * self.xAxis for _ in range(self.yAxis)]
+        # index of the empty cells, updated on every change of a cell (see set_cell_state)
+        self.free_cells: IndexedSet[Tuple[int, int]] = IndexedSet(
+            (i, j) for j in range(self.yAxis) for i in range(self.xAxis))
+        # passability of every cell (index y * xAxis + x): 1 if agents and balls can enter it, 0 for an obstacle
+        self.passable = bytearray(b'\x01') * (self.xAxis * self.yAxis)
+        self.obstacles: Set[Tuple[int, int]] = set()
+        self.num_obstacles = num_obstacles
+        # hash of the items on the grid and of the agents, updated on every change (see StateHash)
+        self.state_hash = StateHash()
+        # cells changed in the current round; the controller clears them at the end of each round
+        self.changed_cells: Set[Tuple[int, int]] = set()
 
         self.agent_start_positions: Set[Tuple[int, int]] = set()  # Store unique agent positions
         self.num_holes = num_holes
         self.num_balls = num_balls
-        self.ball_positions = set()
+        self.ball_positions: IndexedSet[Tuple[int, int]] = IndexedSet()
         self.holes = {}
 
+        # counters that are kept up to date by every change of the board, so the game state can be checked in O(1)
+        self.balls_remaining = 0
+        self.filled_holes = 0
+        self.filled_holes_by_team: Dict[int, int] = {}
+        self.hole_filler_teams: Dict[Tuple[int, int], int] = {}
+        self.agents_alive: Dict[int, int] = {}
+
         self.field_of_view = field_of_view
+        # if set, only the balls that move are drawn after a fill (see switch_ball_positions)
+        self.fast_drift = fast_drift
 
     def add_agent(self, agent: 'Agent') -> bool:
         """
@@ -38,17 +64,30 @@ class Playground:
 
         Returns:
             A boolean value indicating whether the operation was successful. Returns True if the agent was added successfully,
-            and False if the operation failed (for example, if the desired position is already occupied).
+            and False if the operation failed (for example, if the desired position is already occupied or outside the grid).
         """
         if agent.position in self.agent_start_positions:
             return False
+        if not self.is_valid_position(agent.position) or self.get_cell_state(agent.position) != EMPTY:
+            return False
 
+        self.state_hash.add_agent(agent, len(self.agent_start_positions))
         self.agent_start_positions.add(agent.position)  # Save the unique position
-        x, y = agent.position
-        self.grid[y][x] = agent.get_label()
+        self.set_cell_state(agent.position, agent.get_label())
+        if agent.battery >= 0:
+            self.agents_alive[agent.type] = self.agents_alive.get(agent.type, 0) + 1
 
         return True
 
+    def agent_ran_out_of_battery(self, agent: 'Agent') -> None:
+        """
+        Records that an agent has used up its battery and can no longer take part in the game.
+
+        Args:
+            agent: The Agent object whose battery has run out.
+        """
+        self.agents_alive[agent.type] -= 1
+
     def get_random_empty_position(self) -> Tuple[int, int]:
         """
         Returns a random empty position in the playground.
@@ -56,34 +95,83 @@ class Playground:
         Returns:
             A tuple containing two integers representing row and column indices.
         """
-        empty_positions = [(i, j) for i in range(self.xAxis) for j in range(self.yAxis) if self.grid[j][i] == EMPTY]
-        return random.choice(empty_positions)
+        return random.choice(self.free_cells)
 
     def place_holes_and_balls(self) -> None:
         """
-        Randomly places holes and balls (soil) on the grid, avoiding agent positions.
+        Randomly places obstacles, holes and balls (soil) on the grid, avoiding agent positions.
 
-        The algorithm ensures that each position is unique and not already occupied by an agent.
+        The algorithm ensures that each position is unique and not already occupied by an agent: every item is put on
+        a random cell of the free-cell index, which removes the cell from the index. Holes and balls that were already
+        placed (for example, by a scenario) count towards num_obstacles, num_holes and num_balls.
         """
-        available_positions = [(i, j) for i in range(self.xAxis) for j in range(self.yAxis) if
-                               (i, j) not in self.agent_start_positions]
-        random.shuffle(available_positions)
+        # Place obstacles
+        for i in range(self.num_obstacles - len(self.obstacles)):
+            if len(self.free_cells) == 0:
+                break
+            self.add_obstacle(random.choice(self.free_cells))
 
         # Place holes
-        for i in range(self.num_holes):
-            if len(available_positions) == 0:
+        for i in range(self.num_holes - len(self.holes)):
+            if len(self.free_cells) == 0:
                 break
-            x, y = available_positions.pop(0)
-            self.grid[y][x] = HOLE
-            self.holes[(x, y)] = ''
+            self.add_hole(random.choice(self.free_cells))
 
         # Place balls
-        for i in range(self.num_balls):
-            if len(available_positions) == 0:
+        for i in range(self.num_balls - self.balls_remaining):
+            if len(self.free_cells) == 0:
                 break
-            x, y = available_positions.pop(0)
-            self.grid[y][x] = BALL
-            self.ball_positions.add((x, y))
+            self.add_ball(random.choice(self.free_cells))
+
+    def add_hole(self, position: Tuple[int, int]) -> bool:
+        """
+        Puts a hole on an empty cell.
+
+        Args:
+            position: A tuple containing two integers representing row and column indices.
+
+        Returns:
+            A boolean value indicating whether the hole was put on the cell.
+        """
+        if not self.is_valid_position(position) or self.get_cell_state(position) != EMPTY:
+            return False
+        self.set_cell_state(position, HOLE)
+        self.holes[position] = ''
+        return True
+
+    def add_ball(self, position: Tuple[int, int]) -> bool:
+        """
+        Puts a ball on an empty cell.
+
+        Args:
+            position: A tuple containing two integers representing row and column indices.
+
+        Returns:
+            A boolean value indicating whether the ball was put on the cell.
+        """
+        if not self.is_valid_position(position) or self.get_cell_state(position) != EMPTY:
+            return False
+        self.set_cell_state(position, BALL)
+        self.ball_positions.add(position)
+        self.balls_remaining += 1
+        return True
+
+    def add_obstacle(self, position: Tuple[int, int]) -> bool:
+        """
+        Puts an obstacle on an empty cell. No agent or ball can enter the cell.
+
+        Args:
+            position: A tuple containing two integers representing row and column indices.
+
+        Returns:
+            A boolean value indicating whether the obstacle was put on the cell.
+        """
+        if not self.is_valid_position(position) or self.get_cell_state(position) != EMPTY:
+            return False
+        self.set_cell_state(position, OBSTACLE)
+        self.passable[position[1] * self.xAxis + position[0]] = 0
+        self.obstacles.add(position)
+        return True
 
     def get_surrounding_cells(self, position: Tuple[int, int], field_of_view: int = None) -> List[List[str]]:
         """
@@ -127,6 +215,25 @@ class Playground:
         x, y = position
         return self.grid[y][x]
 
+    def set_cell_state(self, position: Tuple[int, int], state: str) -> None:
+        """
+        Sets the state of the cell at the given position and keeps the index of the empty cells, the changed cells and
+        the state hash up to date.
+        Every change of the grid must go through this method.
+
+        Args:
+            position: A tuple containing two integers representing row and column indices.
+            state: The new state of the cell.
+        """
+        x, y = position
+        self.state_hash.change_cell(position, self.grid[y][x], state)
+        self.grid[y][x] = state
+        self.changed_cells.add(position)
+        if state == EMPTY:
+            self.free_cells.add(position)
+        else:
+            self.free_cells.discard(position)
+
     def agent_exit_cell(self, agent: 'Agent') -> None:
         """
         Updates the state of the cell that the agent is exiting.
@@ -135,15 +242,14 @@ class Playground:
             agent: The Agent object that is exiting the cell.
         """
         current_cell_state = self.get_cell_state(agent.position)
+        new_cell_state = current_cell_state.replace(agent.get_label(), '').replace(',,', ',')
 
-        x, y = agent.position
-        self.grid[y][x] = current_cell_state.replace(agent.get_label(), '').replace(',,', ',')
-
-        if self.grid[y][x] == '':
-            self.grid[y][x] = EMPTY
+        if new_cell_state == '':
+            new_cell_state = EMPTY
         # if last character is ',' remove that
-        if self.grid[y][x][-1] == ',':
-            self.grid[y][x] = self.grid[y][x][:-1]
+        if new_cell_state[-1] == ',':
+            new_cell_state = new_cell_state[:-1]
+        self.set_cell_state(agent.position, new_cell_state)
 
     def agent_enter_cell(self, position: Tuple[int, int], agent: 'Agent') -> bool:
         """
@@ -161,9 +267,8 @@ class Playground:
             return False
         current_cell_state = self.get_cell_state(position)
 
-        x, y = position
         self.agent_exit_cell(agent)
-        self.grid[y][x] = current_cell_state + ',' + agent.get_label()
+        self.set_cell_state(position, current_cell_state + ',' + agent.get_label())
         return True
 
     def pick_ball(self, position: Tuple[int, int]) -> bool:
@@ -183,11 +288,11 @@ class Playground:
         if BALL not in current_cell_state:
             return False
 
-        x_old, y_old = position
-        self.grid[y_old][x_old] = current_cell_state.replace(BALL, EMPTY)
+        self.set_cell_state(position, current_cell_state.replace(BALL, EMPTY))
 
         # remove current ball
         self.ball_positions.remove(position)
+        self.balls_remaining -= 1
         return True
 
     def switch_ball_positions(self) -> None:
@@ -197,34 +302,72 @@ class Playground:
         This method iterates over each ball in the playground. For each ball, it randomly selects a direction (up, right, down, or left)
         and attempts to move the ball in that direction. If the new position is valid and not already occupied by another ball or a filled hole,
         the ball is moved to the new position.
+
+        In fast drift mode, the number of moving balls is drawn at once from a binomial distribution and only those balls
+        are picked, so the cost depends on the number of moving balls rather than on the number of balls.
         """
+        if self.fast_drift:
+            self.switch_ball_positions_fast()
+            return
+
         ball_position_temp = set(self.ball_positions)
         for ball in ball_position_temp:
             direction = random.choice([UP, RIGHT, DOWN, LEFT])
             prob = random.random()
-            if prob > 0.1:
+            if prob > BALL_DRIFT_PROBABILITY:
                 continue
 
-            x_old, y_old = ball
-            new_position = get_new_position(direction, ball)
-            if not self.is_valid_position(new_position):
-                continue
+            self.drift_ball(ball, direction)
 
-            x_new, y_new = new_position
-            new_cell_label = self.get_cell_state(new_position)
-            # if new position is ball or filled hole cell nothing change
-            if BALL in new_cell_label or FILLED_HOLE in new_cell_label:
-                continue
+    def switch_ball_positions_fast(self) -> None:
+        """
+        Moves each ball with a probability of 0.1 in a random direction, like `switch_ball_positions`, but draws the
+        number of moving balls from a binomial distribution and then picks that many distinct balls.
+        """
+        num_balls = len(self.ball_positions)
+        if num_balls == 0:
+            return
+
+        num_moving = random.binomialvariate(num_balls, BALL_DRIFT_PROBABILITY)
+        # pick the balls before moving any of them, because moving a ball changes the order of the index
+        moving_balls = [self.ball_positions[i] for i in random.sample(range(num_balls), num_moving)]
+        for ball in moving_balls:
+            self.drift_ball(ball, random.choice([UP, RIGHT, DOWN, LEFT]))
+
+    def drift_ball(self, ball: Tuple[int, int], direction: str) -> bool:
+        """
+        Moves a ball one cell in the given direction. A ball that drifts into a hole fills it.
 
-            if EMPTY in new_cell_label:
-                self.grid[y_old][x_old] = self.grid[y_old][x_old].replace(BALL, EMPTY)
-                self.grid[y_new][x_new] = self.grid[y_new][x_new].replace(EMPTY, BALL)
-                self.ball_positions.remove(ball)
-                self.ball_positions.add(new_position)
-            elif HOLE in new_cell_label:
-                self.grid[y_old][x_old] = self.grid[y_old][x_old].replace(BALL, EMPTY)
-                self.grid[y_new][x_new] = self.grid[y_new][x_new].replace(HOLE, FILLED_HOLE)
-                self.ball_positions.remove(ball)
+        Args:
+            ball: A tuple containing two integers representing the position of the ball.
+            direction: A string representing the direction (UP, RIGHT, DOWN, LEFT).
+
+        Returns:
+            A boolean value indicating whether the ball has moved.
+        """
+        new_position = get_new_position(direction, ball)
+        if not self.is_valid_position(new_position):
+            return False
+
+        new_cell_label = self.get_cell_state(new_position)
+        # if new position is ball or filled hole cell nothing change
+        if BALL in new_cell_label or FILLED_HOLE in new_cell_label:
+            return False
+
+        if EMPTY in new_cell_label:
+            self.set_cell_state(ball, self.get_cell_state(ball).replace(BALL, EMPTY))
+            self.set_cell_state(new_position, new_cell_label.replace(EMPTY, BALL))
+            self.ball_positions.remove(ball)
+            self.ball_positions.add(new_position)
+            return True
+        if HOLE in new_cell_label:
+            self.set_cell_state(ball, self.get_cell_state(ball).replace(BALL, EMPTY))
+            self.set_cell_state(new_position, new_cell_label.replace(HOLE, FILLED_HOLE))
+            self.ball_positions.remove(ball)
+            self.balls_remaining -= 1
+            self.filled_holes += 1
+            return True
+        return False
 
     def place_ball(self, position: Tuple[int, int], agent: 'Agent') -> bool:
         """
@@ -246,9 +389,11 @@ class Playground:
         if HOLE not in current_cell_state:
             return False
 
-        x, y = position
-        self.grid[y][x] = current_cell_state.replace(HOLE, FILLED_HOLE)
-        self.holes[(x, y)] = agent.agent_id
+        self.set_cell_state(position, current_cell_state.replace(HOLE, FILLED_HOLE))
+        self.holes[position] = agent.agent_id
+        self.hole_filler_teams[position] = agent.type
+        self.filled_holes += 1
+        self.filled_holes_by_team[agent.type] = self.filled_holes_by_team.get(agent.type, 0) + 1
 
         # switch position of other balls
         self.switch_ball_positions()
@@ -263,26 +408,45 @@ class Playground:
 
         Returns:
             A boolean value indicating whether the operation was successful. Returns True if a ball was successfully stolen,
-            and False if the operation failed (for example, if the desired position is not valid, the agent does not have a ball, or there is no hole at the position).
+            and False if the operation failed (for example, if the desired position is not valid, there is no filled hole at the position, or there is no empty cell to throw the ball to).
         """
         if not self.is_valid_position(position):
             return False
         current_cell_state = self.get_cell_state(position)
         if FILLED_HOLE not in current_cell_state:
             return False
+        # on a full board the ball stays in the hole
+        if len(self.free_cells) == 0:
+            return False
 
         # change filled hole to hole
-        x, y = position
-        self.grid[y][x] = current_cell_state.replace(FILLED_HOLE, HOLE)
-        self.holes[(x, y)] = ''
+        self.set_cell_state(position, current_cell_state.replace(FILLED_HOLE, HOLE))
+        self.holes[position] = ''
+        self.filled_holes -= 1
+        # holes filled by a moving ball don't belong to any team
+        filler_team = self.hole_filler_teams.pop(position, None)
+        if filler_team is not None:
+            self.filled_holes_by_team[filler_team] -= 1
         # put ball in a random position
         ball_position = self.get_random_empty_position()
-        x, y = ball_position
-        self.grid[y][x] = BALL
+        self.set_cell_state(ball_position, BALL)
         self.ball_positions.add(ball_position)
+        self.balls_remaining += 1
 
         return True
 
+    def get_team_score(self, team: int) -> int:
+        """
+        Returns the number of holes that are currently filled by the agents of a team.
+
+        Args:
+            team: An integer representing the team (type of the agents).
+
+        Returns:
+            The score of the team.
+        """
+        return self.filled_holes_by_team.get(team, 0)
+
     def is_valid_position(self, position: Tuple[int, int]) -> bool:
         """
         Checks if a given position is valid in the playground.
@@ -291,20 +455,55 @@ class Playground:
             position: A tuple containing two integers representing row and column indices.
 
         Returns:
-            A boolean value indicating whether the position is valid. Returns True if the position is within the grid boundaries,
-            and False otherwise.
+            A boolean value indicating whether the position is valid. Returns True if the position is within the grid boundaries
+            and is not an obstacle, and False otherwise.
         """
 
         if not position:
             return False
-        # Check if position is within grid boundaries
         x, y = position
-        if x < 0 or x >= self.xAxis:
-            return False
-        if y < 0 or y >= self.xAxis:
-            return False
-        # (check if position is an obstacle)?
-        return True
+        return 0 <= x < self.xAxis and 0 <= y < self.yAxis and self.passable[y * self.xAxis + x] == 1
+
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """
+        Finds a shortest path around the obstacles with A* and the Manhattan distance. Agents and items don't block the
+        path; only the passability mask is used.
+
+        Args:
+            start: The first cell of the path.
+            goal: The last cell of the path.
+
+        Returns:
+            The cells of the path from start to goal, both included, or None if the goal can't be reached.
+        """
+        if not self.is_valid_position(goal):
+            return None
+        width, passable = self.xAxis, self.passable
+        goal_x, goal_y = goal
+        start_index, goal_index = start[1] * width + start[0], goal_y * width + goal_x
+        came_from = {start_index: -1}
+        cost = {start_index: 0}
+        queue = [(0, start_index)]
+        while queue:
+            _, index = heapq.heappop(queue)
+            if index == goal_index:
+                path = []
+                while index != -1:
+                    path.append((index % width, index // width))
+                    index = came_from[index]
+                return path[::-1]
+            y, x = divmod(index, width)
+            for neighbour_x, neighbour_y in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if not (0 <= neighbour_x < width and 0 <= neighbour_y < self.yAxis):
+                    continue
+                neighbour = neighbour_y * width + neighbour_x
+                if not passable[neighbour] or neighbour in cost and cost[neighbour] <= cost[index] + 1:
+                    continue
+                cost[neighbour] = cost[index] + 1
+                came_from[neighbour] = index
+                heuristic = abs(neighbour_x - goal_x) + abs(neighbour_y - goal_y)
+                heapq.heappush(queue, (cost[neighbour] + heuristic, neighbour))
+        return None
 
     def is_a_ball_cell(self, position: Tuple[int, int]) -> bool:
         """
@@ -344,19 +543,9 @@ class Playground:
         Returns:
             A list of lists representing the full map for the agent, based on its memory.
         """
-        map_ = [[EMPTY for _ in range(self.xAxis)] for _ in range(self.yAxis)]
-
-        # Mark balls as per the agent's memory
-        for ball_pos in agent.ball_positions:
-            map_[ball_pos[1]][ball_pos[0]] = BALL
-
-        # Mark holes as per the agent's memory
-        for hole_pos in agent.hole_positions:
-            map_[hole_pos[1]][hole_pos[0]] = HOLE
-
-        # Mark filled holes as per the agent's memory
-        for filled_hole_pos in agent.filled_hole_positions:
-            map_[filled_hole_pos[1]][filled_hole_pos[0]] = FILLED_HOLE
+        # the balls, holes and filled holes of the agent's memory map, without the unknown cells and the obstacles
+        map_ = [[EMPTY if label in (UNKNOWN, OBSTACLE) else label for label in row]
+                for row in agent.sync_memory_map(self).grid]
 
         # Mark the agent's position
         map_[agent.position[1]][agent.position[0]] = agent.get_label() if map_[agent.position[1]][agent.position[0]] == EMPTY else agent.get_label() + ',' + map_[agent.position[1]][agent.position[0]]
@@ -27,6 +27,13 @@ class RandomSeed:
     def get_seed(self):
         return self._seed
 
+    def get_state(self):
+        return self._seed, random.getstate()
+
+    def set_state(self, state):
+        self._seed, random_state = state
+        random.setstate(random_state)
+
     @staticmethod
     def get_random_module():
         return random
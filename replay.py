@@ -0,0 +1,358 @@
+import mmap
+import struct
+from typing import BinaryIO, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from consts import EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE, AGENT, UP, RIGHT, DOWN, LEFT
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from controller import Draw
+    from playground import Playground
+
+# File layout (little endian):
+#   header:  magic, version, x axis, y axis, keyframe interval, seed, agent table (team and id of each agent)
+#   records: one per round -> record header, the state of every agent (fixed size), the changed cells (fixed size each)
+#   footer:  the offset of every record, the number of records and the index magic
+# The records have a variable size, since the number of changed cells differs from round to round (and a keyframe
+# holds every cell), so a record is found through the offset index instead of at a fixed stride.
+# A file without a footer (for example, a run that crashed) is still readable: the index is rebuilt by scanning.
+MAGIC = b'BHRP'
+INDEX_MAGIC = b'BHIX'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHIII')
+_LENGTH = struct.Struct('<H')
+_COUNT = struct.Struct('<I')
+_TEAM = struct.Struct('<i')
+_RECORD = struct.Struct('<IBI')  # iteration, flags, number of cells
+_AGENT_STATE = struct.Struct('<iiiiBBii')  # position, target position, direction, has ball, battery, score
+_CELL = struct.Struct('<IIBHH')  # x, y, base state, agent on the cell, agent that filled the hole
+_FOOTER = struct.Struct('<Q4s')
+
+KEYFRAME = 1
+
+# the base state of a cell, without the agent that stands on it (a cell of an agent's start position has no base)
+_BASES = ('', EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE)
+_BASE_CODES = {base: code for code, base in enumerate(_BASES)}
+_DIRECTIONS = (UP, RIGHT, DOWN, LEFT)
+_DIRECTION_CODES = {direction: code for code, direction in enumerate(_DIRECTIONS)}
+
+
+class AgentState:
+    """
+    The state of an agent at the end of a round.
+    """
+
+    def __init__(self,
+                 position: Tuple[int, int],
+                 target_position: Optional[Tuple[int, int]],
+                 direction: str,
+                 has_ball: bool,
+                 battery: int,
+                 score: int):
+        self.position = position
+        self.target_position = target_position
+        self.direction = direction
+        self.has_ball = has_ball
+        self.battery = battery
+        self.score = score
+
+
+class ReplayRound:
+    """
+    A round read from a replay file: the state of every agent and the cells that changed in the round.
+
+    The cells are tuples of (position, label of the cell, ID of the agent that filled the hole or '').
+    If `keyframe` is True, `cells` holds every non-empty cell of the grid instead of the changed ones.
+    """
+
+    def __init__(self,
+                 iteration: int,
+                 keyframe: bool,
+                 agents: List[AgentState],
+                 cells: List[Tuple[Tuple[int, int], str, str]]):
+        self.iteration = iteration
+        self.keyframe = keyframe
+        self.agents = agents
+        self.cells = cells
+
+
+class ReplayWriter:
+    """
+    Writes the rounds of a game to a replay file while the game is running.
+
+    Only the cells that changed since the previous round are written (the playground records them in `changed_cells`,
+    which the controller clears after each round),
+    and every `keyframe_interval` rounds the whole grid is written, so a reader can rebuild any round from the
+    nearest keyframe.
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = 100):
+        """
+        Args:
+            path: The path of the replay file. An existing file is overwritten.
+            keyframe_interval: Number of rounds between two full copies of the grid.
+        """
+        self.path = path
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._file: Optional[BinaryIO] = None
+        self._offsets: List[int] = []
+        self._agent_indices: Dict[str, int] = {}
+
+    def start(self,
+              playground: 'Playground',
+              agents: List['Agent'],
+              seed: Optional[int],
+              iteration: int = 0) -> 'ReplayWriter':
+        """
+        Creates the file, writes the header and the current state of the game as the first round.
+
+        Args:
+            playground: The Playground object of the game.
+            agents: All agents of the game. No agent can be added after the replay has started.
+            seed: The seed of the random number generator.
+            iteration: The number of the current round (not 0 for a game restored from a checkpoint).
+
+        Returns:
+            self: Returns the ReplayWriter instance.
+        """
+        self._file = open(self.path, 'wb')
+        self._offsets = []
+        # 0 means "no agent" in a cell record
+        self._agent_indices = {agent.agent_id: index + 1 for index, agent in enumerate(agents)}
+
+        header = [_HEADER.pack(MAGIC, VERSION, playground.xAxis, playground.yAxis, self.keyframe_interval),
+                  self._pack_text('' if seed is None else str(seed)),
+                  _COUNT.pack(len(agents))]
+        for agent in agents:
+            header.append(_TEAM.pack(agent.type))
+            header.append(self._pack_text(agent.agent_id))
+        self._file.write(b''.join(header))
+
+        self.write_round(playground, agents, iteration)
+        return self
+
+    def write_round(self, playground: 'Playground', agents: List['Agent'], iteration: int) -> 'ReplayWriter':
+        """
+        Appends the state of the game at the end of a round.
+
+        Args:
+            playground: The Playground object of the game.
+            agents: All agents of the game, in the same order as when the replay was started.
+            iteration: The number of the round.
+
+        Returns:
+            self: Returns the ReplayWriter instance.
+        """
+        keyframe = len(self._offsets) % self.keyframe_interval == 0
+        if keyframe:
+            positions = [(x, y) for y in range(playground.yAxis) for x in range(playground.xAxis)
+                         if playground.grid[y][x] != EMPTY]
+        else:
+            positions = playground.changed_cells
+        cells = [self._pack_cell(playground, position) for position in positions]
+
+        record = [_RECORD.pack(iteration, KEYFRAME if keyframe else 0, len(cells))]
+        record.extend(self._pack_agent(agent) for agent in agents)
+        record.extend(cells)
+
+        self._offsets.append(self._file.tell())
+        self._file.write(b''.join(record))
+        return self
+
+    def close(self) -> None:
+        """
+        Writes the offset index and closes the file.
+        """
+        if self._file is None:
+            return
+        self._file.write(struct.pack(f'<{len(self._offsets)}Q', *self._offsets))
+        self._file.write(_FOOTER.pack(len(self._offsets), INDEX_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def _pack_cell(self, playground: 'Playground', position: Tuple[int, int]) -> bytes:
+        label = playground.get_cell_state(position)
+        base, _, agent_id = label.partition(AGENT + '-')
+        base = base.rstrip(',')
+        filler_id = playground.holes.get(position, '') if base == FILLED_HOLE else ''
+        x, y = position
+        return _CELL.pack(x, y, _BASE_CODES[base],
+                          self._agent_indices.get(agent_id, 0),
+                          self._agent_indices.get(filler_id, 0))
+
+    @staticmethod
+    def _pack_agent(agent: 'Agent') -> bytes:
+        x, y = agent.position
+        target_x, target_y = agent.target_position if agent.target_position is not None else (-1, -1)
+        return _AGENT_STATE.pack(x, y, target_x, target_y, _DIRECTION_CODES[agent.direction], agent.has_ball,
+                                 agent.battery, agent.get_my_score())
+
+    @staticmethod
+    def _pack_text(text: str) -> bytes:
+        data = text.encode('utf-8')
+        return _LENGTH.pack(len(data)) + data
+
+
+class ReplayReader:
+    """
+    Reads a replay file through `mmap`.
+
+    Opening a file only reads the header and the offset index, so any round can be read without loading the others.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: The path of the replay file.
+
+        Raises:
+            ValueError: If the file is not a replay file or has an unsupported version.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.xAxis, self.yAxis, self.keyframe_interval = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            self._file.close()
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a replay file")
+            raise ValueError(f"Unsupported replay version: {version}")
+        offset = _HEADER.size
+        self.seed, offset = self._unpack_text(offset)
+
+        (num_agents,), offset = _COUNT.unpack_from(self._mmap, offset), offset + _COUNT.size
+        self.agent_ids: List[str] = []
+        self.agent_teams: List[int] = []
+        for _ in range(num_agents):
+            (team,), offset = _TEAM.unpack_from(self._mmap, offset), offset + _TEAM.size
+            agent_id, offset = self._unpack_text(offset)
+            self.agent_teams.append(team)
+            self.agent_ids.append(agent_id)
+
+        self._offsets: memoryview | List[int] = self._read_index(offset)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def read_round(self, index: int) -> ReplayRound:
+        """
+        Reads a round.
+
+        Args:
+            index: The index of the round in the file.
+
+        Returns:
+            The ReplayRound object of the round.
+        """
+        offset = self._offsets[index]
+        iteration, flags, num_cells = _RECORD.unpack_from(self._mmap, offset)
+        offset += _RECORD.size
+
+        agents = []
+        for _ in self.agent_ids:
+            x, y, target_x, target_y, direction, has_ball, battery, score = _AGENT_STATE.unpack_from(self._mmap, offset)
+            offset += _AGENT_STATE.size
+            agents.append(AgentState(position=(x, y),
+                                     target_position=(target_x, target_y) if target_x >= 0 else None,
+                                     direction=_DIRECTIONS[direction],
+                                     has_ball=bool(has_ball),
+                                     battery=battery,
+                                     score=score))
+
+        cells = []
+        for x, y, base, agent_index, filler_index in _CELL.iter_unpack(
+                self._mmap[offset:offset + num_cells * _CELL.size]):
+            label = _BASES[base]
+            if agent_index:
+                agent_label = AGENT + '-' + self.agent_ids[agent_index - 1]
+                label = label + ',' + agent_label if label else agent_label
+            filler_id = self.agent_ids[filler_index - 1] if filler_index else ''
+            cells.append(((x, y), label, filler_id))
+
+        return ReplayRound(iteration=iteration, keyframe=bool(flags & KEYFRAME), agents=agents, cells=cells)
+
+    def read_grid(self, index: int) -> Tuple[List[List[str]], Dict[Tuple[int, int], str]]:
+        """
+        Rebuilds the grid at the end of a round from the nearest keyframe.
+
+        Args:
+            index: The index of the round in the file.
+
+        Returns:
+            A tuple of the grid and the holes (position of every hole -> ID of the agent that filled it, or '').
+        """
+        grid = [[EMPTY] * self.xAxis for _ in range(self.yAxis)]
+        holes = {}
+        for i in range(index - index % self.keyframe_interval, index + 1):
+            for (x, y), label, filler_id in self.read_round(i).cells:
+                grid[y][x] = label
+                if HOLE in label or FILLED_HOLE in label:
+                    holes[(x, y)] = filler_id
+                else:
+                    holes.pop((x, y), None)
+        return grid, holes
+
+    def read_draw(self, index: int) -> 'Draw':
+        """
+        Returns a Draw object of a round, so it can be plotted like the rounds of a running game.
+
+        Args:
+            index: The index of the round in the file.
+
+        Returns:
+            The Draw object of the round.
+        """
+        from controller import Draw, DrawableAgent
+        from playground import Playground
+
+        replay_round = self.read_round(index)
+        playground = Playground(dimensions=(self.xAxis, self.yAxis))
+        playground.grid, playground.holes = self.read_grid(index)
+        agents = [DrawableAgent(agent_id=agent_id,
+                                team=team,
+                                position=state.position,
+                                target_position=state.target_position,
+                                direction=state.direction,
+                                has_ball=state.has_ball,
+                                battery=state.battery,
+                                score=state.score)
+                  for agent_id, team, state in zip(self.agent_ids, self.agent_teams, replay_round.agents)]
+        return Draw(playground=playground, agents=agents, iteration=replay_round.iteration)
+
+    def close(self) -> None:
+        """
+        Closes the file.
+        """
+        # the index may be a view of the mapped file, which must be released before the file can be unmapped
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._mmap.close()
+        self._file.close()
+
+    def _read_index(self, records_offset: int) -> memoryview | List[int]:
+        size = len(self._mmap)
+        if size - records_offset >= _FOOTER.size:
+            count, magic = _FOOTER.unpack_from(self._mmap, size - _FOOTER.size)
+            index_offset = size - _FOOTER.size - count * 8
+            if magic == INDEX_MAGIC and index_offset >= records_offset:
+                return memoryview(self._mmap)[index_offset:size - _FOOTER.size].cast('Q')
+
+        # no index (the game did not finish): find the records by scanning the file
+        offsets = []
+        record_size = _RECORD.size + len(self.agent_ids) * _AGENT_STATE.size
+        offset = records_offset
+        while offset + record_size <= size:
+            _, _, num_cells = _RECORD.unpack_from(self._mmap, offset)
+            if offset + record_size + num_cells * _CELL.size > size:
+                break
+            offsets.append(offset)
+            offset += record_size + num_cells * _CELL.size
+        return offsets
+
+    def _unpack_text(self, offset: int) -> Tuple[str, int]:
+        (length,) = _LENGTH.unpack_from(self._mmap, offset)
+        offset += _LENGTH.size
+        return bytes(self._mmap[offset:offset + length]).decode('utf-8'), offset + length
@@ -0,0 +1,295 @@
+"""
+A local SQLite database of game results: one row per game (its parameters, seed, outcome and why it ended, rounds,
+battery used and chatbot calls) and one row per round of a game (filled holes, balls left, agents alive, battery left, changed cells).
+
+Usage: python results.py DB summary [-by battery fov] [-where ball=5 ...]
+       python results.py DB runs [-where ...] [-limit N]
+       python results.py DB curve [-where ...]
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from controller import Controller
+
+SUCCESS = 'success'
+FAILURE = 'failure'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    config TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    version TEXT,
+    outcome TEXT NOT NULL,
+    filled INTEGER NOT NULL,
+    max_score INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    battery_used INTEGER NOT NULL,
+    llm_calls INTEGER NOT NULL,
+    created REAL NOT NULL,
+    end_reason TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_config ON runs (config_hash, seed);
+CREATE INDEX IF NOT EXISTS runs_outcome ON runs (outcome);
+CREATE TABLE IF NOT EXISTS round_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    round INTEGER NOT NULL,
+    filled INTEGER NOT NULL,
+    balls_remaining INTEGER NOT NULL,
+    agents_alive INTEGER NOT NULL,
+    battery INTEGER NOT NULL,
+    changed_cells INTEGER NOT NULL,
+    PRIMARY KEY (run_id, round)
+) WITHOUT ROWID;
+"""
+
+RoundMetrics = Tuple[int, int, int, int, int, int]
+
+
+def round_metrics(controller: 'Controller') -> RoundMetrics:
+    """
+    Returns the metrics of the latest round of a game: (round, filled holes, balls remaining, agents alive, battery
+    left, changed cells). All of them are counters kept up to date by the playground, so this is cheap.
+    """
+    playground = controller.playground
+    return (controller.round,
+            playground.filled_holes,
+            playground.balls_remaining,
+            sum(playground.agents_alive.values()),
+            sum(agent.battery for agent in controller.agents if agent.battery > 0),
+            len(controller.changed_cells))
+
+
+def game_result(controller: 'Controller', battery: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Returns the outcome of a finished game: filled holes, max score, success, rounds, battery used, chatbot calls and
+    why the game ended (see `Controller.end_reason`; None for a game stopped after a maximum number of rounds).
+
+    Args:
+        controller: The controller of the game.
+        battery: The initial battery level of the agents. If None, the battery each agent started with.
+    """
+    return {'filled': controller.playground.filled_holes,
+            'max_score': controller.get_max_score(),
+            'success': controller.agents_reached_max_score(),
+            'rounds': controller.round,
+            'battery_used': sum((battery if battery is not None else agent.initial_battery) - max(agent.battery, 0)
+                                for agent in controller.agents),
+            'llm_calls': sum(agent.llm_calls for agent in controller.agents),
+            'end_reason': controller.end_reason()}
+
+
+def _where(conditions: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    # conditions on the parameters of the games, e.g. {'battery': 30}
+    if not conditions:
+        return '', []
+    clauses = [f"json_extract(config, '$.{name}') = ?" for name in conditions]
+    return ' WHERE ' + ' AND '.join(clauses), list(conditions.values())
+
+
+def _check_names(names: Iterable[str]) -> None:
+    for name in names:
+        if not name.isidentifier():
+            raise ValueError(f"Invalid parameter name: {name}")
+
+
+class ResultStore:
+    """
+    The results database. Games are buffered and written in batches, each batch in one transaction, so recording
+    thousands of games doesn't cost thousands of commits. In a batch, each game is inserted on its own (to read the ID
+    that SQLite gave it; the statement is prepared once and reused), and the metrics of all their rounds in one
+    `executemany`. Call `flush` (or `close`, or use the store as a context manager) to write the buffered games.
+
+    The IDs of the games are assigned by SQLite when they are written, so several processes can write to the same
+    database.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        """
+        Args:
+            path: The path of the database file. It is created if it doesn't exist.
+            batch_size: The number of games written in one transaction.
+        """
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.executescript(SCHEMA)
+        # databases created before the end reason was recorded
+        if 'end_reason' not in [column[1] for column in self._connection.execute('PRAGMA table_info(runs)')]:
+            self._connection.execute('ALTER TABLE runs ADD COLUMN end_reason TEXT')
+        # the buffered games, each with the metrics of its rounds
+        self._runs: List[Tuple[tuple, List[RoundMetrics]]] = []
+
+    def __enter__(self) -> 'ResultStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add_run(self,
+                config: Dict[str, Any],
+                seed: int,
+                result: Dict[str, Any],
+                metrics: Iterable[RoundMetrics] = (),
+                version: Optional[str] = None) -> None:
+        """
+        Adds a game to the buffer, and writes the buffer if it is full.
+
+        Args:
+            config: The parameters of the game.
+            seed: The seed of the game.
+            result: The outcome of the game (see `game_result`).
+            metrics: The metrics of each round (see `round_metrics`).
+            version: The version of the simulation code (see `sweep.code_version`).
+        """
+        config_json = json.dumps(config, sort_keys=True)
+        self._runs.append(((config_json, hashlib.sha256(config_json.encode()).hexdigest()[:16], seed, version,
+                            SUCCESS if result['success'] else FAILURE, result['filled'], result['max_score'],
+                            result['rounds'], result['battery_used'], result.get('llm_calls', 0), time.time(),
+                            result.get('end_reason')),
+                           list(metrics)))
+        if len(self._runs) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> List[int]:
+        """
+        Writes the buffered games in one transaction: one insert per game, then the metrics of every round at once.
+
+        Returns:
+            The IDs of the written games, in the order they were added.
+        """
+        if not self._runs:
+            return []
+        run_ids = []
+        metrics = []
+        with self._connection:
+            for run, run_metrics in self._runs:
+                run_id = self._connection.execute('INSERT INTO runs (config, config_hash, seed, version, outcome, '
+                                                  'filled, max_score, rounds, battery_used, llm_calls, created, '
+                                                  'end_reason) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                                  run).lastrowid
+                run_ids.append(run_id)
+                metrics.extend((run_id, *row) for row in run_metrics)
+            self._connection.executemany('INSERT INTO round_metrics VALUES (?, ?, ?, ?, ?, ?, ?)', metrics)
+        self._runs = []
+        return run_ids
+
+    def close(self) -> None:
+        """
+        Writes the buffered games and closes the database.
+        """
+        if self._connection is None:
+            return
+        self.flush()
+        self._connection.close()
+        self._connection = None
+
+    def runs(self, where: Optional[Dict[str, Any]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Returns the latest games, newest first.
+
+        Args:
+            where: Conditions on the parameters of the games, e.g. {'battery': 30}.
+            limit: The maximum number of games.
+        """
+        self.flush()
+        _check_names(where or {})
+        clause, values = _where(where)
+        cursor = self._connection.execute(
+            'SELECT id, seed, outcome, end_reason, filled, max_score, rounds, battery_used, llm_calls, config FROM runs'
+            f'{clause} ORDER BY id DESC LIMIT ?', values + [limit])
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row), config=json.loads(row[-1])) for row in cursor]
+
+    def summary(self, group_by: Iterable[str] = (), where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregates the games by some of their parameters: number of games, success rate and mean filled holes,
+        rounds, battery used and chatbot calls.
+
+        Args:
+            group_by: The parameters to group by. Without them, all games form one group.
+            where: Conditions on the parameters of the games.
+        """
+        self.flush()
+        group_by = list(group_by)
+        _check_names(group_by + list(where or {}))
+        clause, values = _where(where)
+        keys = [f"json_extract(config, '$.{name}')" for name in group_by]
+        select = ''.join(f'{key} AS "{name}", ' for key, name in zip(keys, group_by))
+        group = f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}" if keys else ''
+        cursor = self._connection.execute(
+            f"SELECT {select}COUNT(*) AS games, AVG(outcome = '{SUCCESS}') AS success_rate, AVG(filled) AS filled, "
+            'AVG(rounds) AS rounds, AVG(battery_used) AS battery_used, AVG(llm_calls) AS llm_calls '
+            f'FROM runs{clause}{group}', values)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor if row[len(group_by)]]
+
+    def curve(self, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the mean of the per-round metrics of the games, round by round.
+
+        Args:
+            where: Conditions on the parameters of the games.
+        """
+        self.flush()
+        _check_names(where or {})
+        clause, values = _where(where)
+        cursor = self._connection.execute(
+            'SELECT round, COUNT(*) AS games, AVG(filled) AS filled, AVG(balls_remaining) AS balls_remaining, '
+            'AVG(agents_alive) AS agents_alive, AVG(battery) AS battery, AVG(changed_cells) AS changed_cells '
+            f'FROM round_metrics WHERE run_id IN (SELECT id FROM runs{clause}) GROUP BY round ORDER BY round', values)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+def _parse_conditions(conditions: List[str]) -> Dict[str, Any]:
+    parsed = {}
+    for condition in conditions:
+        name, _, value = condition.partition('=')
+        try:
+            parsed[name] = json.loads(value)
+        except json.JSONDecodeError:
+            parsed[name] = value
+    return parsed
+
+
+def _print_table(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        print('No games')
+        return
+    columns = list(rows[0])
+    print(' '.join(column.rjust(15) for column in columns))
+    for row in rows:
+        print(' '.join((f'{row[column]:.2f}' if isinstance(row[column], float) else str(row[column])).rjust(15)
+                       for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the results database.')
+    parser.add_argument('db', help='The database file')
+    parser.add_argument('command', choices=['summary', 'runs', 'curve'])
+    parser.add_argument('-by', nargs='*', default=[], help='Parameters to group the summary by')
+    parser.add_argument('-where', nargs='*', default=[], help='Conditions on the parameters, e.g. battery=30')
+    parser.add_argument('-limit', type=int, default=20, help='Number of games listed by runs (default: 20)')
+    args = parser.parse_args()
+
+    where = _parse_conditions(args.where)
+    with ResultStore(args.db) as store:
+        if args.command == 'summary':
+            _print_table(store.summary(group_by=args.by, where=where))
+        elif args.command == 'runs':
+            _print_table(store.runs(where=where, limit=args.limit))
+        else:
+            _print_table(store.curve(where=where))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
+
+import random_seed
+from consts import EMPTY
+from playground import Playground
+
+if TYPE_CHECKING:
+    from controller import Controller
+
+random = random_seed.RandomSeed().get_random_module()
+
+Position = Tuple[int, int]
+
+UNIFORM = 'uniform'
+CLUSTERED = 'clustered'
+MAZE = 'maze'
+
+DISTRIBUTIONS = (UNIFORM, CLUSTERED, MAZE)
+
+# tries to put a clustered item near a centre before it is put on a random free cell
+CLUSTER_TRIES = 20
+
+
+def uniform_positions(playground: 'Playground') -> Iterator[Position]:
+    """
+    Yields random empty cells of the playground, until there is none left.
+
+    The cells are picked lazily from the free-cell index, so each yielded cell must be filled before the next one is
+    asked for, otherwise it can be yielded again.
+    """
+    while len(playground.free_cells) > 0:
+        yield random.choice(playground.free_cells)
+
+
+def clustered_positions(playground: 'Playground', clusters: int = 3, spread: float = 2.0) -> Iterator[Position]:
+    """
+    Yields empty cells of the playground grouped around a few random centres, until there is none left. The offset of a
+    cell from its centre follows a normal distribution; when no empty cell is found near a centre, a random empty cell
+    is yielded instead.
+
+    Like `uniform_positions`, each yielded cell must be filled before the next one is asked for.
+
+    Args:
+        playground: The playground.
+        clusters: The number of centres.
+        spread: The standard deviation of the distance of a cell from its centre.
+    """
+    if len(playground.free_cells) == 0:
+        return
+    centres = [random.choice(playground.free_cells) for _ in range(max(1, clusters))]
+    while len(playground.free_cells) > 0:
+        for _ in range(CLUSTER_TRIES):
+            centre_x, centre_y = random.choice(centres)
+            position = (round(random.gauss(centre_x, spread)), round(random.gauss(centre_y, spread)))
+            if playground.is_valid_position(position) and playground.get_cell_state(position) == EMPTY:
+                break
+        else:
+            position = random.choice(playground.free_cells)
+        yield position
+
+
+def maze_cells(dimensions: Tuple[int, int], openness: float = 0.1) -> List[Position]:
+    """
+    Generates the walls of a maze with a randomized depth-first search. The corridors run along the even rows and
+    columns; a fraction of the remaining walls is knocked down, so the maze has loops and agents can pass each other.
+
+    Args:
+        dimensions: The width and height of the board.
+        openness: The fraction of the walls that is removed.
+
+    Returns:
+        The cells of the walls.
+    """
+    x_axis, y_axis = dimensions
+    passages = {(0, 0)}
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack[-1]
+        neighbours = [(x + dx, y + dy) for dx, dy in ((0, -2), (2, 0), (0, 2), (-2, 0))
+                      if 0 <= x + dx < x_axis and 0 <= y + dy < y_axis and (x + dx, y + dy) not in passages]
+        if not neighbours:
+            stack.pop()
+            continue
+        next_x, next_y = random.choice(neighbours)
+        passages.add(((x + next_x) // 2, (y + next_y) // 2))
+        passages.add((next_x, next_y))
+        stack.append((next_x, next_y))
+
+    return [(x, y) for y in range(y_axis) for x in range(x_axis)
+            if (x, y) not in passages and random.random() >= openness]
+
+
+def generate_positions(playground: 'Playground', spec: Dict, walls: bool = False) -> Iterator[Position]:
+    """
+    Yields the cells of a generated item layout (see `Scenario`).
+
+    Args:
+        playground: The playground.
+        spec: The distribution and its parameters, for example {"distribution": "clustered", "clusters": 4}.
+        walls: Whether the items are obstacles, the only items that can be laid out as a maze.
+
+    Raises:
+        ValueError: If the distribution is unknown.
+    """
+    distribution = spec.get('distribution', UNIFORM)
+    if distribution == MAZE and not walls:
+        raise ValueError("Only obstacles can be laid out as a maze")
+    if distribution == UNIFORM:
+        return uniform_positions(playground)
+    if distribution == CLUSTERED:
+        return clustered_positions(playground, clusters=spec.get('clusters', 3), spread=spec.get('spread', 2.0))
+    if distribution == MAZE:
+        return iter(maze_cells(playground.dimensions, openness=spec.get('openness', 0.1)))
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def read_agents_file(path: str) -> Iterator[Tuple[int, int, int]]:
+    """
+    Streams agents from a text file with one "x,y,type" line per agent (the type may be left out). Empty lines and
+    lines starting with '#' are skipped.
+    """
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            values = [int(value) for value in line.split(',')]
+            yield values[0], values[1], values[2] if len(values) > 2 else 1
+
+
+class Scenario:
+    """
+    Describes a game: the board, the agents, and the holes, balls and obstacles on the board. A scenario is read from a
+    JSON or TOML file, for example:
+
+        {
+            "dimensions": [60, 40],
+            "seed": 7,
+            "battery": 80,
+            "obstacles": {"distribution": "maze", "openness": 0.3},
+            "agents": {"teams": {"1": 500, "2": 500}, "distribution": "clustered", "clusters": 2},
+            "holes": [[3, 4], [10, 12]],
+            "balls": {"count": 200, "distribution": "clustered", "clusters": 5, "spread": 3}
+        }
+
+    Agents, holes, balls and obstacles are either a list of cells ([x, y], or [x, y, type] for agents) or a generator:
+    a count and a distribution (uniform, clustered, or maze for obstacles). Agents may also be streamed from a text file
+    with {"file": "fleet.txt"}; a relative path is relative to the scenario file.
+    The items are put on the board in this order: obstacles, agents, holes, balls.
+    """
+
+    def __init__(self,
+                 dimensions: Tuple[int, int],
+                 agents: Union[List, Dict, None] = None,
+                 holes: Union[List, Dict, None] = None,
+                 balls: Union[List, Dict, None] = None,
+                 obstacles: Union[List, Dict, None] = None,
+                 field_of_view: int = 3,
+                 battery: int = 30,
+                 seed: Optional[int] = None,
+                 base_dir: str = '.'):
+        """
+        Args:
+            dimensions: The width and height of the board.
+            agents: The agents, as a list of [x, y, type] or a generator.
+            holes: The holes, as a list of [x, y] or a generator.
+            balls: The balls, as a list of [x, y] or a generator.
+            obstacles: The obstacles, as a list of [x, y] or a generator.
+            field_of_view: The field of view of the agents.
+            battery: The initial battery level of the agents.
+            seed: The seed of the random number generator, used if no seed is given on the command line.
+            base_dir: The directory that relative paths are relative to.
+        """
+        self.dimensions = (int(dimensions[0]), int(dimensions[1]))
+        self.agents = agents if agents is not None else []
+        self.holes = holes if holes is not None else []
+        self.balls = balls if balls is not None else []
+        self.obstacles = obstacles if obstacles is not None else []
+        self.field_of_view = field_of_view
+        self.battery = battery
+        self.seed = seed
+        self.base_dir = base_dir
+
+    @staticmethod
+    def load(path: str) -> 'Scenario':
+        """
+        Reads a scenario from a JSON file, or a TOML file if the file name ends with .toml.
+
+        Raises:
+            ValueError: If the file doesn't describe a scenario.
+        """
+        if path.endswith('.toml'):
+            import tomllib
+            with open(path, 'rb') as file:
+                data = tomllib.load(file)
+        else:
+            with open(path) as file:
+                data = json.load(file)
+        return Scenario.from_dict(data, base_dir=os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def from_dict(data: Dict, base_dir: str = '.') -> 'Scenario':
+        """
+        Creates a scenario from the content of a scenario file.
+
+        Raises:
+            ValueError: If the dimensions are missing.
+        """
+        if 'dimensions' not in data:
+            raise ValueError("A scenario needs the dimensions of the board")
+        return Scenario(dimensions=data['dimensions'],
+                        agents=data.get('agents'),
+                        holes=data.get('holes'),
+                        balls=data.get('balls'),
+                        obstacles=data.get('obstacles'),
+                        field_of_view=data.get('field_of_view', 3),
+                        battery=data.get('battery', 30),
+                        seed=data.get('seed'),
+                        base_dir=base_dir)
+
+    def create_playground(self, fast_drift: bool = False) -> 'Playground':
+        """
+        Creates an empty playground of the size of the scenario. The items are put on it by `populate`.
+        """
+        return Playground(dimensions=self.dimensions, num_holes=0, num_balls=0, field_of_view=self.field_of_view,
+                          fast_drift=fast_drift)
+
+    def populate(self, controller: 'Controller', chatbot: bool = True) -> 'Controller':
+        """
+        Puts the obstacles, the agents, the holes and the balls of the scenario on the playground of a controller.
+
+        Args:
+            controller: The controller, with a playground created by `create_playground`.
+            chatbot: A boolean value indicating whether the agents use the chatbot.
+
+        Raises:
+            ValueError: If an item can't be put on its cell.
+
+        Returns:
+            The controller.
+        """
+        playground = controller.playground
+        self._place(self.obstacles, playground, playground.add_obstacle, 'obstacle')
+        controller.add_agents(self.agent_specs(playground), chatbot=chatbot, field_of_view=self.field_of_view,
+                              battery=self.battery)
+        self._place(self.holes, playground, playground.add_hole, 'hole')
+        self._place(self.balls, playground, playground.add_ball, 'ball')
+        # the game ends when all of them are placed, so place_holes_and_balls doesn't add random ones
+        playground.num_obstacles = len(playground.obstacles)
+        playground.num_holes = len(playground.holes)
+        playground.num_balls = playground.balls_remaining
+        return controller
+
+    def agent_specs(self, playground: 'Playground') -> Iterator[Tuple[int, int, int]]:
+        """
+        Yields the agents of the scenario as (x, y, type) tuples, one at a time, so a large fleet is never held in
+        memory. Generated agents are placed team by team.
+        """
+        if isinstance(self.agents, list):
+            for agent in self.agents:
+                yield agent[0], agent[1], agent[2] if len(agent) > 2 else 1
+            return
+        if 'file' in self.agents:
+            yield from read_agents_file(os.path.join(self.base_dir, self.agents['file']))
+            return
+        for team, count in self.agents.get('teams', {'1': 1}).items():
+            positions = generate_positions(playground, self.agents)
+            for _ in range(count):
+                position = next(positions, None)
+                if position is None:
+                    raise ValueError(f"No empty cell left for an agent of team {team}")
+                yield position[0], position[1], int(team)
+
+    @staticmethod
+    def _place(spec: Union[List, Dict], playground: 'Playground', add, name: str) -> None:
+        if isinstance(spec, list):
+            for x, y in spec:
+                if not add((x, y)):
+                    raise ValueError(f"Can't put a {name} at position ({x}, {y})")
+            return
+        positions = generate_positions(playground, spec, walls=name == 'obstacle')
+        if spec.get('distribution') == MAZE:
+            for position in positions:
+                add(position)
+            return
+        for _ in range(spec.get('count', 0)):
+            position = next(positions, None)
+            if position is None:
+                break
+            add(position)
@@ -0,0 +1,295 @@
+"""
+Zobrist-style hashing of the state of a game, and hash logs to check that two runs (or two versions of the engine)
+played the same game.
+
+Usage: python state_hash.py RUN_A.hashes RUN_B.hashes
+"""
+import argparse
+import mmap
+import struct
+from functools import lru_cache
+from typing import BinaryIO, Dict, Optional, Tuple, TYPE_CHECKING
+
+from consts import EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE, AGENT, UP, RIGHT, DOWN, LEFT
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from playground import Playground
+
+MASK = (1 << 64) - 1
+
+# kinds of keys
+CELL = 0
+AGENT_STATE = 1
+# the position, direction and ball of an agent, without its battery (see deadlock.py)
+AGENT_MOTION = 2
+
+# the base state of a cell, without the agents on it (they are hashed by their position); an empty cell has no key
+_BASE_CODES = {EMPTY: 0, HOLE: 1, BALL: 2, FILLED_HOLE: 3, OBSTACLE: 4}
+_DIRECTION_CODES = {UP: 0, RIGHT: 1, DOWN: 2, LEFT: 3}
+
+
+@lru_cache(maxsize=1 << 16)
+def mix(value: int) -> int:
+    """
+    The splitmix64 finalizer: a fixed pseudo-random permutation of 64-bit integers. The keys are computed with it
+    instead of being drawn from a table, so they are the same in every process; the keys in use are cached.
+    """
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+@lru_cache(maxsize=1 << 16)
+def cell_code(label: str) -> int:
+    """
+    Returns the code of the item of a cell label (0 for a cell without an item). There are a few labels per agent,
+    so they are cached.
+    """
+    return _BASE_CODES.get(label.partition(AGENT + '-')[0].rstrip(','), 0)
+
+
+def cell_key(position: Tuple[int, int], code: int) -> int:
+    """
+    Returns the key of the item of a cell (0 for a cell without an item). Boards up to 2^24 cells wide are supported.
+    """
+    if code == 0:
+        return 0
+    return mix(CELL | code << 4 | position[0] << 8 | position[1] << 32)
+
+
+def agent_key(agent: 'Agent') -> int:
+    """
+    Returns the key of the state of an agent: its position, direction, battery and ball. Agents are identified by the
+    order they were put on the board, not by their random IDs, so two runs of the same game have the same keys. Up to
+    2^24 agents and boards up to 2^16 cells wide are supported.
+    """
+    x, y = agent.position
+    return mix(mix(AGENT_STATE | agent.state_index << 4 | (x & 0xFFFF) << 28 | (y & 0xFFFF) << 44) ^
+               ((agent.battery & 0xFFFFFFFF) << 3 | _DIRECTION_CODES[agent.direction] << 1 | int(agent.has_ball)))
+
+
+class StateHash:
+    """
+    The hash of the state of a game: the item of every cell of the grid and the position, direction, battery and ball
+    of every agent. It is the XOR of the keys of all of them, so each change of a cell (see
+    `Playground.set_cell_state`) or of an agent updates it in O(1), and equal states have equal hashes whatever the
+    order of the changes.
+
+    An agent changes several fields in a move, so a change of an agent only marks it (see `touch_agent`); its key is
+    replaced when the hash is read.
+    """
+
+    def __init__(self):
+        self._value = 0
+        # the hash of the items of the grid alone, which doesn't change while the agents only move
+        self.cells = 0
+        # the key of every agent by its state index, and the agents changed since the hash was last read
+        self._agent_keys: Dict[int, int] = {}
+        self._touched_agents: Dict[int, 'Agent'] = {}
+
+    @property
+    def value(self) -> int:
+        """
+        The hash of the current state.
+        """
+        if self._touched_agents:
+            for index, agent in self._touched_agents.items():
+                key = agent_key(agent)
+                self._value ^= self._agent_keys[index] ^ key
+                self._agent_keys[index] = key
+            self._touched_agents.clear()
+        return self._value
+
+    def __deepcopy__(self, memo: dict) -> 'StateHash':
+        # a copy of the playground (see `Draw`) must not copy the agents with it, so the pending agents are hashed
+        # first and the copy only keeps integers
+        copy = StateHash()
+        copy._value = self.value
+        copy.cells = self.cells
+        copy._agent_keys = self._agent_keys.copy()
+        return copy
+
+    def change_cell(self, position: Tuple[int, int], old_label: str, new_label: str) -> None:
+        """
+        Updates the hash with the change of a cell.
+        """
+        old_code, new_code = cell_code(old_label), cell_code(new_label)
+        # most changes are agents entering or leaving a cell, which don't change its item
+        if old_code != new_code:
+            change = cell_key(position, old_code) ^ cell_key(position, new_code)
+            self._value ^= change
+            self.cells ^= change
+
+    def touch_agent(self, agent: 'Agent') -> None:
+        """
+        Marks an agent whose position, direction, battery or ball changed.
+        """
+        self._touched_agents[agent.state_index] = agent
+
+    def add_agent(self, agent: 'Agent', index: int) -> None:
+        """
+        Adds an agent to the hash. Later changes of the agent update the hash by themselves.
+
+        Args:
+            agent: The Agent object.
+            index: The index of the agent, its order of arrival on the board.
+        """
+        agent.state_index = index
+        agent.state_hash = self
+        key = agent_key(agent)
+        self._agent_keys[index] = key
+        self._value ^= key
+
+
+# File layout (little endian): magic, version, then one record per round (round number, hash)
+MAGIC = b'BHSH'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sH')
+_RECORD = struct.Struct('<IQ')
+
+
+class HashLog:
+    """
+    Writes the hash of the state at the end of every round to a file while the game is running. Two logs can be
+    compared with `first_divergence`.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: The path of the hash log. An existing file is overwritten.
+        """
+        self.path = path
+        self._file: Optional[BinaryIO] = None
+
+    def start(self, playground: 'Playground', iteration: int = 0) -> 'HashLog':
+        """
+        Creates the file and writes the hash of the current state as the first round.
+
+        Args:
+            playground: The Playground object of the game; its hash covers the agents too.
+            iteration: The number of the current round.
+
+        Returns:
+            self: Returns the HashLog instance.
+        """
+        self._file = open(self.path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+        return self.write_round(playground, iteration)
+
+    def write_round(self, playground: 'Playground', iteration: int) -> 'HashLog':
+        """
+        Appends the hash of the state at the end of a round.
+
+        Returns:
+            self: Returns the HashLog instance.
+        """
+        self._file.write(_RECORD.pack(iteration, playground.state_hash.value))
+        return self
+
+    def close(self) -> None:
+        """
+        Closes the file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class HashLogReader:
+    """
+    Reads a hash log through `mmap`; the records have a fixed size, so any of them is read without the others.
+    """
+
+    def __init__(self, path: str):
+        """
+        Raises:
+            ValueError: If the file is not a hash log or has an unsupported version.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a hash log")
+        if version != VERSION:
+            raise ValueError(f"Unsupported hash log version: {version}")
+        # a run that crashed may have left half a record
+        self._count = (len(self._mmap) - _HEADER.size) // _RECORD.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def read(self, index: int) -> Tuple[int, int]:
+        """
+        Returns the (round, hash) record at an index.
+        """
+        return _RECORD.unpack_from(self._mmap, _HEADER.size + index * _RECORD.size)
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+
+def first_divergence(first: HashLogReader, second: HashLogReader) -> Tuple[Optional[int], int, int]:
+    """
+    Finds the first round in which two runs had different states, by binary search over the rounds both logs
+    recorded, so only O(log n) records are read.
+
+    The search assumes that the runs don't become identical again once they have diverged, which holds for runs that
+    start from the same state: a different state hardly ever leads back to the same one.
+
+    Returns:
+        The first diverging round (None if every common round matches) and the first and last common rounds.
+
+    Raises:
+        ValueError: If the logs have no round in common.
+    """
+    if len(first) == 0 or len(second) == 0:
+        raise ValueError("A hash log is empty")
+    # each log covers consecutive rounds, from its first record
+    first_start, second_start = first.read(0)[0], second.read(0)[0]
+    start = max(first_start, second_start)
+    end = min(first_start + len(first), second_start + len(second)) - 1
+    if start > end:
+        raise ValueError("The hash logs have no round in common")
+
+    def matches(round_number: int) -> bool:
+        return first.read(round_number - first_start)[1] == second.read(round_number - second_start)[1]
+
+    if matches(end):
+        return None, start, end
+    low, high = start, end
+    while low < high:
+        middle = (low + high) // 2
+        if matches(middle):
+            low = middle + 1
+        else:
+            high = middle
+    return low, start, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the first round in which two runs diverge.')
+    parser.add_argument('first', help='The hash log of the first run')
+    parser.add_argument('second', help='The hash log of the second run')
+    args = parser.parse_args()
+
+    first, second = HashLogReader(args.first), HashLogReader(args.second)
+    divergence, start, end = first_divergence(first, second)
+    if divergence is None:
+        print(f"The runs match in rounds {start} to {end}")
+    else:
+        print(f"The runs diverge at round {divergence}" +
+              (f" (they match up to round {divergence - 1})" if divergence > start else ''))
+    if len(first) != len(second):
+        print(f"The runs have {len(first)} and {len(second)} rounds")
+    first.close()
+    second.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Runs a parameter sweep: every point of a parameter grid (or random samples of it) is played on every seed, in a pool
+of processes. Results are kept in a local cache keyed by the parameters, the seed and a hash of the simulation code,
+so running a sweep again, or a larger one, only plays the points that are not in the cache yet.
+
+Usage: python sweep.py [-dim 7,7 10,10] [-ball 3 5] [-hole 3 5] [-battery 20 30] [-fov 3 5] [-agents 1 2] [-seeds N]
+                       [-max-rounds N] [-random N] [-workers N] [-cache PATH] [-db PATH]
+"""
+import argparse
+import ast
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from controller import Controller
+from feasibility import FeasibilityChecker
+from playground import Playground
+from random_seed import RandomSeed
+from results import ResultStore, game_result, round_metrics
+
+Point = Dict[str, Any]
+
+# a game is stopped after max_rounds rounds, since agents can block each other forever
+DEFAULT_POINT: Point = {'dim': '7,7', 'ball': 5, 'hole': 5, 'battery': 30, 'fov': 3, 'agents': 1, 'max_rounds': 500}
+
+
+def simulation_modules() -> List[str]:
+    """
+    Returns the files of the modules of the project that this module imports, directly or through other modules of
+    the project: the code that decides the result of a game. They are found by reading the import statements, so
+    a module is included even if it is only imported inside a function.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    pending = [os.path.basename(__file__)]
+    while pending:
+        module = pending.pop()
+        if module in found:
+            continue
+        found.add(module)
+        with open(os.path.join(directory, module), 'rb') as file:
+            tree = ast.parse(file.read(), filename=module)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                file_name = name.split('.')[0] + '.py'
+                if os.path.isfile(os.path.join(directory, file_name)):
+                    pending.append(file_name)
+    return sorted(found)
+
+
+def code_version() -> str:
+    """
+    Returns a hash of the source of the simulation modules (see `simulation_modules`), so results of an older version
+    of the game are not reused.
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in simulation_modules():
+        with open(os.path.join(directory, module), 'rb') as file:
+            digest.update(module.encode() + b'\0' + file.read())
+    return digest.hexdigest()[:16]
+
+
+def expand_grid(space: Dict[str, List]) -> List[Point]:
+    """
+    Returns every combination of the values of the parameters.
+
+    Args:
+        space: The values of each parameter.
+    """
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def sample_space(space: Dict[str, List], samples: int, seed: int = 0) -> List[Point]:
+    """
+    Returns random combinations of the values of the parameters, without repetitions (random search).
+
+    Args:
+        space: The values of each parameter.
+        samples: The number of combinations. It is capped by the size of the grid.
+        seed: The seed of the sampling, so the same sweep samples the same points.
+    """
+    grid = expand_grid(space)
+    return random.Random(seed).sample(grid, min(samples, len(grid)))
+
+
+def point_key(point: Point, seed: int, version: str) -> str:
+    """
+    Returns the cache key of a point played on a seed with a version of the code.
+    """
+    return hashlib.sha256(json.dumps([point, seed, version], sort_keys=True).encode()).hexdigest()
+
+
+def run_point(point: Point, seed: int) -> Dict[str, Any]:
+    """
+    Plays one game of a single team without the console and the chatbot. The game is stopped as soon as it provably
+    can't be won anymore (see `FeasibilityChecker`), which doesn't change its outcome, only its number of rounds.
+
+    Args:
+        point: The parameters of the game: dim, ball, hole, battery, fov, agents and max_rounds (see DEFAULT_POINT).
+        seed: The seed of the game.
+
+    Returns:
+        The outcome of the game (see `results.game_result`), with the metrics of each round under 'metrics'.
+    """
+    point = {**DEFAULT_POINT, **point}
+    RandomSeed().set_seed(seed)
+    dim_x, dim_y = map(int, str(point['dim']).split(','))
+    playground = Playground(dimensions=(dim_x, dim_y), num_balls=point['ball'], num_holes=point['hole'],
+                            field_of_view=point['fov'])
+    controller = Controller(playground=playground, feasibility_checker=FeasibilityChecker())
+    controller.create_agents(None, point['agents'], chatbot=False, field_of_view=point['fov'],
+                             battery=point['battery'])
+    controller.start()
+    metrics = [round_metrics(controller) for _ in controller.run(max_rounds=point['max_rounds'])]
+    controller.stop()
+    return {**game_result(controller, point['battery']), 'metrics': metrics}
+
+
+def _run_job(job: Tuple[str, Point, int]) -> Tuple[str, Dict[str, Any]]:
+    key, point, seed = job
+    return key, run_point(point, seed)
+
+
+class ResultCache:
+    """
+    The results of the played points, in a JSON lines file. Every result is appended as soon as it is known, so an
+    interrupted sweep keeps the points it has played.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.results: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line of a sweep that was killed while writing
+                        continue
+                    self.results[entry['key']] = entry
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.results.get(key)
+
+    def add(self, key: str, point: Point, seed: int, version: str, result: Dict[str, Any]) -> None:
+        entry = {'key': key, 'point': point, 'seed': seed, 'version': version, 'result': result}
+        self.results[key] = entry
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(entry, sort_keys=True) + '\n')
+
+
+class Sweep:
+    """
+    Plays a list of points on a list of seeds, skipping the (point, seed, code version) combinations in the cache.
+    """
+
+    def __init__(self,
+                 points: List[Point],
+                 seeds: List[int],
+                 cache: ResultCache,
+                 workers: Optional[int] = None,
+                 store: Optional[ResultStore] = None):
+        """
+        Args:
+            points: The parameters of the games. Missing parameters take their default value (see DEFAULT_POINT).
+            seeds: The seeds every point is played on.
+            cache: The result cache.
+            workers: The number of processes. With 1 worker, the games are played in this process; if None, one process
+                     per CPU is used.
+            store: If set, the games that are played are also recorded in this results database, with their
+                   per-round metrics.
+        """
+        self.points = [{**DEFAULT_POINT, **point} for point in points]
+        self.seeds = seeds
+        self.cache = cache
+        self.workers = workers
+        self.store = store
+        self.version = code_version()
+        self.played = 0
+
+    def jobs(self) -> Iterator[Tuple[str, Point, int]]:
+        """
+        Yields the (key, point, seed) combinations that are not in the cache yet.
+        """
+        for point in self.points:
+            for seed in self.seeds:
+                key = point_key(point, seed, self.version)
+                if key not in self.cache:
+                    yield key, point, seed
+
+    def run(self, on_result: Optional[Callable[[Point, int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Plays the missing games and returns the cache entries of all points and seeds.
+
+        Args:
+            on_result: Called with the point, the seed and the result of each game that is played.
+        """
+        jobs = {key: (point, seed) for key, point, seed in self.jobs()}
+        work = [(key, point, seed) for key, (point, seed) in jobs.items()]
+        if self.workers == 1 or not work:
+            self._record(map(_run_job, work), jobs, on_result)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                self._record(pool.map(_run_job, work, chunksize=4), jobs, on_result)
+        return [self.cache.get(point_key(point, seed, self.version)) for point in self.points for seed in self.seeds]
+
+    def _record(self, results, jobs, on_result) -> None:
+        for key, result in results:
+            point, seed = jobs[key]
+            metrics = result.pop('metrics')
+            self.cache.add(key, point, seed, self.version, result)
+            if self.store is not None:
+                self.store.add_run(point, seed, result, metrics, version=self.version)
+            self.played += 1
+            if on_result is not None:
+                on_result(point, seed, result)
+
+
+def summarize(entries: List[Dict[str, Any]]) -> List[Tuple[Point, int, float, float, float]]:
+    """
+    Groups the results by point: (point, games, success rate, mean filled holes, mean rounds).
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        groups.setdefault(json.dumps(entry['point'], sort_keys=True), []).append(entry['result'])
+    summary = []
+    for point, results in groups.items():
+        games = len(results)
+        summary.append((json.loads(point), games,
+                        sum(result['success'] for result in results) / games,
+                        sum(result['filled'] for result in results) / games,
+                        sum(result['rounds'] for result in results) / games))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parameter sweep with a result cache.')
+    parser.add_argument('-dim', nargs='+', default=[DEFAULT_POINT['dim']], help='Dimensions, for example 7,7 10,10')
+    parser.add_argument('-ball', nargs='+', type=int, default=[DEFAULT_POINT['ball']], help='Numbers of balls')
+    parser.add_argument('-hole', nargs='+', type=int, default=[DEFAULT_POINT['hole']], help='Numbers of holes')
+    parser.add_argument('-battery', nargs='+', type=int, default=[DEFAULT_POINT['battery']], help='Battery levels')
+    parser.add_argument('-fov', nargs='+', type=int, default=[DEFAULT_POINT['fov']], help='Fields of view')
+    parser.add_argument('-agents', nargs='+', type=int, default=[DEFAULT_POINT['agents']], help='Numbers of agents')
+    parser.add_argument('-max-rounds', dest='max_rounds', type=int, default=DEFAULT_POINT['max_rounds'],
+                        help=f'Maximum number of rounds of a game (default: {DEFAULT_POINT["max_rounds"]})')
+    parser.add_argument('-seeds', type=int, default=10, help='Number of seeds per point (default: 10)')
+    parser.add_argument('-random', type=int, default=None,
+                        help='Play this many random points of the grid instead of the whole grid (default: None)')
+    parser.add_argument('-workers', type=int, default=None, help='Number of processes (default: one per CPU)')
+    parser.add_argument('-cache', type=str, default='sweep_cache.jsonl',
+                        help='Result cache file (default: sweep_cache.jsonl)')
+    parser.add_argument('-db', type=str, default=None,
+                        help='Also record the games that are played in this results database (default: None)')
+    args = parser.parse_args()
+
+    space = {'dim': args.dim, 'ball': args.ball, 'hole': args.hole, 'battery': args.battery, 'fov': args.fov,
+             'agents': args.agents, 'max_rounds': [args.max_rounds]}
+    points = sample_space(space, args.random) if args.random else expand_grid(space)
+    store = ResultStore(args.db) if args.db else None
+    sweep = Sweep(points, list(range(args.seeds)), ResultCache(args.cache), workers=args.workers, store=store)
+    entries = sweep.run()
+    if store is not None:
+        store.close()
+    print(f'{sweep.played} games played, {len(entries) - sweep.played} taken from the cache')
+
+    names = [name for name in sorted(space) if len(space[name]) > 1] or sorted(space)
+    print(''.join(name.rjust(9) for name in names) + f'{"games":>8}{"success":>9}{"filled":>8}{"rounds":>8}')
+    for point, games, success, filled, rounds in summarize(entries):
+        print(''.join(str(point[name]).rjust(9) for name in names) +
+              f'{games:>8}{success:>9.0%}{filled:>8.2f}{rounds:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
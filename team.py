@@ -0,0 +1,238 @@
+import threading
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from allocation import TaskAllocator
+    from message_bus import MessageBus
+
+
+class LockTable:
+    """
+    The target cells locked by the members of a team: a position can be locked by one agent at a time.
+
+    All checks are O(1). Acquiring and releasing a lock are atomic, so the table can be shared by agents that decide in
+    parallel threads.
+    """
+
+    def __init__(self):
+        self._owners: Dict[Tuple[int, int], str] = {}
+        self._locks_by_owner: Dict[str, Set[Tuple[int, int]]] = {}
+        self._mutex = threading.Lock()
+
+    def acquire(self, position: Tuple[int, int], agent: 'Agent') -> bool:
+        """
+        Locks a position for an agent.
+
+        Args:
+            position: A tuple representing the position of the cell to lock.
+            agent: The Agent object that locks the cell.
+
+        Returns:
+            True if the agent holds the lock, False if the cell is locked by another agent.
+        """
+        with self._mutex:
+            owner = self._owners.get(position)
+            if owner is not None:
+                return owner == agent.agent_id
+            self._owners[position] = agent.agent_id
+            self._locks_by_owner.setdefault(agent.agent_id, set()).add(position)
+            return True
+
+    def release(self, position: Tuple[int, int], agent: 'Agent') -> bool:
+        """
+        Unlocks a position, if it is locked by the given agent.
+
+        Args:
+            position: A tuple representing the position of the cell to unlock.
+            agent: The Agent object that holds the lock.
+
+        Returns:
+            True if the lock was released, False if the agent did not hold it.
+        """
+        with self._mutex:
+            if self._owners.get(position) != agent.agent_id:
+                return False
+            del self._owners[position]
+            self._locks_by_owner[agent.agent_id].discard(position)
+            return True
+
+    def release_all(self, agent: 'Agent') -> int:
+        """
+        Releases every lock of an agent, for example when its lease ends because it ran out of battery.
+
+        Args:
+            agent: The Agent object whose locks are released.
+
+        Returns:
+            The number of released locks.
+        """
+        with self._mutex:
+            positions = self._locks_by_owner.pop(agent.agent_id, set())
+            for position in positions:
+                del self._owners[position]
+            return len(positions)
+
+    def is_locked(self, position: Tuple[int, int]) -> bool:
+        """
+        Checks if a position is locked by any agent.
+
+        Args:
+            position: A tuple representing the position of the cell.
+
+        Returns:
+            True if the cell is locked.
+        """
+        return position in self._owners
+
+    def owner(self, position: Tuple[int, int]) -> Optional[str]:
+        """
+        Returns the ID of the agent that locked a position.
+
+        Args:
+            position: A tuple representing the position of the cell.
+
+        Returns:
+            The ID of the owner, or None if the cell is not locked.
+        """
+        return self._owners.get(position)
+
+    def __getstate__(self) -> dict:
+        # a mutex cannot be pickled (see Checkpointer); a new one is created when the table is restored
+        state = self.__dict__.copy()
+        del state['_mutex']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._mutex = threading.Lock()
+
+
+class Team:
+    """
+    The members of a team and their communication channel.
+
+    A member publishes what it learns on the channel, and the other members receive it. If `radio_range` is set, only
+    the members within that Manhattan distance of the sender receive the message. Without a message bus the message
+    is delivered immediately; with one it is posted to the bus and delivered at the end of the round.
+    """
+
+    def __init__(self, team_id: int, radio_range: Optional[int] = None, bus: Optional['MessageBus'] = None):
+        """
+        Args:
+            team_id: The ID of the team (the type of its agents).
+            radio_range: The maximum Manhattan distance between the sender and a receiver of a message. If None, every
+                         member receives every message of the team.
+            bus: The message bus that batches the messages of the team. If None, messages are delivered immediately.
+        """
+        self.team_id = team_id
+        self.radio_range = radio_range
+        self.bus = bus
+        self.members: List['Agent'] = []
+        self.member_ids: Set[str] = set()
+        self.locks = LockTable()
+        # if set, the targets of the team are assigned by this allocator instead of the one of the controller
+        self.allocator: Optional['TaskAllocator'] = None
+
+    def join(self, agent: 'Agent') -> bool:
+        """
+        Adds an agent to the team.
+
+        Args:
+            agent: The Agent object that joins the team.
+
+        Returns:
+            True if the agent joined the team, False if it was already a member.
+        """
+        if agent.agent_id in self.member_ids:
+            return False
+        self.members.append(agent)
+        self.member_ids.add(agent.agent_id)
+        agent.team = self
+        return True
+
+    def publish(self,
+                sender: 'Agent',
+                info_type: str,
+                status: int,
+                positions: List[Tuple[int, int]]) -> int:
+        """
+        Sends information to the other members of the team (see `Agent.receive_friends_info_v2`).
+
+        Args:
+            sender: The Agent object that sends the information.
+            info_type: A string representing the type of information (BALL, HOLE, FILLED_HOLE, GONE, VISITED).
+            status: 1 to add the information to the receivers' knowledge, -1 to remove it.
+            positions: A list of tuples representing the positions of the items.
+
+        Returns:
+            The number of members the information was sent to.
+        """
+        receivers = [member for member in self.members if member is not sender and self.in_range(sender, member)]
+        if self.bus is not None:
+            self.bus.post(receivers, info_type, status, positions)
+            return len(receivers)
+
+        for member in receivers:
+            member.receive_friends_info_v2(info_type, status, positions)
+        return len(receivers)
+
+    def in_range(self, sender: 'Agent', receiver: 'Agent') -> bool:
+        """
+        Checks if a member can hear a message of another member.
+
+        Args:
+            sender: The Agent object that sends the message.
+            receiver: The Agent object that should receive the message.
+
+        Returns:
+            True if the receiver is within the radio range of the sender (always True without a radio range).
+        """
+        if self.radio_range is None:
+            return True
+        (x1, y1), (x2, y2) = sender.position, receiver.position
+        return abs(x1 - x2) + abs(y1 - y2) <= self.radio_range
+
+
+class TeamRegistry:
+    """
+    Holds the teams of a game; every agent is registered once, in the team of its type.
+    """
+
+    def __init__(self, radio_range: Optional[int] = None, bus: Optional['MessageBus'] = None):
+        """
+        Args:
+            radio_range: The radio range of the teams (see `Team`). If None, communication is not limited by distance.
+            bus: The message bus shared by the teams. If None, messages are delivered immediately.
+        """
+        self.radio_range = radio_range
+        self.bus = bus
+        self.teams: Dict[int, Team] = {}
+
+    def register(self, agent: 'Agent') -> Team:
+        """
+        Adds an agent to the team of its type, creating the team if needed.
+
+        Args:
+            agent: The Agent object to register.
+
+        Returns:
+            The team of the agent.
+        """
+        team = self.teams.get(agent.type)
+        if team is None:
+            team = self.teams[agent.type] = Team(agent.type, self.radio_range, self.bus)
+        team.join(agent)
+        return team
+
+    def get_team(self, team_id: int) -> Optional[Team]:
+        """
+        Returns the team with the given ID.
+
+        Args:
+            team_id: The ID of the team.
+
+        Returns:
+            The Team object, or None if no agent of this team has been registered.
+        """
+        return self.teams.get(team_id)
@@ -0,0 +1,86 @@
+import itertools
+import random
+import unittest
+
+from allocation import AUCTION, GREEDY, HUNGARIAN, assign_auction, assign_greedy, solve
+
+
+def total_cost(costs, assignment):
+    return sum(costs[row][column] for row, column in enumerate(assignment) if column != -1)
+
+
+def brute_force(costs):
+    """
+    Returns the minimum cost of assigning min(rows, columns) pairs, each row and column used at most once.
+    """
+    rows, columns = len(costs), len(costs[0])
+    if rows <= columns:
+        return min(sum(costs[row][column] for row, column in enumerate(permutation))
+                   for permutation in itertools.permutations(range(columns), rows))
+    return min(sum(costs[row][column] for column, row in enumerate(permutation))
+               for permutation in itertools.permutations(range(rows), columns))
+
+
+def random_costs(generator, rows, columns, integer=True):
+    return [[generator.randint(0, 20) if integer else generator.uniform(0, 20) for _ in range(columns)]
+            for _ in range(rows)]
+
+
+class AllocationTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(8)
+        self.shapes = [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (2, 5), (3, 6), (5, 2), (6, 3), (4, 1)]
+
+    def assert_valid(self, costs, assignment):
+        self.assertEqual(len(assignment), len(costs))
+        columns = [column for column in assignment if column != -1]
+        self.assertEqual(len(columns), len(set(columns)))
+        self.assertEqual(len(columns), min(len(costs), len(costs[0])))
+
+    def test_hungarian_finds_the_minimum_cost(self):
+        for rows, columns in self.shapes:
+            for _ in range(5):
+                costs = random_costs(self.random, rows, columns)
+                assignment = solve(costs, HUNGARIAN)
+                self.assert_valid(costs, assignment)
+                self.assertEqual(total_cost(costs, assignment), brute_force(costs))
+
+    def test_auction_is_optimal_for_integer_costs(self):
+        for rows, columns in self.shapes:
+            for _ in range(5):
+                costs = random_costs(self.random, rows, columns)
+                assignment = solve(costs, AUCTION)
+                self.assert_valid(costs, assignment)
+                self.assertEqual(total_cost(costs, assignment), brute_force(costs))
+
+    def test_auction_stays_within_n_epsilon_of_the_minimum(self):
+        epsilon = 0.5
+        for rows, columns in self.shapes:
+            if rows > columns:
+                continue
+            for _ in range(5):
+                costs = random_costs(self.random, rows, columns, integer=False)
+                assignment = assign_auction(costs, epsilon=epsilon)
+                self.assert_valid(costs, assignment)
+                # the auction solves the square problem padded with dummy rows, of size columns
+                self.assertLessEqual(total_cost(costs, assignment), brute_force(costs) + columns * epsilon + 1e-9)
+
+    def test_greedy_is_valid_but_not_always_optimal(self):
+        for rows, columns in self.shapes:
+            costs = random_costs(self.random, rows, columns)
+            assignment = solve(costs, GREEDY)
+            self.assert_valid(costs, assignment)
+            self.assertGreaterEqual(total_cost(costs, assignment), brute_force(costs))
+        # the cheapest pair first leaves the other row with the expensive column
+        costs = [[1, 2], [2, 10]]
+        self.assertEqual(assign_greedy(costs), [0, 1])
+        self.assertEqual(solve(costs, HUNGARIAN), [1, 0])
+
+    def test_empty_problems(self):
+        for strategy in (GREEDY, AUCTION, HUNGARIAN):
+            self.assertEqual(solve([], strategy), [])
+            self.assertEqual(solve([[], []], strategy), [-1, -1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from checkpoint import Checkpointer
+from controller import Controller
+from deadlock import DeadlockDetector
+from message_bus import MessageBus
+from playground import Playground
+from random_seed import RandomSeed
+from state_hash import HashLog, HashLogReader, first_divergence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUNDS = 80
+CHECKPOINT_ROUND = 30
+
+# restores the checkpoint in a fresh interpreter, with a different layout of the hashed sets and dicts
+_RESUME = """
+import sys
+from checkpoint import Checkpointer
+from state_hash import HashLog
+controller = Checkpointer.load(sys.argv[1])
+controller.hash_log = HashLog(sys.argv[2])
+controller.resume()
+for _ in controller.run(max_rounds=int(sys.argv[3]) - controller.round):
+    pass
+controller.stop()
+"""
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_restored_game_continues_like_an_uninterrupted_run(self):
+        RandomSeed().set_seed(5)
+        controller = Controller(playground=Playground(dimensions=(12, 12), num_balls=10, num_holes=10,
+                                                      num_obstacles=10),
+                                checkpointer=Checkpointer(self.path('game.checkpoint'), interval=CHECKPOINT_ROUND),
+                                hash_log=HashLog(self.path('uninterrupted.hashes')),
+                                message_bus=MessageBus(delay=1, drop_rate=0.2),
+                                radio_range=6,
+                                exploration='nearest',
+                                deadlock_detector=DeadlockDetector())
+        controller.create_agents(None, 3, chatbot=False, team_ids=[1, 2], battery=60)
+        controller.start()
+        for _ in controller.run(max_rounds=ROUNDS):
+            # the checkpoint of a later round would replace the one under test
+            if controller.round == CHECKPOINT_ROUND:
+                controller.checkpointer = None
+        controller.stop()
+        self.assertGreater(controller.round, CHECKPOINT_ROUND)
+
+        subprocess.run([sys.executable, '-c', _RESUME, self.path('game.checkpoint'), self.path('resumed.hashes'),
+                        str(ROUNDS)],
+                       cwd=ROOT, env={**os.environ, 'PYTHONHASHSEED': '12345'}, capture_output=True, check=True)
+
+        uninterrupted = HashLogReader(self.path('uninterrupted.hashes'))
+        resumed = HashLogReader(self.path('resumed.hashes'))
+        try:
+            self.assertEqual(first_divergence(uninterrupted, resumed), (None, CHECKPOINT_ROUND, controller.round))
+        finally:
+            uninterrupted.close()
+            resumed.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
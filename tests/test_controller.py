@@ -0,0 +1,95 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from controller import Controller
+from playground import Playground
+from random_seed import RandomSeed
+from replay import ReplayReader, ReplayWriter
+from state_hash import HashLog, HashLogReader
+
+
+class RunTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        RandomSeed().set_seed(7)
+        self.controller = Controller(playground=Playground(dimensions=(6, 6), num_balls=3, num_holes=3),
+                                     replay_writer=ReplayWriter(os.path.join(self.directory.name, 'game.replay')),
+                                     hash_log=HashLog(os.path.join(self.directory.name, 'game.hashes')))
+        self.controller.create_agents(None, 2, chatbot=False, battery=20)
+        self.controller.start()
+
+    def tearDown(self):
+        self.controller.stop()
+        self.directory.cleanup()
+
+    def test_run_in_chunks_records_every_round(self):
+        rounds = list(self.controller.run(max_rounds=3))
+        self.assertEqual(len(rounds), 3)
+        self.assertFalse(self.controller.game_over())
+        rounds += list(self.controller.run())
+        self.assertTrue(self.controller.game_over())
+        self.assertEqual([state.iteration for state in rounds], list(range(1, self.controller.round + 1)))
+
+        replay = ReplayReader(self.controller.replay_writer.path)
+        try:
+            self.assertEqual(len(replay), self.controller.round + 1)
+            self.assertEqual(replay.read_round(len(replay) - 1).iteration, self.controller.round)
+        finally:
+            replay.close()
+        hash_log = HashLogReader(self.controller.hash_log.path)
+        try:
+            self.assertEqual([hash_log.read(index)[0] for index in range(len(hash_log))],
+                             list(range(self.controller.round + 1)))
+            self.assertEqual(hash_log.read(len(hash_log) - 1)[1], self.controller.playground.state_hash.value)
+        finally:
+            hash_log.close()
+
+    def test_closed_run_can_be_continued(self):
+        for _ in self.controller.run():
+            break
+        self.assertEqual(self.controller.round, 1)
+        list(self.controller.run())
+        self.assertTrue(self.controller.game_over())
+
+    def test_cancelled_arun_finishes_the_round(self):
+        started = threading.Event()
+        release = threading.Event()
+        next_round = self.controller.next_round
+
+        def slow_round(draw=False):
+            started.set()
+            release.wait(5)
+            next_round(draw)
+
+        self.controller.next_round = slow_round
+
+        async def consume():
+            async for _ in self.controller.arun():
+                pass
+
+        async def cancel_during_round():
+            task = asyncio.create_task(consume())
+            await asyncio.to_thread(started.wait, 5)
+            task.cancel()
+            await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+            release.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_during_round())
+        self.assertEqual(self.controller.round, 1)
+        # the game was stopped after the round, so the replay is complete
+        replay = ReplayReader(self.controller.replay_writer.path)
+        try:
+            self.assertEqual(len(replay), 2)
+            self.assertEqual(replay.read_round(1).iteration, 1)
+        finally:
+            replay.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+
+from consts import DOWN, LEFT, RIGHT, UP
+from controller import Controller
+from deadlock import DeadlockDetector, DETOUR, POLICIES, REASSIGN, YIELD, cycle_period
+from playground import Playground
+from random_seed import RandomSeed
+
+
+class CyclePeriodTest(unittest.TestCase):
+    def test_periods(self):
+        self.assertEqual(cycle_period([7, 7, 7, 7], 2), 1)
+        self.assertEqual(cycle_period([1, 2, 1, 2, 1, 2], 3), 2)
+        self.assertEqual(cycle_period([1, 2, 3, 1, 2, 3, 1, 2], 4), 3)
+        # the history may end in the middle of a cycle
+        self.assertEqual(cycle_period([1, 2, 3, 1, 2], 3), 3)
+
+    def test_no_period(self):
+        self.assertEqual(cycle_period([1, 2, 3, 4, 5, 6], 3), 0)
+        self.assertEqual(cycle_period([1, 1, 1, 2], 2), 0)
+        # longer than the longest period looked for
+        self.assertEqual(cycle_period([1, 2, 3, 1, 2, 3], 2), 0)
+        # a key must repeat at least once
+        self.assertEqual(cycle_period([1], 4), 0)
+        self.assertEqual(cycle_period([1, 2, 1], 4), 2)
+
+
+def board(agents):
+    RandomSeed().set_seed(3)
+    controller = Controller(playground=Playground(dimensions=(5, 5), num_holes=0, num_balls=0))
+    controller.create_agents(agents, 1, chatbot=False, battery=10)
+    controller.introduce_friends()
+    return controller
+
+
+class DetectionTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = board('1,1,1')
+        self.agent = self.controller.agents[0]
+        self.detector = DeadlockDetector(window=6, policy=None)
+
+    def play(self, positions):
+        stuck = []
+        for position in positions:
+            self.agent.position = position
+            stuck.append(self.detector.check(self.controller.playground, self.controller.agents))
+        return stuck
+
+    def test_waiting_agent_is_a_deadlock(self):
+        stuck = self.play([(1, 1)] * 6)
+        self.assertEqual(stuck, [[]] * 5 + [[self.agent]])
+        self.assertEqual(self.detector.stats['deadlocks'], 1)
+        # the history starts over
+        self.assertEqual(self.play([(1, 1)] * 5), [[]] * 5)
+
+    def test_oscillating_agent_is_a_livelock(self):
+        stuck = self.play([(1, 1), (1, 2)] * 3)
+        self.assertEqual(stuck[-1], [self.agent])
+        self.assertEqual((self.detector.stats['deadlocks'], self.detector.stats['livelocks']), (0, 1))
+
+    def test_moving_agent_is_not_stuck(self):
+        self.assertEqual(self.play([(x, y) for y in (1, 2) for x in range(5)]), [[]] * 10)
+
+    def test_agent_without_battery_is_not_stuck(self):
+        self.agent.battery = 0
+        self.assertEqual(self.play([(1, 1)] * 12), [[]] * 12)
+
+
+class PolicyTest(unittest.TestCase):
+    def test_detour_to_the_free_cell(self):
+        controller = board('0,0,1;1,0,1')
+        agent = controller.agents[0]
+        detector = DeadlockDetector(policy=DETOUR)
+        detector.resolve([agent], controller.playground)
+        self.assertEqual((agent.direction, agent.is_new_road), (DOWN, True))
+        self.assertEqual(detector.stats['resolved'], 1)
+
+    def test_agent_without_a_free_cell_is_unresolved(self):
+        controller = board('0,0,1;1,0,1;0,1,1')
+        agent = controller.agents[0]
+        detector = DeadlockDetector(policy=DETOUR)
+        detector.resolve([agent], controller.playground)
+        self.assertFalse(agent.is_new_road)
+        self.assertEqual((detector.stats['resolved'], detector.stats['unresolved']), (0, 1))
+
+    def test_yield_to_the_agent_with_more_battery(self):
+        controller = board('2,2,1;3,2,1')
+        first, second = controller.agents
+        first.direction, first.target_position = RIGHT, (4, 2)
+        second.direction, second.target_position, second.battery = LEFT, (0, 3), 5
+        DeadlockDetector(policy=YIELD).resolve([first, second], controller.playground)
+        self.assertEqual((first.direction, first.is_new_road), (RIGHT, False))
+        # across its way, on the side of its target
+        self.assertEqual((second.direction, second.is_new_road), (DOWN, True))
+
+    def test_reassign_swaps_targets(self):
+        controller = board('2,2,1;3,2,1;0,4,1')
+        first, second, lone = controller.agents
+        for agent, target in ((first, (4, 4)), (second, (0, 0))):
+            agent.target_position = target
+            agent.lock_cell(target)
+        detector = DeadlockDetector(policy=REASSIGN)
+        detector.resolve([first, second, lone], controller.playground)
+        self.assertEqual((first.target_position, second.target_position), ((0, 0), (4, 4)))
+        locks = first.team.locks
+        self.assertEqual((locks.owner((0, 0)), locks.owner((4, 4))), (first.agent_id, second.agent_id))
+        # an agent without a partner explores and takes a detour
+        self.assertTrue(lone.is_a_random_target)
+        self.assertIsNotNone(lone.target_position)
+        self.assertTrue(lone.is_new_road)
+        self.assertIn(lone.direction, (UP, RIGHT))
+        self.assertEqual(detector.stats['resolved'], 3)
+
+    def test_policies_end_a_stuck_game(self):
+        # two agents of a team block each other in a corridor of obstacles and agents out of battery
+        for policy in (None,) + POLICIES:
+            RandomSeed().set_seed(2)
+            detector = DeadlockDetector(policy=policy)
+            controller = Controller(playground=Playground(dimensions=(9, 9), num_holes=5, num_balls=5,
+                                                          num_obstacles=12),
+                                    deadlock_detector=detector)
+            controller.create_agents(None, 2, chatbot=False, team_ids=[1, 2], battery=25)
+            controller.start()
+            rounds = sum(1 for _ in controller.run(max_rounds=300))
+            controller.stop()
+            if policy is None:
+                self.assertFalse(controller.game_over())
+                self.assertGreater(detector.stats['deadlocks'], 0)
+                self.assertEqual(detector.stats['resolved'], 0)
+            else:
+                self.assertTrue(controller.game_over(), policy)
+                self.assertLess(rounds, 300, policy)
+                self.assertGreater(detector.stats['resolved'], 0, policy)
+
+
+if __name__ == '__main__':
+    unittest.main()
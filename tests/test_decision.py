@@ -0,0 +1,153 @@
+import threading
+import unittest
+
+from backends import LLM, DEFAULT_LLM_BACKEND, register_backend, query_llm
+from controller import Controller
+from consts import DOWN, LEFT, RIGHT, UP
+from decision import DecisionExecutor, parse_team_answer
+from playground import Playground
+from random_seed import RandomSeed
+
+
+def play(executor, seed=11, rounds=60):
+    """
+    Plays a game of several agents on a crowded board and returns the hash of the state after every round.
+    """
+    RandomSeed().set_seed(seed)
+    controller = Controller(playground=Playground(dimensions=(12, 12), num_balls=12, num_holes=12, num_obstacles=6),
+                            decision_executor=executor)
+    controller.create_agents(None, 8, chatbot=False, team_ids=[1, 2], battery=40)
+    controller.start()
+    hashes = [controller.playground.state_hash.value for _ in controller.run(max_rounds=rounds)]
+    controller.stop()
+    return hashes
+
+
+class FakeSession:
+    # the queries of 4 threads must all be running at once to get past the barrier
+    barrier = threading.Barrier(4, timeout=5)
+    sessions = []
+
+    def __init__(self):
+        FakeSession.sessions.append(self)
+
+    def query(self, prompt, web_search=False):
+        FakeSession.barrier.wait()
+        return 'Answer: UP'
+
+
+class FakeChatbot:
+    def new_session(self):
+        return FakeSession()
+
+
+class ScriptedSession:
+    # a joint prompt gets the joint answer, the prompt of a single agent moves it down
+    joint_answer = ''
+    prompts = []
+
+    def query(self, prompt, web_search=False):
+        ScriptedSession.prompts.append(prompt)
+        if prompt.lstrip().startswith('We are a team'):
+            return ScriptedSession.joint_answer
+        return 'Answer: DOWN\nReason: scripted'
+
+
+class ScriptedChatbot:
+    def new_session(self):
+        return ScriptedSession()
+
+
+class GreedyPlanningTest(unittest.TestCase):
+    def test_parallel_round_matches_serial_round(self):
+        serial = play(DecisionExecutor(workers=1, greedy=True))
+        parallel = play(DecisionExecutor(workers=4, greedy=True))
+        self.assertEqual(len(serial), 60)
+        self.assertEqual(serial, parallel)
+
+    def test_planned_target_is_nearest_free_target(self):
+        RandomSeed().set_seed(3)
+        controller = Controller(playground=Playground(dimensions=(8, 8), num_balls=0, num_holes=0))
+        controller.create_agents('0,0,1;7,7,1', 1, chatbot=False, battery=10)
+        controller.start()
+        first, second = controller.agents
+        first.ball_positions = [(5, 5), (1, 2), (0, 4)]
+        self.assertEqual(first.plan_nearest_target(), (1, 2))
+        second.lock_cell((1, 2))
+        self.assertEqual(first.plan_nearest_target(), (0, 4))
+        first.ball_positions = []
+        self.assertIsNone(first.plan_nearest_target())
+
+
+class QueryTest(unittest.TestCase):
+    def setUp(self):
+        register_backend(LLM, DEFAULT_LLM_BACKEND, f'{__name__}:FakeChatbot')
+        FakeSession.sessions.clear()
+
+    def tearDown(self):
+        register_backend(LLM, DEFAULT_LLM_BACKEND, 'chatbot:Chatbot')
+
+    def test_threads_query_at_the_same_time_through_their_own_sessions(self):
+        executor = DecisionExecutor(workers=4)
+        try:
+            answers = executor._map(query_llm, ['prompt'] * 4)
+        finally:
+            executor.shutdown()
+        self.assertEqual(answers, ['Answer: UP'] * 4)
+        self.assertEqual(len(FakeSession.sessions), 4)
+
+
+
+class ParseTeamAnswerTest(unittest.TestCase):
+    def test_actions_in_surrounding_text(self):
+        answer = 'Here you go: {"A1": "up", "A2": " Right ", "A3": "LEFT", "A4": "DOWN"} Good luck!'
+        self.assertEqual(parse_team_answer(answer, 4), {0: UP, 1: RIGHT, 2: LEFT, 3: DOWN})
+
+    def test_missing_and_invalid_actions_are_left_out(self):
+        answer = '{"A1": "JUMP", "A3": 2, "A4": "down", "A9": "UP"}'
+        self.assertEqual(parse_team_answer(answer, 4), {3: DOWN})
+
+    def test_answer_without_an_object(self):
+        for answer in ('UP', '{"A1": "UP"', '["A1", "UP"]', '{not json}', '} {'):
+            self.assertEqual(parse_team_answer(answer, 2), {}, answer)
+
+
+class JointDecisionTest(unittest.TestCase):
+    def setUp(self):
+        register_backend(LLM, DEFAULT_LLM_BACKEND, f'{__name__}:ScriptedChatbot')
+        ScriptedSession.prompts.clear()
+        RandomSeed().set_seed(5)
+        self.controller = Controller(playground=Playground(dimensions=(8, 8), num_balls=0, num_holes=0))
+        self.controller.create_agents('2,2,1;4,4,1;5,0,1', 1, chatbot=True, battery=10)
+        self.controller.introduce_friends()
+        # an agent that joined no team
+        self.controller.create_agent(chatbot=True, agent_type=2, position=(6, 6), battery=10)
+
+    def tearDown(self):
+        register_backend(LLM, DEFAULT_LLM_BACKEND, 'chatbot:Chatbot')
+
+    def decide(self):
+        executor = DecisionExecutor(joint=True)
+        return executor.decide(self.controller.agents, self.controller.playground)
+
+    def test_team_decides_with_one_query(self):
+        ScriptedSession.joint_answer = '{"A1": "RIGHT", "A2": "UP", "A3": "LEFT"}'
+        self.assertEqual(self.decide(), [(3, 2), (4, 3), (4, 0), (6, 7)])
+        # one query for the team and one for the agent without a team
+        self.assertEqual(len(ScriptedSession.prompts), 2)
+        self.assertEqual([agent.llm_calls for agent in self.controller.agents], [1, 0, 0, 1])
+
+    def test_agent_with_a_missing_action_decides_alone(self):
+        # A2 has no action and A3 would leave the board, so both fall back to a query of their own
+        ScriptedSession.joint_answer = 'My plan: {"A1": "left", "A3": "UP"}'
+        self.assertEqual(self.decide(), [(1, 2), (4, 5), (5, 1), (6, 7)])
+        self.assertEqual(len(ScriptedSession.prompts), 4)
+        self.assertEqual([agent.llm_calls for agent in self.controller.agents], [1, 1, 1, 1])
+
+    def test_unreadable_answer_falls_back_for_every_member(self):
+        ScriptedSession.joint_answer = 'I cannot help with that.'
+        self.assertEqual(self.decide(), [(2, 3), (4, 5), (5, 1), (6, 7)])
+
+
+if __name__ == '__main__':
+    unittest.main()
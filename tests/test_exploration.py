@@ -0,0 +1,91 @@
+import random
+import unittest
+
+from controller import Controller
+from exploration import Frontier, RANDOM
+from playground import Playground
+from random_seed import RandomSeed
+
+WIDTH, HEIGHT = 9, 7
+
+
+def brute_force_frontier(visited):
+    return {(x + dx, y + dy)
+            for x, y in visited
+            for dx, dy in ((0, -1), (1, 0), (0, 1), (-1, 0))
+            if x + dx >= 0 and y + dy >= 0 and (x + dx, y + dy) not in visited}
+
+
+class FrontierTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(4)
+        self.visited = {(4, 3)}
+        self.frontier = Frontier()
+        self.frontier.update(self.visited, self.visited)
+
+    def visit(self, cells):
+        new_cells = [cell for cell in cells if cell not in self.visited]
+        self.visited.update(new_cells)
+        self.frontier.update(new_cells, self.visited)
+
+    def random_cells(self, count):
+        return [(self.random.randrange(WIDTH), self.random.randrange(HEIGHT)) for _ in range(count)]
+
+    def test_stays_correct_as_cells_are_visited(self):
+        self.assertEqual(self.frontier.cells, {(4, 2), (5, 3), (4, 4), (3, 3)})
+        for _ in range(30):
+            self.visit(self.random_cells(3))
+            self.assertEqual(self.frontier.cells, brute_force_frontier(self.visited))
+
+    def test_nearest_picks_the_closest_cell_on_the_board(self):
+        for _ in range(20):
+            self.visit(self.random_cells(4))
+            position = self.random_cells(1)[0]
+            on_board = [cell for cell in brute_force_frontier(self.visited) if cell[0] < WIDTH and cell[1] < HEIGHT]
+            expected = min(on_board, key=lambda cell: (abs(cell[0] - position[0]) + abs(cell[1] - position[1]), cell),
+                           default=None)
+            self.assertEqual(self.frontier.nearest(position, WIDTH, HEIGHT), expected)
+
+    def test_best_gain_picks_the_most_unseen_cells_per_step(self):
+        field_of_view = 3
+        for _ in range(20):
+            self.visit(self.random_cells(4))
+            position = self.random_cells(1)[0]
+
+            def key(cell):
+                gain = sum(1 for i in range(cell[0] - 1, cell[0] + 2) for j in range(cell[1] - 1, cell[1] + 2)
+                           if 0 <= i < WIDTH and 0 <= j < HEIGHT and (i, j) not in self.visited)
+                distance = abs(cell[0] - position[0]) + abs(cell[1] - position[1])
+                return -gain / (1 + distance), distance, cell
+
+            on_board = [cell for cell in brute_force_frontier(self.visited) if cell[0] < WIDTH and cell[1] < HEIGHT]
+            expected = min(on_board, key=key, default=None)
+            self.assertEqual(self.frontier.best_gain(position, self.visited, field_of_view, WIDTH, HEIGHT), expected)
+
+    def test_is_empty_once_the_board_is_visited(self):
+        self.visit([(x, y) for x in range(WIDTH) for y in range(HEIGHT)])
+        self.assertIsNone(self.frontier.nearest((0, 0), WIDTH, HEIGHT))
+
+
+class RandomExplorationTest(unittest.TestCase):
+    def test_picks_unvisited_cells_then_cells_not_gone_to(self):
+        RandomSeed().set_seed(2)
+        playground = Playground(dimensions=(WIDTH, HEIGHT), num_balls=0, num_holes=0)
+        controller = Controller(playground=playground, exploration=RANDOM)
+        controller.create_agents('0,0,1', 1, chatbot=False, battery=10)
+        agent = controller.agents[0]
+        board = {(x, y) for x in range(WIDTH) for y in range(HEIGHT)}
+        for _ in range(20):
+            target = agent.find_random_position(playground)
+            self.assertNotIn(target, agent.visited_cells)
+            agent.mark_visited([target, (target[0] + 1, target[1])])
+            self.assertEqual(set(agent.unvisited_index), board - agent.visited_cells)
+
+        agent.mark_visited(sorted(board))
+        agent.mark_gone([(x, y) for x, y in board if x > 0])
+        self.assertEqual(agent.find_random_position(playground)[0], 0)
+        self.assertNotIn(agent.find_random_position(playground), agent.gone_cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from controller import Controller
+from feasibility import FeasibilityChecker, NOT_ENOUGH_BATTERY, NOT_ENOUGH_ITEMS, UNREACHABLE_ITEMS
+from playground import Playground
+from random_seed import RandomSeed
+
+
+def board(dimensions, agents, battery, holes=(), balls=(), obstacles=()):
+    playground = Playground(dimensions=dimensions, num_holes=0, num_balls=0)
+    for position in obstacles:
+        playground.add_obstacle(position)
+    for position in holes:
+        playground.add_hole(position)
+    for position in balls:
+        playground.add_ball(position)
+    controller = Controller(playground=playground)
+    controller.create_agents(agents, 1, chatbot=False, battery=battery)
+    controller.introduce_friends()
+    return controller
+
+
+def check(controller, max_score=1):
+    return FeasibilityChecker().check(controller.playground, controller.agents, max_score)
+
+
+class HandBuiltBoardTest(unittest.TestCase):
+    def test_not_enough_items(self):
+        controller = board((6, 6), '0,0,1', battery=50, holes=[(1, 1), (4, 4)], balls=[(2, 2)])
+        self.assertEqual(check(controller, max_score=2), NOT_ENOUGH_ITEMS)
+        controller.playground.add_ball((3, 3))
+        self.assertIsNone(check(controller, max_score=2))
+
+    def test_unreachable_items(self):
+        wall = [(3, 0), (3, 1), (3, 2)]
+        controller = board((7, 3), '0,0,1', battery=50, holes=[(5, 1)], balls=[(1, 1)], obstacles=wall)
+        self.assertEqual(check(controller), UNREACHABLE_ITEMS)
+        controller = board((7, 3), '0,0,1', battery=50, holes=[(5, 1)], balls=[(1, 1)], obstacles=wall[:2])
+        self.assertIsNone(check(controller))
+
+    def test_not_enough_battery(self):
+        # one step to the ball and eight from it to the hole
+        controller = board((8, 3), '0,0,1', battery=9, holes=[(7, 0)], balls=[(0, 1)])
+        self.assertIsNone(check(controller))
+        controller = board((8, 3), '0,0,1', battery=8, holes=[(7, 0)], balls=[(0, 1)])
+        self.assertEqual(check(controller), NOT_ENOUGH_BATTERY)
+
+    def test_not_enough_battery_around_obstacles(self):
+        # the wall turns the six steps of the straight line into twelve
+        wall = [(2, 0), (2, 1), (2, 2), (2, 3)]
+        controller = board((5, 5), '0,0,1', battery=12, holes=[(4, 0)], balls=[(0, 1)], obstacles=wall)
+        self.assertIsNone(check(controller))
+        controller = board((5, 5), '0,0,1', battery=11, holes=[(4, 0)], balls=[(0, 1)], obstacles=wall)
+        self.assertEqual(check(controller), NOT_ENOUGH_BATTERY)
+
+    def test_agent_out_of_battery_blocks_a_corridor(self):
+        controller = board((5, 1), '0,0,1;2,0,1', battery=20, holes=[(4, 0)], balls=[(1, 0)])
+        self.assertIsNone(check(controller))
+        controller.agents[1].battery = -1
+        self.assertEqual(check(controller), NOT_ENOUGH_BATTERY)
+
+
+class RandomGameTest(unittest.TestCase):
+    def test_never_ends_a_winnable_game(self):
+        won = hopeless = 0
+        for seed in range(24):
+            RandomSeed().set_seed(seed)
+            controller = Controller(playground=Playground(dimensions=(9, 9), num_holes=5, num_balls=5,
+                                                          num_obstacles=seed % 3 * 6))
+            controller.create_agents(None, 2, chatbot=False, team_ids=[1, 2], battery=30)
+            controller.start()
+            checker = FeasibilityChecker()
+            reason = None
+            # two agents can block each other forever on a crowded board, so the rounds are capped
+            for _ in controller.run(max_rounds=300):
+                verdict = checker.check(controller.playground, controller.agents, controller.get_max_score())
+                # the cached values give the same verdict as a checker that starts from scratch
+                self.assertEqual(verdict, check(controller, controller.get_max_score()), seed)
+                reason = reason or verdict
+            controller.stop()
+            if controller.agents_reached_max_score():
+                won += 1
+                self.assertIsNone(reason, seed)
+            elif reason is not None:
+                hopeless += 1
+        # both kinds of games were played
+        self.assertGreater(won, 0)
+        self.assertGreater(hopeless, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from consts import AGENT
+from controller import Controller
+from memory_map import MemoryMap, format_cell
+from playground import Playground
+from random_seed import RandomSeed
+
+
+def rebuild(agent, playground):
+    return MemoryMap(playground.xAxis, playground.yAxis).sync(agent.visited_cells, agent.ball_positions,
+                                                              agent.hole_positions, agent.filled_hole_positions,
+                                                              playground.obstacles)
+
+
+class MemoryMapTest(unittest.TestCase):
+    def assert_same_map(self, patched, full, overlay):
+        self.assertEqual(patched.grid, full.grid)
+        self.assertEqual(patched.text(overlay), full.text(overlay))
+        self.assertEqual(patched.text(overlay), '\n'.join(' '.join(format_cell(label) for label in row)
+                                                          for row in full.to_list(overlay)))
+
+    def test_patched_map_equals_a_full_rebuild(self):
+        for seed, every in ((1, 1), (2, 3)):
+            RandomSeed().set_seed(seed)
+            controller = Controller(playground=Playground(dimensions=(10, 9), num_holes=6, num_balls=6,
+                                                          num_obstacles=8))
+            controller.create_agents(None, 2, chatbot=False, team_ids=[1, 2], battery=40)
+            controller.start()
+            playground = controller.playground
+            for state in controller.run(max_rounds=120):
+                if state.iteration % every:
+                    continue
+                for agent in controller.agents:
+                    patched = agent.sync_memory_map(playground)
+                    self.assert_same_map(patched, rebuild(agent, playground), agent.get_memory_overlay(patched))
+            controller.stop()
+
+    def test_touched_cells_are_relabelled(self):
+        memory_map = MemoryMap(4, 3)
+        visited = {(0, 0), (1, 0)}
+        balls = [(1, 0)]
+        memory_map.sync(visited, balls, [], set(), set())
+        overlay = memory_map.overlay([((0, 0), AGENT)])
+        memory_map.text(overlay)
+
+        # the agent takes the ball and sees a hole behind an obstacle
+        visited.update({(2, 1), (3, 1)})
+        balls.clear()
+        memory_map.touch([(1, 0), (2, 1), (3, 1)])
+        memory_map.sync(visited, balls, [(3, 1)], set(), {(2, 1)})
+        full = MemoryMap(4, 3).sync(visited, balls, [(3, 1)], set(), {(2, 1)})
+        overlay = memory_map.overlay([((1, 0), AGENT)])
+        self.assert_same_map(memory_map, full, overlay)
+
+
+if __name__ == '__main__':
+    unittest.main()
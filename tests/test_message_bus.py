@@ -0,0 +1,84 @@
+import unittest
+
+from consts import BALL, HOLE, FILLED_HOLE
+from controller import Controller
+from message_bus import MessageBus
+from playground import Playground
+from random_seed import RandomSeed
+
+
+class Receiver:
+    def __init__(self):
+        self.batches = []
+
+    def receive_friends_info_bulk(self, info_type, added, removed):
+        self.batches.append((info_type, added, removed))
+        return self
+
+
+class MessageBusTest(unittest.TestCase):
+    def setUp(self):
+        RandomSeed().set_seed(0)
+        self.receiver = Receiver()
+
+    def test_merges_and_deduplicates_positions(self):
+        bus = MessageBus()
+        bus.post([self.receiver], BALL, 1, [(1, 1), (2, 2)])
+        bus.post([self.receiver], BALL, 1, [(1, 1)])
+        bus.post([self.receiver], BALL, -1, [(2, 2)])
+        self.assertEqual(bus.deliver(1), 1)
+        self.assertEqual(self.receiver.batches, [(BALL, [(1, 1)], [(2, 2)])])
+        self.assertEqual(bus.stats, {'sent': 3, 'dropped': 0, 'positions_sent': 4, 'batches_delivered': 1,
+                                     'positions_delivered': 2})
+        self.assertEqual(bus.report(), 'messages sent: 3 (4 positions), dropped: 0, delivered: 1 batches (2 positions)')
+
+    def test_keeps_the_order_of_updates_across_types(self):
+        bus = MessageBus()
+        bus.post([self.receiver], HOLE, 1, [(0, 0)])
+        bus.post([self.receiver], FILLED_HOLE, 1, [(3, 3)])
+        bus.post([self.receiver], HOLE, 1, [(3, 3)])
+        bus.deliver(1)
+        self.assertEqual(self.receiver.batches, [(HOLE, [(0, 0)], []), (FILLED_HOLE, [(3, 3)], []),
+                                                 (HOLE, [(3, 3)], [])])
+
+    def test_batches_match_immediate_delivery(self):
+        RandomSeed().set_seed(1)
+        controller = Controller(playground=Playground(dimensions=(6, 6), num_balls=0, num_holes=0))
+        controller.create_agents('0,0,1;5,5,1', 1, chatbot=False, battery=10)
+        batched, immediate = controller.agents
+        # a hole is filled, then its ball is stolen, so it is a hole again
+        messages = [(HOLE, 1, [(0, 3)]), (FILLED_HOLE, 1, [(4, 4)]), (BALL, 1, [(2, 2), (1, 1)]),
+                    (HOLE, 1, [(4, 4)]), (BALL, -1, [(2, 2)])]
+        bus = MessageBus()
+        for info_type, status, positions in messages:
+            bus.post([batched], info_type, status, positions)
+            immediate.receive_friends_info_v2(info_type, status, positions)
+        bus.deliver(1)
+        self.assertEqual(batched.hole_positions, immediate.hole_positions)
+        self.assertEqual(batched.ball_positions, immediate.ball_positions)
+        self.assertEqual(batched.filled_hole_positions, immediate.filled_hole_positions)
+        self.assertIn((4, 4), batched.hole_positions)
+
+    def test_delay_counts_from_the_first_round(self):
+        bus = MessageBus(delay=1)
+        bus.post([self.receiver], BALL, 1, [(1, 1)])
+        self.assertEqual(bus.deliver(1), 0)
+        self.assertEqual(bus.deliver(2), 1)
+        self.assertEqual(self.receiver.batches, [(BALL, [(1, 1)], [])])
+
+    def test_without_delay_messages_arrive_at_the_end_of_their_round(self):
+        bus = MessageBus()
+        bus.deliver(1)
+        bus.post([self.receiver], BALL, 1, [(1, 1)])
+        self.assertEqual(bus.deliver(2), 1)
+
+    def test_drops_messages(self):
+        bus = MessageBus(drop_rate=1.0)
+        bus.post([self.receiver], BALL, 1, [(1, 1)])
+        self.assertEqual(bus.deliver(1), 0)
+        self.assertEqual(bus.stats['dropped'], 1)
+        self.assertEqual(self.receiver.batches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import unittest
+from collections import deque
+from types import SimpleNamespace
+
+from consts import BALL, FILLED_HOLE, HOLE
+from playground import Playground
+from random_seed import RandomSeed
+
+
+class ThrowBallTest(unittest.TestCase):
+    def setUp(self):
+        RandomSeed().set_seed(1)
+        self.playground = Playground(dimensions=(2, 2), num_holes=0, num_balls=0)
+        self.playground.add_hole((0, 0))
+        self.playground.place_ball((0, 0), SimpleNamespace(has_ball=True, agent_id='filler', type=1))
+        for position in ((1, 0), (0, 1), (1, 1)):
+            self.playground.add_ball(position)
+
+    def test_ball_stays_in_the_hole_on_a_full_board(self):
+        self.assertEqual(len(self.playground.free_cells), 0)
+        self.assertFalse(self.playground.throw_ball_from_hole((0, 0)))
+        self.assertEqual(self.playground.get_cell_state((0, 0)), FILLED_HOLE)
+        self.assertEqual((self.playground.filled_holes, self.playground.balls_remaining), (1, 3))
+
+    def test_ball_is_thrown_to_the_empty_cell(self):
+        self.playground.pick_ball((1, 1))
+        self.assertTrue(self.playground.throw_ball_from_hole((0, 0)))
+        self.assertEqual(self.playground.get_cell_state((0, 0)), HOLE)
+        self.assertEqual(self.playground.get_cell_state((1, 1)), BALL)
+        self.assertEqual((self.playground.filled_holes, self.playground.balls_remaining), (0, 3))
+
+
+def shortest_path_length(playground, start, goal):
+    # breadth-first search over the passable cells
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        if (x, y) == goal:
+            return distances[goal]
+        for cell in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            if playground.is_valid_position(cell) and cell not in playground.obstacles and cell not in distances:
+                distances[cell] = distances[(x, y)] + 1
+                queue.append(cell)
+    return None
+
+
+class FindPathTest(unittest.TestCase):
+    def assert_path(self, playground, start, goal, path):
+        self.assertEqual((path[0], path[-1]), (start, goal))
+        for (x1, y1), (x2, y2) in zip(path, path[1:]):
+            self.assertEqual(abs(x1 - x2) + abs(y1 - y2), 1)
+        self.assertFalse(set(path) & playground.obstacles)
+
+    def test_goes_around_a_wall(self):
+        playground = Playground(dimensions=(5, 5), num_holes=0, num_balls=0)
+        for y in range(4):
+            playground.add_obstacle((2, y))
+        path = playground.find_path((0, 0), (4, 0))
+        self.assert_path(playground, (0, 0), (4, 0), path)
+        self.assertEqual(len(path) - 1, 12)
+        self.assertEqual(playground.find_path((1, 1), (1, 1)), [(1, 1)])
+
+    def test_shortest_on_random_boards(self):
+        generator = random.Random(6)
+        for _ in range(40):
+            playground = Playground(dimensions=(9, 7), num_holes=0, num_balls=0)
+            for _ in range(18):
+                playground.add_obstacle((generator.randrange(9), generator.randrange(7)))
+            start, goal = generator.sample(list(playground.free_cells), 2)
+            path = playground.find_path(start, goal)
+            length = shortest_path_length(playground, start, goal)
+            if length is None:
+                self.assertIsNone(path)
+            else:
+                self.assert_path(playground, start, goal, path)
+                self.assertEqual(len(path) - 1, length)
+
+    def test_unreachable_goal(self):
+        playground = Playground(dimensions=(5, 5), num_holes=0, num_balls=0)
+        for position in ((3, 4), (3, 3), (4, 3)):
+            playground.add_obstacle(position)
+        self.assertIsNone(playground.find_path((0, 0), (4, 4)))
+        self.assertIsNone(playground.find_path((0, 0), (3, 3)))
+        self.assertIsNone(playground.find_path((0, 0), (5, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
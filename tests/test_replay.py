@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from controller import Controller
+from playground import Playground
+from random_seed import RandomSeed
+from replay import ReplayReader, ReplayWriter, _FOOTER
+
+KEYFRAME_INTERVAL = 4
+
+
+def snapshot(controller):
+    playground = controller.playground
+    return ([row[:] for row in playground.grid],
+            dict(playground.holes),
+            [(agent.position, agent.target_position, agent.direction, agent.has_ball, agent.battery,
+              agent.get_my_score()) for agent in controller.agents])
+
+
+class ReplayTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'game.replay')
+        RandomSeed().set_seed(9)
+        controller = Controller(playground=Playground(dimensions=(8, 7), num_balls=5, num_holes=5, num_obstacles=4),
+                                replay_writer=ReplayWriter(cls.path, keyframe_interval=KEYFRAME_INTERVAL))
+        controller.create_agents(None, 2, chatbot=False, team_ids=[1, 2], battery=25)
+        controller.start()
+        cls.agents = [(agent.agent_id, agent.type) for agent in controller.agents]
+        cls.snapshots = [snapshot(controller)]
+        for _ in controller.run(max_rounds=60):
+            cls.snapshots.append(snapshot(controller))
+        controller.stop()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.reader = ReplayReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+
+    def assert_round(self, reader, index):
+        grid, holes, agents = self.snapshots[index]
+        replay_round = reader.read_round(index)
+        self.assertEqual(replay_round.iteration, index)
+        self.assertEqual(reader.read_grid(index), (grid, holes), index)
+        self.assertEqual([(state.position, state.target_position, state.direction, state.has_ball, state.battery,
+                           state.score) for state in replay_round.agents], agents, index)
+
+    def test_round_trip(self):
+        self.assertGreater(len(self.snapshots), 2 * KEYFRAME_INTERVAL)
+        self.assertEqual(self.reader.seed, '9')
+        self.assertEqual(list(zip(self.reader.agent_ids, self.reader.agent_teams)), self.agents)
+        self.assertEqual(len(self.reader), len(self.snapshots))
+        for index in range(len(self.snapshots)):
+            self.assert_round(self.reader, index)
+
+    def test_seeking_starts_at_the_nearest_keyframe(self):
+        read = []
+        read_round = self.reader.read_round
+
+        def recording_read_round(index):
+            read.append(index)
+            return read_round(index)
+
+        self.reader.read_round = recording_read_round
+        for index in range(len(self.snapshots)):
+            self.assertEqual(read_round(index).keyframe, index % KEYFRAME_INTERVAL == 0)
+        index = 2 * KEYFRAME_INTERVAL + 2
+        grid, holes, _ = self.snapshots[index]
+        self.assertEqual(self.reader.read_grid(index), (grid, holes))
+        self.assertEqual(read, list(range(2 * KEYFRAME_INTERVAL, index + 1)))
+
+    def test_file_without_footer_is_scanned(self):
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        # the footer and the index, then a part of the last record, as after a crash
+        records_end = len(data) - _FOOTER.size - 8 * len(self.snapshots)
+        crashed_path = os.path.join(self.directory.name, 'crashed.replay')
+        for end, rounds in ((records_end, len(self.snapshots)), (records_end - 3, len(self.snapshots) - 1)):
+            with open(crashed_path, 'wb') as file:
+                file.write(data[:end])
+            reader = ReplayReader(crashed_path)
+            try:
+                self.assertIsInstance(reader._offsets, list)
+                self.assertEqual(len(reader), rounds)
+                for index in range(rounds):
+                    self.assert_round(reader, index)
+            finally:
+                reader.close()
+
+    def test_rejects_other_files(self):
+        other_path = os.path.join(self.directory.name, 'other.replay')
+        shutil.copyfile(self.path, other_path)
+        with open(other_path, 'r+b') as file:
+            file.write(b'NOPE')
+        with self.assertRaises(ValueError):
+            ReplayReader(other_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
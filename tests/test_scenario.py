@@ -0,0 +1,198 @@
+import json
+import os
+import tempfile
+import unittest
+from collections import deque
+
+from consts import AGENT, BALL, HOLE, OBSTACLE
+from controller import Controller
+from playground import Playground
+from random_seed import RandomSeed
+from scenario import Scenario, maze_cells
+
+SCENARIO = {
+    'dimensions': [8, 6],
+    'seed': 3,
+    'battery': 12,
+    'field_of_view': 2,
+    'obstacles': [[4, 0], [4, 1]],
+    'agents': [[0, 0, 1], [7, 5, 2]],
+    'holes': [[1, 1], [6, 4]],
+    'balls': [[2, 2], [5, 3], [3, 5]],
+}
+
+SCENARIO_TOML = """
+dimensions = [8, 6]
+seed = 3
+battery = 12
+field_of_view = 2
+obstacles = [[4, 0], [4, 1]]
+agents = [[0, 0, 1], [7, 5, 2]]
+holes = [[1, 1], [6, 4]]
+balls = [[2, 2], [5, 3], [3, 5]]
+"""
+
+
+def populate(scenario, playground=None):
+    controller = Controller(playground=playground or scenario.create_playground())
+    return scenario.populate(controller, chatbot=False)
+
+
+def cells_in_state(playground, state):
+    # a cell with an agent holds the id of the agent
+    return {(x, y) for y in range(playground.yAxis) for x in range(playground.xAxis)
+            if playground.get_cell_state((x, y)) == state
+            or state == AGENT and playground.get_cell_state((x, y)).startswith(AGENT)}
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def assert_loaded(self, scenario):
+        self.assertEqual(scenario.dimensions, (8, 6))
+        self.assertEqual((scenario.seed, scenario.battery, scenario.field_of_view), (3, 12, 2))
+        self.assertEqual(scenario.base_dir, self.directory.name)
+        controller = populate(scenario)
+        playground = controller.playground
+        self.assertEqual(playground.obstacles, {(4, 0), (4, 1)})
+        self.assertEqual(set(playground.holes), {(1, 1), (6, 4)})
+        self.assertEqual(set(playground.ball_positions), {(2, 2), (5, 3), (3, 5)})
+        self.assertEqual([(agent.position, agent.type, agent.battery) for agent in controller.agents],
+                         [((0, 0), 1, 12), ((7, 5), 2, 12)])
+
+    def test_json(self):
+        self.assert_loaded(Scenario.load(self.write('game.json', json.dumps(SCENARIO))))
+
+    def test_toml(self):
+        self.assert_loaded(Scenario.load(self.write('game.toml', SCENARIO_TOML)))
+
+    def test_agents_file_is_relative_to_the_scenario(self):
+        self.write('fleet.txt', '# x,y,type\n0,0,1\n\n3,2\n')
+        scenario = Scenario.load(self.write('game.json', json.dumps({'dimensions': [5, 5],
+                                                                      'agents': {'file': 'fleet.txt'}})))
+        controller = populate(scenario)
+        self.assertEqual([(agent.position, agent.type) for agent in controller.agents], [((0, 0), 1), ((3, 2), 1)])
+
+    def test_missing_dimensions(self):
+        with self.assertRaises(ValueError):
+            Scenario.load(self.write('game.json', json.dumps({'holes': [[1, 1]]})))
+
+
+class GenerationTest(unittest.TestCase):
+    def setUp(self):
+        RandomSeed().set_seed(11)
+
+    def assert_no_overlap(self, controller, agents, holes, balls, obstacles):
+        playground = controller.playground
+        agent_cells = {agent.position for agent in controller.agents}
+        self.assertEqual(len(controller.agents), agents)
+        self.assertEqual(len(agent_cells), agents)
+        self.assertEqual(cells_in_state(playground, AGENT), agent_cells)
+        self.assertEqual(cells_in_state(playground, HOLE), set(playground.holes))
+        self.assertEqual(cells_in_state(playground, BALL), set(playground.ball_positions))
+        self.assertEqual(cells_in_state(playground, OBSTACLE), playground.obstacles)
+        self.assertEqual(len(playground.holes), holes)
+        self.assertEqual(len(playground.ball_positions), balls)
+        self.assertEqual(playground.balls_remaining, balls)
+        if obstacles is not None:
+            self.assertEqual(len(playground.obstacles), obstacles)
+
+    def test_uniform(self):
+        scenario = Scenario(dimensions=(10, 8),
+                            agents={'teams': {'1': 5, '2': 4}},
+                            holes={'count': 12},
+                            balls={'count': 15, 'distribution': 'uniform'},
+                            obstacles={'count': 7})
+        self.assert_no_overlap(populate(scenario), agents=9, holes=12, balls=15, obstacles=7)
+
+    def test_clustered(self):
+        scenario = Scenario(dimensions=(12, 12),
+                            agents={'teams': {'1': 6}, 'distribution': 'clustered', 'clusters': 1, 'spread': 1},
+                            holes={'count': 20, 'distribution': 'clustered', 'clusters': 2},
+                            balls={'count': 25, 'distribution': 'clustered', 'clusters': 4, 'spread': 3})
+        self.assert_no_overlap(populate(scenario), agents=6, holes=20, balls=25, obstacles=0)
+
+    def test_clustered_fills_a_crowded_board(self):
+        scenario = Scenario(dimensions=(5, 5),
+                            holes={'count': 10, 'distribution': 'clustered', 'clusters': 1},
+                            balls={'count': 15, 'distribution': 'clustered', 'clusters': 1})
+        controller = populate(scenario)
+        self.assert_no_overlap(controller, agents=0, holes=10, balls=15, obstacles=0)
+        self.assertEqual(len(controller.playground.free_cells), 0)
+
+    def test_too_many_agents(self):
+        scenario = Scenario(dimensions=(3, 3), agents={'teams': {'1': 10}})
+        with self.assertRaises(ValueError):
+            populate(scenario)
+
+    def test_maze_corridors_are_connected(self):
+        for dimensions, openness in (((11, 9), 0.0), ((16, 10), 0.0), ((15, 13), 0.4)):
+            walls = set(maze_cells(dimensions, openness=openness))
+            width, height = dimensions
+            reached = {(0, 0)}
+            queue = deque(reached)
+            while queue:
+                x, y = queue.popleft()
+                for cell in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                    if 0 <= cell[0] < width and 0 <= cell[1] < height and cell not in walls and cell not in reached:
+                        reached.add(cell)
+                        queue.append(cell)
+            corridors = {(x, y) for x in range(0, width, 2) for y in range(0, height, 2)}
+            self.assertTrue(corridors <= reached, dimensions)
+            if openness == 0.0 and width % 2 == 1 and height % 2 == 1:
+                # a perfect maze: a spanning tree of the corridor cells, every other cell is a wall
+                self.assertEqual(width * height - len(walls), 2 * len(corridors) - 1)
+
+    def test_maze_obstacles(self):
+        scenario = Scenario(dimensions=(11, 9),
+                            obstacles={'distribution': 'maze', 'openness': 0.2},
+                            agents={'teams': {'1': 3}},
+                            holes={'count': 5},
+                            balls={'count': 5})
+        self.assert_no_overlap(populate(scenario), agents=3, holes=5, balls=5, obstacles=None)
+
+    def test_maze_is_only_for_obstacles(self):
+        scenario = Scenario(dimensions=(5, 5), holes={'count': 3, 'distribution': 'maze'})
+        with self.assertRaises(ValueError):
+            populate(scenario)
+
+
+class PopulateTest(unittest.TestCase):
+    def setUp(self):
+        RandomSeed().set_seed(5)
+        self.scenario = Scenario.from_dict(SCENARIO)
+
+    def test_counters_are_reset_to_the_placed_items(self):
+        playground = Playground(dimensions=(8, 6), num_holes=9, num_balls=9, num_obstacles=9)
+        controller = populate(self.scenario, playground)
+        self.assertEqual((playground.num_obstacles, playground.num_holes, playground.num_balls), (2, 2, 3))
+        controller.start()
+        try:
+            # start doesn't add random items on top of the scenario
+            self.assertEqual(len(playground.obstacles), 2)
+            self.assertEqual(len(playground.holes), 2)
+            self.assertEqual(playground.balls_remaining, 3)
+        finally:
+            controller.stop()
+
+    def test_scenario_can_be_reused(self):
+        first = populate(self.scenario).playground
+        second = populate(self.scenario).playground
+        for playground in (first, second):
+            self.assertEqual((playground.num_obstacles, playground.num_holes, playground.num_balls), (2, 2, 3))
+        self.assertEqual([cells_in_state(first, state) for state in (AGENT, HOLE, BALL, OBSTACLE)],
+                         [cells_in_state(second, state) for state in (AGENT, HOLE, BALL, OBSTACLE)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import sweep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# plays a game in a fresh interpreter and prints the modules of the project it loaded
+_PLAY_GAME = """
+import os, sys
+import sweep
+sweep.run_point({'dim': '5,5', 'ball': 2, 'hole': 2, 'battery': 10, 'agents': 2, 'max_rounds': 20}, seed=1)
+root = os.path.dirname(os.path.abspath(sweep.__file__))
+for module in list(sys.modules.values()):
+    path = getattr(module, '__file__', None)
+    if path and os.path.dirname(os.path.abspath(path)) == root:
+        print(os.path.basename(path))
+"""
+
+
+class CodeVersionTest(unittest.TestCase):
+    def test_every_module_of_a_game_is_hashed(self):
+        output = subprocess.run([sys.executable, '-c', _PLAY_GAME], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout
+        loaded = set(output.split())
+        self.assertIn('controller.py', loaded)
+        self.assertLessEqual(loaded, set(sweep.simulation_modules()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import pickle
+import threading
+import unittest
+
+from controller import Controller
+from playground import Playground
+from random_seed import RandomSeed
+from team import LockTable
+
+
+class LockTableTest(unittest.TestCase):
+    def setUp(self):
+        RandomSeed().set_seed(2)
+        self.controller = Controller(playground=Playground(dimensions=(6, 6), num_holes=0, num_balls=0))
+        self.controller.create_agents('0,0,1;5,5,1;0,5,2', 1, chatbot=False, team_ids=[1, 2], battery=5)
+        self.controller.introduce_friends()
+        self.first, self.second, self.rival = self.controller.agents
+
+    def test_a_cell_has_one_owner_in_a_team(self):
+        self.assertTrue(self.first.lock_cell((3, 3)))
+        self.assertTrue(self.first.lock_cell((3, 3)))
+        self.assertFalse(self.second.lock_cell((3, 3)))
+        self.assertTrue(self.second.is_locked((3, 3)))
+        # the teams have their own tables
+        self.assertTrue(self.rival.lock_cell((3, 3)))
+
+        locks = self.first.team.locks
+        self.assertFalse(locks.release((3, 3), self.second))
+        self.assertTrue(locks.release((3, 3), self.first))
+        self.assertIsNone(locks.owner((3, 3)))
+        self.assertTrue(self.second.lock_cell((3, 3)))
+
+    def test_locks_are_released_when_the_battery_runs_out(self):
+        locks = self.first.team.locks
+        for position in ((3, 3), (2, 4)):
+            self.assertTrue(self.first.lock_cell(position))
+        self.first.battery = 0
+        self.first.action(self.controller.playground, None)
+        self.assertLess(self.first.battery, 0)
+        self.assertFalse(locks.is_locked((3, 3)))
+        self.assertFalse(locks.is_locked((2, 4)))
+        self.assertTrue(self.second.lock_cell((3, 3)))
+        self.assertEqual(locks.release_all(self.first), 0)
+
+    def test_pickled_table_keeps_its_locks(self):
+        locks = LockTable()
+        locks.acquire((1, 2), self.first)
+        locks.acquire((4, 4), self.second)
+        restored = pickle.loads(pickle.dumps(locks))
+        self.assertEqual(restored.owner((1, 2)), self.first.agent_id)
+        self.assertEqual(restored.owner((4, 4)), self.second.agent_id)
+        self.assertFalse(restored.acquire((1, 2), self.second))
+        self.assertEqual(restored.release_all(self.first), 1)
+
+        # the restored table has a mutex of its own: one of the threads gets each cell
+        winners = []
+
+        def acquire_all(agent):
+            winners.extend((position, agent.agent_id) for position in ((x, y) for x in range(6) for y in range(6))
+                           if restored.acquire(position, agent))
+
+        threads = [threading.Thread(target=acquire_all, args=(agent,)) for agent in (self.first, self.rival)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # (4, 4) stays with its owner, every other cell goes to one thread only
+        self.assertEqual(len(winners), 35)
+        self.assertEqual(len({position for position, _ in winners}), 35)
+
+
+if __name__ == '__main__':
+    unittest.main()
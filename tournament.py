@@ -0,0 +1,286 @@
+"""
+Runs a round-robin tournament between team policies: every group of policies plays a match on every seed, once in
+each turn order, in a pool of processes. The policies are ranked by Elo ratings, which are updated as the results come
+in.
+
+Usage: python tournament.py -policy NAME[:key=value,...] -policy ... [-seeds N] [-workers N]
+Example: python tournament.py -policy base -policy frontier:exploration=gain -policy team:allocation=hungarian,agents=3
+"""
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from allocation import TaskAllocator
+from controller import Controller
+from exploration import RANDOM
+from playground import Playground
+from random_seed import RandomSeed
+
+
+class Policy:
+    """
+    The configuration of a team in a tournament.
+    """
+
+    def __init__(self,
+                 name: str,
+                 agents: int = 2,
+                 exploration: str = RANDOM,
+                 allocation: Optional[str] = None,
+                 battery: int = 30,
+                 field_of_view: int = 3):
+        """
+        Args:
+            name: The name of the policy in the standings.
+            agents: The number of agents of the team.
+            exploration: How the agents explore (see exploration.py).
+            allocation: The allocation strategy of the team (see allocation.py), or None to let each agent pick its
+                        nearest target.
+            battery: The initial battery level of the agents.
+            field_of_view: The field of view of the agents.
+        """
+        self.name = name
+        self.agents = agents
+        self.exploration = exploration
+        self.allocation = allocation
+        self.battery = battery
+        self.field_of_view = field_of_view
+
+    @staticmethod
+    def parse(spec: str) -> 'Policy':
+        """
+        Parses a policy from a string in the format "name:key=value,key=value", for example
+        "frontier:exploration=gain,agents=3".
+
+        Raises:
+            ValueError: If a key is unknown.
+        """
+        name, _, options = spec.partition(':')
+        kwargs = {}
+        for option in filter(None, options.split(',')):
+            key, _, value = option.partition('=')
+            if key in ('agents', 'battery', 'field_of_view'):
+                kwargs[key] = int(value)
+            elif key in ('exploration', 'allocation'):
+                kwargs[key] = value
+            else:
+                raise ValueError(f"Unknown policy option: {key}")
+        return Policy(name, **kwargs)
+
+
+class Match:
+    """
+    A game between some policies on one seed. The policy at index i plays as team i + 1, and the agents of the teams
+    act in this order in every round.
+    """
+
+    def __init__(self,
+                 policies: Tuple[Policy, ...],
+                 seed: int,
+                 dimensions: Tuple[int, int] = (7, 7),
+                 num_holes: int = 5,
+                 num_balls: int = 5,
+                 num_obstacles: int = 0,
+                 max_rounds: int = 200):
+        self.policies = policies
+        self.seed = seed
+        self.dimensions = dimensions
+        self.num_holes = num_holes
+        self.num_balls = num_balls
+        self.num_obstacles = num_obstacles
+        self.max_rounds = max_rounds
+
+
+class MatchResult:
+    """
+    The scores of the policies of a match, in the order of the match.
+    """
+
+    def __init__(self, names: List[str], scores: List[int], seed: int, rounds: int):
+        self.names = names
+        self.scores = scores
+        self.seed = seed
+        self.rounds = rounds
+
+
+def play_match(match: Match) -> MatchResult:
+    """
+    Plays a match without the console and the chatbot. The result only depends on the match, so it can be played in
+    any process.
+    """
+    RandomSeed().set_seed(match.seed)
+    playground = Playground(dimensions=match.dimensions, num_holes=match.num_holes, num_balls=match.num_balls,
+                            num_obstacles=match.num_obstacles)
+    controller = Controller(playground=playground)
+    for team_id, policy in enumerate(match.policies, start=1):
+        for _ in range(policy.agents):
+            if controller.create_agent(chatbot=False, agent_type=team_id, field_of_view=policy.field_of_view,
+                                       battery=policy.battery, exploration=policy.exploration) is None:
+                raise ValueError(f"An agent of policy {policy.name} was not created")
+    controller.start()
+    for team_id, policy in enumerate(match.policies, start=1):
+        if policy.allocation is not None:
+            controller.teams.get_team(team_id).allocator = TaskAllocator(strategy=policy.allocation)
+
+    for _ in controller.run(max_rounds=match.max_rounds):
+        pass
+    controller.stop()
+    scores = controller.get_scores()
+    return MatchResult(names=[policy.name for policy in match.policies],
+                       scores=[scores.get(team_id, 0) for team_id in range(1, len(match.policies) + 1)],
+                       seed=match.seed,
+                       rounds=controller.round)
+
+
+class EloRatings:
+    """
+    Elo ratings of the policies. A match between more than two policies counts as a game between every pair of them,
+    with the K-factor divided by the number of opponents.
+    """
+
+    def __init__(self, k_factor: float = 16.0, initial_rating: float = 1500.0):
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+        self.ratings: Dict[str, float] = {}
+        self.matches: Dict[str, int] = {}
+        self.wins: Dict[str, float] = {}
+
+    def expected_score(self, name: str, opponent: str) -> float:
+        """
+        Returns the probability that a policy beats an opponent, a draw counting as half a win.
+        """
+        difference = self.ratings.get(opponent, self.initial_rating) - self.ratings.get(name, self.initial_rating)
+        return 1 / (1 + 10 ** (difference / 400))
+
+    def update(self, result: MatchResult) -> None:
+        """
+        Updates the ratings with the result of a match. All pairs are scored against the ratings before the match.
+        """
+        k_factor = self.k_factor / max(1, len(result.names) - 1)
+        changes = {name: 0.0 for name in result.names}
+        for (i, name), (j, opponent) in itertools.combinations(enumerate(result.names), 2):
+            score = 1.0 if result.scores[i] > result.scores[j] else 0.5 if result.scores[i] == result.scores[j] else 0.0
+            change = k_factor * (score - self.expected_score(name, opponent))
+            changes[name] += change
+            changes[opponent] -= change
+            self.wins[name] = self.wins.get(name, 0.0) + score
+            self.wins[opponent] = self.wins.get(opponent, 0.0) + 1 - score
+        for name, change in changes.items():
+            self.ratings[name] = self.ratings.get(name, self.initial_rating) + change
+            self.matches[name] = self.matches.get(name, 0) + 1
+
+    def standings(self) -> List[Tuple[str, float, int, float]]:
+        """
+        Returns (name, rating, matches, wins) of every policy, best rating first.
+        """
+        return sorted(((name, rating, self.matches[name], self.wins.get(name, 0.0))
+                       for name, rating in self.ratings.items()), key=lambda row: (-row[1], row[0]))
+
+
+class Tournament:
+    """
+    A round-robin tournament: every group of `teams_per_match` policies plays on every seed, once in each rotation of
+    the turn order, since the agents of the first team act first in a round.
+    """
+
+    def __init__(self,
+                 policies: List[Policy],
+                 seeds: List[int],
+                 teams_per_match: int = 2,
+                 workers: Optional[int] = None,
+                 **match_options):
+        """
+        Args:
+            policies: The policies taking part; their names must be unique.
+            seeds: The seeds of the matches.
+            teams_per_match: The number of policies in a match.
+            workers: The number of processes that play the matches. With 1 worker, the matches are played in this
+                     process; if None, one process per CPU is used.
+            match_options: The board and the limits of the matches (see `Match`).
+
+        Raises:
+            ValueError: If two policies have the same name or there are fewer policies than teams per match.
+        """
+        if len({policy.name for policy in policies}) != len(policies):
+            raise ValueError("The names of the policies must be unique")
+        if len(policies) < teams_per_match:
+            raise ValueError(f"A match needs {teams_per_match} policies")
+        self.policies = policies
+        self.seeds = seeds
+        self.teams_per_match = teams_per_match
+        self.workers = workers
+        self.match_options = match_options
+        self.ratings = EloRatings()
+
+    def matches(self) -> Iterator[Match]:
+        """
+        Yields the matches of the tournament, in a fixed order.
+        """
+        for seed in self.seeds:
+            for group in itertools.combinations(self.policies, self.teams_per_match):
+                for shift in range(len(group)):
+                    yield Match(policies=group[shift:] + group[:shift], seed=seed, **self.match_options)
+
+    def run(self, on_result: Optional[Callable[[MatchResult, EloRatings], None]] = None) -> EloRatings:
+        """
+        Plays all matches and updates the ratings after each one. The results are applied in the order of the
+        matches, so the ratings don't depend on the number of workers.
+
+        Args:
+            on_result: Called with each result and the updated ratings.
+
+        Returns:
+            The ratings.
+        """
+        if self.workers == 1:
+            for result in map(play_match, self.matches()):
+                self._record(result, on_result)
+            return self.ratings
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for result in pool.map(play_match, self.matches(), chunksize=4):
+                self._record(result, on_result)
+        return self.ratings
+
+    def _record(self, result: MatchResult, on_result: Optional[Callable[[MatchResult, EloRatings], None]]) -> None:
+        self.ratings.update(result)
+        if on_result is not None:
+            on_result(result, self.ratings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Round-robin tournament between team policies.')
+    parser.add_argument('-policy', dest='policies', action='append', required=True,
+                        help='A policy in the format name[:key=value,...]; keys: agents, exploration, allocation, '
+                             'battery, field_of_view')
+    parser.add_argument('-seeds', type=int, default=10, help='Number of seeds (default: 10)')
+    parser.add_argument('-teams', type=int, default=2, help='Number of policies in a match (default: 2)')
+    parser.add_argument('-workers', type=int, default=None, help='Number of processes (default: one per CPU)')
+    parser.add_argument('-dim', type=str, default='7,7', help='Dimensions of the playground (default: 7,7)')
+    parser.add_argument('-ball', type=int, default=5, help='Number of balls (default: 5)')
+    parser.add_argument('-hole', type=int, default=5, help='Number of holes (default: 5)')
+    parser.add_argument('-obstacle', type=int, default=0, help='Number of obstacles (default: 0)')
+    parser.add_argument('-max-rounds', dest='max_rounds', type=int, default=200,
+                        help='Maximum number of rounds of a match (default: 200)')
+    args = parser.parse_args()
+
+    dim_x, dim_y = map(int, args.dim.split(','))
+    tournament = Tournament(policies=[Policy.parse(spec) for spec in args.policies],
+                            seeds=list(range(args.seeds)),
+                            teams_per_match=args.teams,
+                            workers=args.workers,
+                            dimensions=(dim_x, dim_y),
+                            num_holes=args.hole,
+                            num_balls=args.ball,
+                            num_obstacles=args.obstacle,
+                            max_rounds=args.max_rounds)
+    ratings = tournament.run()
+
+    print('policy'.ljust(20) + f'{"rating":>10}{"matches":>10}{"wins":>10}')
+    for name, rating, matches, wins in ratings.standings():
+        print(name.ljust(20) + f'{rating:>10.1f}{matches:>10}{wins:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+from backends import TERMINAL, load_backend
 from consts import UP, RIGHT, DOWN, LEFT
 
 
@@ -25,8 +26,10 @@ def get_key_action():
         'enter' if 'Enter' key is pressed.
         None if any other key is pressed.
     """
+    # the terminal module is loaded on the first key press and reused afterwards
+    terminal = load_backend(TERMINAL, os.name)
     if os.name == 'nt':  # Windows
-        import msvcrt
+        msvcrt = terminal
         key = msvcrt.getch()
         if key == b'\x03':  # if 'Ctrl + C' is pressed
             exit(-1)
@@ -39,7 +42,7 @@ def get_key_action():
         elif key == b'\r':  # if 'Enter' key is pressed
             return 'enter'
     else:  # Unix-based
-        import curses
+        curses = terminal
         stdscr = curses.initscr()
         curses.cbreak()
         stdscr.keypad(True)
@@ -0,0 +1,240 @@
+"""
+A Gym-style vectorized environment for training policies: M independent games, stepped together, with the field of
+view of every agent as an integer-coded NumPy tensor. Requires NumPy (the rest of the game doesn't).
+
+    env = VectorEnv(num_envs=64, agents_per_env=2, dimensions=(10, 10))
+    observations, infos = env.reset(seed=0)
+    while training:
+        actions = policy(observations['view'], observations['features'])  # shape (64, 2), values in 0..NUM_ACTIONS-1
+        observations, rewards, terminated, truncated, infos = env.step(actions)
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("vector_env.py requires NumPy, which is not installed: pip install numpy") from error
+
+from consts import EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE, AGENT, UP, RIGHT, DOWN, LEFT
+from controller import Controller
+from playground import Playground
+from random_seed import RandomSeed
+from utils import get_new_position
+
+# codes of the cells in the views; AGENT_FLAG is added when an agent stands on the cell
+CELL_CODES = {EMPTY: 0, HOLE: 1, BALL: 2, FILLED_HOLE: 3, OBSTACLE: 4}
+OUT = 5
+AGENT_FLAG = 8
+
+# an action is the index of a direction (turn and step forward) or STAY
+ACTIONS = (UP, RIGHT, DOWN, LEFT)
+STAY = len(ACTIONS)
+NUM_ACTIONS = len(ACTIONS) + 1
+
+# the columns of the features of an agent
+HAS_BALL = 0
+BATTERY = 1
+
+
+def encode_cell(label: str) -> int:
+    """
+    Returns the code of a cell label of the playground.
+    """
+    base, separator, _ = label.partition(AGENT + '-')
+    return CELL_CODES.get(base.rstrip(','), 0) + (AGENT_FLAG if separator else 0)
+
+
+class VectorEnv:
+    """
+    Runs `num_envs` independent games of `agents_per_env` agents each (one team), and steps them together: every
+    step, each agent turns to the direction of its action and takes a step, then picks up the ball or fills the hole
+    of its cell. A game that ends (all holes filled, no battery left, or `max_steps` steps) is reset at once, so the
+    observations returned with its end are the first ones of the next game; its final score is in the infos.
+
+    The observations are written in place into buffers allocated once: `view` (M, A, fov, fov) int8, the codes of the
+    cells around each agent (see CELL_CODES, OUT and AGENT_FLAG), and `features` (M, A, 2) int32, whether the agent
+    has a ball and its battery. Every call returns the same arrays, so a caller that keeps observations across steps
+    must copy them. The views are gathered with one `np.take` from a padded, integer-coded copy of each board, which
+    is patched with the cells that changed in the step.
+    """
+
+    def __init__(self,
+                 num_envs: int,
+                 agents_per_env: int = 1,
+                 dimensions: Tuple[int, int] = (7, 7),
+                 num_holes: int = 5,
+                 num_balls: int = 5,
+                 num_obstacles: int = 0,
+                 field_of_view: int = 3,
+                 battery: int = 30,
+                 max_steps: int = 200):
+        """
+        Args:
+            num_envs: The number of games.
+            agents_per_env: The number of agents of each game.
+            dimensions: The width and height of the boards.
+            num_holes: The number of holes of each game.
+            num_balls: The number of balls of each game.
+            num_obstacles: The number of obstacles of each game.
+            field_of_view: The size of the view of an agent, an odd number.
+            battery: The initial battery level of the agents.
+            max_steps: The number of steps after which a game is truncated.
+        """
+        self.num_envs = num_envs
+        self.agents_per_env = agents_per_env
+        self.dimensions = dimensions
+        self.num_holes = num_holes
+        self.num_balls = num_balls
+        self.num_obstacles = num_obstacles
+        self.field_of_view = field_of_view
+        self.battery = battery
+        self.max_steps = max_steps
+        self.controllers: List[Optional[Controller]] = [None] * num_envs
+
+        x_axis, y_axis = dimensions
+        self._radius = field_of_view // 2
+        self._width = x_axis + 2 * self._radius
+        self._cells_per_env = self._width * (y_axis + 2 * self._radius)
+        self._grids = np.full((num_envs, y_axis + 2 * self._radius, self._width), OUT, dtype=np.int8)
+        self._flat_grids = self._grids.reshape(-1)
+        # the index of the top left cell of each agent's view in the flat grids, and of every cell of the views
+        self._origins = np.zeros((num_envs, agents_per_env), dtype=np.int64)
+        self._window = (np.arange(field_of_view)[:, None] * self._width + np.arange(field_of_view)).astype(np.int64)
+        self._indices = np.zeros((num_envs, agents_per_env, field_of_view, field_of_view), dtype=np.int64)
+        self._steps = [0] * num_envs
+
+        self.observations = {
+            'view': np.zeros((num_envs, agents_per_env, field_of_view, field_of_view), dtype=np.int8),
+            'features': np.zeros((num_envs, agents_per_env, 2), dtype=np.int32),
+        }
+        self.rewards = np.zeros((num_envs, agents_per_env), dtype=np.float32)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        self.truncated = np.zeros(num_envs, dtype=bool)
+        # the score and the length of the games that ended in the latest step (0 for the others)
+        self.infos = {
+            'final_score': np.zeros(num_envs, dtype=np.int32),
+            'final_steps': np.zeros(num_envs, dtype=np.int32),
+        }
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Starts a new game in every environment.
+
+        Args:
+            seed: The seed of the random number generator. The games are reproducible for the same seed and actions.
+
+        Returns:
+            The observations and the infos.
+        """
+        if seed is not None:
+            RandomSeed().set_seed(seed)
+        for env_index in range(self.num_envs):
+            self._reset_game(env_index)
+        self.rewards.fill(0)
+        self.terminated.fill(False)
+        self.truncated.fill(False)
+        self.infos['final_score'].fill(0)
+        self.infos['final_steps'].fill(0)
+        self._gather_views()
+        return self.observations, self.infos
+
+    def step(self, actions: Any) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, np.ndarray,
+                                          Dict[str, np.ndarray]]:
+        """
+        Plays one step of every game.
+
+        Args:
+            actions: The action of every agent, an array of shape (num_envs, agents_per_env) of indices of ACTIONS or
+                     STAY.
+
+        Returns:
+            The observations, the rewards of the agents (1 for each hole the agent filled), whether each game ended
+            and whether it was truncated, and the infos.
+        """
+        self.rewards.fill(0)
+        self.terminated.fill(False)
+        self.truncated.fill(False)
+        self.infos['final_score'].fill(0)
+        self.infos['final_steps'].fill(0)
+        features = self.observations['features']
+
+        for env_index, env_actions in enumerate(np.asarray(actions).tolist()):
+            controller = self.controllers[env_index]
+            playground = controller.playground
+            origin = env_index * self._cells_per_env
+            for agent_index, (agent, action) in enumerate(zip(controller.agents, env_actions)):
+                if agent.battery < 0:
+                    continue
+                if agent.battery == 0:
+                    agent.battery = -1
+                    playground.agent_ran_out_of_battery(agent)
+                    features[env_index, agent_index, BATTERY] = -1
+                    continue
+
+                if action != STAY:
+                    agent.direction = ACTIONS[action]
+                    position = get_new_position(agent.direction, agent.position)
+                    if playground.agent_enter_cell(position, agent):
+                        agent.position = position
+                        agent.battery -= 1
+                        self._origins[env_index, agent_index] = origin + (position[1] * self._width + position[0])
+                        features[env_index, agent_index, BATTERY] = agent.battery
+
+                if agent.has_ball:
+                    if playground.place_ball(agent.position, agent):
+                        agent.has_ball = False
+                        agent.filled_by_me_hole_positions.add(agent.position)
+                        self.rewards[env_index, agent_index] = 1
+                        features[env_index, agent_index, HAS_BALL] = 0
+                elif playground.pick_ball(agent.position):
+                    agent.has_ball = True
+                    features[env_index, agent_index, HAS_BALL] = 1
+
+            self._steps[env_index] += 1
+            self._update_grid(env_index)
+            over = controller.game_over()
+            if over or self._steps[env_index] >= self.max_steps:
+                self.terminated[env_index] = over
+                self.truncated[env_index] = not over
+                self.infos['final_score'][env_index] = playground.filled_holes
+                self.infos['final_steps'][env_index] = self._steps[env_index]
+                self._reset_game(env_index)
+
+        self._gather_views()
+        return self.observations, self.rewards, self.terminated, self.truncated, self.infos
+
+    def _reset_game(self, env_index: int) -> None:
+        playground = Playground(dimensions=self.dimensions, num_holes=self.num_holes, num_balls=self.num_balls,
+                                field_of_view=self.field_of_view, num_obstacles=self.num_obstacles)
+        controller = Controller(playground=playground)
+        controller.create_agents(None, self.agents_per_env, chatbot=False, field_of_view=self.field_of_view,
+                                 battery=self.battery)
+        playground.place_holes_and_balls()
+        self.controllers[env_index] = controller
+        self._steps[env_index] = 0
+
+        radius = self._radius
+        grid = self._grids[env_index]
+        for y, row in enumerate(playground.grid):
+            grid[y + radius, radius:radius + playground.xAxis] = [encode_cell(label) for label in row]
+        playground.changed_cells.clear()
+
+        origin = env_index * self._cells_per_env
+        features = self.observations['features'][env_index]
+        for agent_index, agent in enumerate(controller.agents):
+            self._origins[env_index, agent_index] = origin + (agent.position[1] * self._width + agent.position[0])
+            features[agent_index] = (0, agent.battery)
+
+    def _update_grid(self, env_index: int) -> None:
+        # the cells changed by the moves, the balls and the holes of the step
+        playground = self.controllers[env_index].playground
+        grid = self._grids[env_index]
+        radius = self._radius
+        for x, y in playground.changed_cells:
+            grid[y + radius, x + radius] = encode_cell(playground.grid[y][x])
+        playground.changed_cells.clear()
+
+    def _gather_views(self) -> None:
+        np.add(self._origins[:, :, None, None], self._window, out=self._indices)
+        # a mode other than 'raise' lets np.take write straight into the buffer
+        np.take(self._flat_grids, self._indices, out=self.observations['view'], mode='clip')
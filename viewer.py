@@ -0,0 +1,357 @@
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from consts import EMPTY, HOLE, BALL, FILLED_HOLE, OBSTACLE, AGENT, UP, RIGHT, DOWN, LEFT
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from playground import Playground
+
+# the base state of a cell, without the agent that stands on it (agents are streamed separately)
+CELL_CODES = {EMPTY: 0, HOLE: 1, BALL: 2, FILLED_HOLE: 3, OBSTACLE: 4}
+DIRECTION_CODES = {UP: 0, RIGHT: 1, DOWN: 2, LEFT: 3}
+
+# Frames are JSON objects sent as server-sent events:
+#   snapshot: {"t": "snapshot", "round", "over", "width", "height", "teams", "cells": [[x, y, code], ...],
+#              "agents": [...]}
+#   delta:    {"t": "delta", "round", "cells": [[x, y, code], ...], "agents": [...]}, only what changed in the round
+#   end:      {"t": "end", "round"}
+# An agent is [index, x, y, direction, has ball, battery, score]; its team is at the same index of "teams".
+AgentRow = Tuple[int, int, int, int, int, int, int]
+
+
+class LiveViewer:
+    """
+    Streams a running game to browsers: a local HTTP server serves a canvas page, which receives the cells and the
+    agents that changed in each round as server-sent events and redraws only those.
+
+    Each round is encoded once, whatever the number of viewers, and kept in a short backlog that the connections read
+    from in their own threads. Publishing a round never waits for a viewer: a viewer that falls behind the backlog
+    gets a fresh snapshot of the game instead of the rounds it missed.
+    """
+
+    def __init__(self, port: int = 8000, host: str = '127.0.0.1', backlog: int = 256):
+        """
+        Args:
+            port: The port of the server. With 0, a free port is picked (see `url`).
+            host: The address the server listens on.
+            backlog: The number of encoded rounds kept for viewers that are behind.
+        """
+        self.host = host
+        self.port = port
+        self.backlog = max(1, backlog)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._condition = threading.Condition()
+        # (sequence number, encoded frame) of the latest rounds
+        self._frames: Deque[Tuple[int, bytes]] = deque(maxlen=self.backlog)
+        self._sequence = 0
+        self._closed = False
+        # the state the viewers are shown, kept from the deltas so a snapshot never reads the playground
+        self._size = (0, 0)
+        self._round = 0
+        self._teams: List[int] = []
+        self._cells: Dict[Tuple[int, int], int] = {}
+        self._agents: List[AgentRow] = []
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/'
+
+    def start(self,
+              playground: 'Playground',
+              agents: List['Agent'],
+              seed: Optional[int] = None,
+              iteration: int = 0) -> 'LiveViewer':
+        """
+        Starts the server in a background thread with the current state of the game.
+
+        Args:
+            playground: The Playground object of the game.
+            agents: All agents of the game. No agent can be added after the viewer has started.
+            seed: The seed of the random number generator (unused; the signature matches `ReplayWriter.start`).
+            iteration: The number of the current round.
+
+        Returns:
+            self: Returns the LiveViewer instance.
+        """
+        with self._condition:
+            self._size = (playground.xAxis, playground.yAxis)
+            self._round = iteration
+            self._teams = [agent.type for agent in agents]
+            self._cells = {}
+            for y in range(playground.yAxis):
+                for x in range(playground.xAxis):
+                    code = self._cell_code(playground, (x, y))
+                    if code:
+                        self._cells[(x, y)] = code
+            self._agents = [self._agent_row(index, agent) for index, agent in enumerate(agents)]
+
+        if self._server is None:
+            self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            self._server.daemon_threads = True
+            self.port = self._server.server_address[1]
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def write_round(self, playground: 'Playground', agents: List['Agent'], iteration: int) -> 'LiveViewer':
+        """
+        Publishes the cells and the agents that changed in a round. The work is proportional to the changes, not to
+        the size of the board.
+
+        Args:
+            playground: The Playground object of the game, with the cells changed in the round.
+            agents: All agents of the game, in the same order as when the viewer was started.
+            iteration: The number of the round.
+
+        Returns:
+            self: Returns the LiveViewer instance.
+        """
+        cells = []
+        for position in playground.changed_cells:
+            code = self._cell_code(playground, position)
+            if self._cells.get(position, 0) != code:
+                cells.append([position[0], position[1], code])
+        changed_agents = []
+        for index, agent in enumerate(agents):
+            row = self._agent_row(index, agent)
+            if row != self._agents[index]:
+                changed_agents.append(row)
+
+        with self._condition:
+            for x, y, code in cells:
+                if code:
+                    self._cells[(x, y)] = code
+                else:
+                    self._cells.pop((x, y), None)
+            for row in changed_agents:
+                self._agents[row[0]] = row
+            self._round = iteration
+            self._publish({'t': 'delta', 'round': iteration, 'cells': cells, 'agents': changed_agents})
+        return self
+
+    def close(self) -> None:
+        """
+        Tells the viewers that the game is over. The server keeps serving the final state until `shutdown`.
+        """
+        with self._condition:
+            if not self._closed:
+                self._closed = True
+                self._publish({'t': 'end', 'round': self._round})
+
+    def shutdown(self) -> None:
+        """
+        Stops the server and disconnects the viewers.
+        """
+        self.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def snapshot(self) -> Tuple[int, bytes]:
+        """
+        Returns the sequence number of the latest frame and an encoded snapshot of the game at that frame.
+        """
+        with self._condition:
+            return self._sequence, self._encode({'t': 'snapshot',
+                                                 'round': self._round,
+                                                 'over': self._closed,
+                                                 'width': self._size[0],
+                                                 'height': self._size[1],
+                                                 'teams': self._teams,
+                                                 'cells': [[x, y, code] for (x, y), code in self._cells.items()],
+                                                 'agents': self._agents})
+
+    def frames_after(self, sequence: int, timeout: float = 15.0) -> Optional[List[Tuple[int, bytes]]]:
+        """
+        Waits for the frames published after a sequence number.
+
+        Args:
+            sequence: The sequence number of the last frame the viewer has.
+            timeout: The number of seconds to wait for a new frame.
+
+        Returns:
+            The new frames (an empty list after the timeout), or None if some of them have left the backlog and the
+            viewer needs a new snapshot.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence > sequence, timeout=timeout)
+            if not self._frames or self._frames[0][0] > sequence + 1:
+                return None if self._sequence > sequence else []
+            return [frame for frame in self._frames if frame[0] > sequence]
+
+    def _publish(self, frame: dict) -> None:
+        # called with the condition held: encode once, share the bytes with every viewer
+        self._sequence += 1
+        self._frames.append((self._sequence, self._encode(frame)))
+        self._condition.notify_all()
+
+    @staticmethod
+    def _encode(frame: dict) -> bytes:
+        return b'data: ' + json.dumps(frame, separators=(',', ':')).encode() + b'\n\n'
+
+    @staticmethod
+    def _cell_code(playground: 'Playground', position: Tuple[int, int]) -> int:
+        base = playground.get_cell_state(position).partition(AGENT + '-')[0].rstrip(',')
+        return CELL_CODES.get(base, 0)
+
+    @staticmethod
+    def _agent_row(index: int, agent: 'Agent') -> AgentRow:
+        x, y = agent.position
+        return index, x, y, DIRECTION_CODES[agent.direction], int(agent.has_ball), agent.battery, agent.get_my_score()
+
+    def _handler(self):
+        viewer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/':
+                    body = PAGE.encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/events':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Cache-Control', 'no-cache')
+                    self.end_headers()
+                    try:
+                        self._stream()
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                else:
+                    self.send_error(404)
+
+            def _stream(self):
+                sequence, frame = viewer.snapshot()
+                self.wfile.write(frame)
+                self.wfile.flush()
+                while viewer._server is not None:
+                    frames = viewer.frames_after(sequence)
+                    if frames is None:
+                        # too slow for the backlog: skip to the current state
+                        sequence, frame = viewer.snapshot()
+                        self.wfile.write(frame)
+                    elif frames:
+                        sequence = frames[-1][0]
+                        self.wfile.write(b''.join(frame for _, frame in frames))
+                    else:
+                        # keeps idle connections open through proxies
+                        self.wfile.write(b': ping\n\n')
+                    self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Balls and Holes</title>
+<style>
+  body { margin: 0; background: #1e1e1e; color: #ddd; font: 14px sans-serif; }
+  #info { padding: 6px 10px; }
+  canvas { display: block; margin: 0 10px; image-rendering: pixelated; }
+</style>
+</head>
+<body>
+<div id="info">Connecting...</div>
+<canvas id="board"></canvas>
+<script>
+const CELL_COLORS = ['#2b2b2b', '#c9a227', '#2aa1b3', '#3c9d4e', '#777777'];
+const TEAM_COLORS = ['#e6194b', '#4363d8', '#f58231', '#911eb4', '#46f0f0', '#f032e6', '#bcf60c', '#fabebe'];
+const ARROWS = [[0, -1], [1, 0], [0, 1], [-1, 0]];
+const canvas = document.getElementById('board');
+const context = canvas.getContext('2d');
+const info = document.getElementById('info');
+let width = 0, height = 0, size = 1, round = 0, over = false;
+let cells = new Uint8Array(0), occupants = new Int32Array(0), teams = [], agents = [];
+const dirty = new Set();
+
+function mark(x, y) { dirty.add(y * width + x); }
+
+function setAgent(row) {
+  const old = agents[row[0]];
+  // another agent may have entered the old cell earlier in the same round
+  if (old && occupants[old[2] * width + old[1]] === row[0]) occupants[old[2] * width + old[1]] = -1;
+  if (old) mark(old[1], old[2]);
+  agents[row[0]] = row;
+  occupants[row[2] * width + row[1]] = row[0];
+  mark(row[1], row[2]);
+}
+
+function drawCell(index) {
+  const x = index % width, y = Math.floor(index / width);
+  context.fillStyle = CELL_COLORS[cells[index]];
+  context.fillRect(x * size, y * size, size, size);
+  const agent = agents[occupants[index]];
+  if (occupants[index] < 0 || !agent) return;
+  const centre = size / 2, radius = Math.max(1, size * 0.35);
+  context.globalAlpha = agent[5] > 0 ? 1 : 0.35;
+  context.fillStyle = TEAM_COLORS[(teams[agent[0]] - 1) % TEAM_COLORS.length];
+  context.beginPath();
+  context.arc(x * size + centre, y * size + centre, radius, 0, 2 * Math.PI);
+  context.fill();
+  if (size >= 6) {
+    const [dx, dy] = ARROWS[agent[3]];
+    context.strokeStyle = agent[4] ? '#2aa1b3' : '#ffffff';
+    context.lineWidth = Math.max(1, size / 8);
+    context.beginPath();
+    context.moveTo(x * size + centre, y * size + centre);
+    context.lineTo(x * size + centre + dx * radius, y * size + centre + dy * radius);
+    context.stroke();
+  }
+  context.globalAlpha = 1;
+}
+
+function render() {
+  for (const index of dirty) drawCell(index);
+  dirty.clear();
+  const scores = {};
+  for (const agent of agents) scores[teams[agent[0]]] = (scores[teams[agent[0]]] || 0) + agent[6];
+  info.textContent = 'Round ' + round + (over ? ' (game over)' : '') + ' | ' +
+      Object.entries(scores).map(([team, score]) => 'team ' + team + ': ' + score).join(', ');
+}
+
+function apply(frame) {
+  if (frame.t === 'snapshot') {
+    width = frame.width; height = frame.height; teams = frame.teams; agents = []; over = frame.over;
+    size = Math.max(1, Math.min(32, Math.floor((window.innerWidth - 20) / width),
+                                Math.floor((window.innerHeight - 40) / height)));
+    canvas.width = width * size; canvas.height = height * size;
+    cells = new Uint8Array(width * height);
+    occupants = new Int32Array(width * height).fill(-1);
+    for (const [x, y, code] of frame.cells) cells[y * width + x] = code;
+    for (const row of frame.agents) setAgent(row);
+    for (let index = 0; index < width * height; index++) dirty.add(index);
+  } else if (frame.t === 'delta') {
+    for (const [x, y, code] of frame.cells) { cells[y * width + x] = code; mark(x, y); }
+    for (const row of frame.agents) setAgent(row);
+  } else if (frame.t === 'end') {
+    over = true;
+  }
+  round = frame.round;
+}
+
+let scheduled = false;
+const events = new EventSource('/events');
+events.onmessage = (event) => {
+  apply(JSON.parse(event.data));
+  if (!scheduled) {
+    scheduled = true;
+    requestAnimationFrame(() => { scheduled = false; render(); });
+  }
+};
+events.onerror = () => { info.textContent = 'Disconnected, round ' + round; };
+</script>
+</body>
+</html>
+"""